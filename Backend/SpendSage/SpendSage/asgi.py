@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The async endpoints under api/v1/async/ (expenses/async_views.py) only pay
+off under an ASGI server, e.g.:
+
+    uvicorn SpendSage.asgi:application --workers 4
 """
 
 import os
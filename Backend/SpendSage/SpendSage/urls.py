@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from common.views import metrics_view
 
 def api_home(request):
     return JsonResponse({"message": "API is working!"})
@@ -24,9 +25,13 @@ def api_home(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_home, name='api-home'),
+    path('metrics', metrics_view, name='metrics'),
     
     path('api/v1/', include([
         path('auth/', include('users.urls')),
         path('', include('expenses.urls')),
+        # Async read endpoints; served without a worker thread under ASGI
+        path('async/', include('expenses.async_urls')),
+        path('insights/', include('insight.urls')),
     ])),
 ]
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+METRICS_MIDDLEWARE = 'common.middleware.RequestMetricsMiddleware'
 
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'common'
+
+    def ready(self):
+        # Serializer timing replaces DRF's Serializer.data for the whole
+        # process, so it is installed once, at startup, and only where the
+        # metrics middleware is there to read it.
+        if METRICS_MIDDLEWARE in settings.MIDDLEWARE:
+            from .middleware import instrument_serializers
+
+            instrument_serializers()
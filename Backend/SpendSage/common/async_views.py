@@ -0,0 +1,62 @@
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+
+from users.authentication import ClaimsJWTAuthentication
+from .renderers import ORJSONRenderer
+
+_renderer = ORJSONRenderer()
+
+
+def json_response(payload, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(
+        _renderer.render(payload), status=status_code,
+        content_type=_renderer.media_type, headers=headers
+    )
+
+
+def json_success_response(message, data=None, status_code=status.HTTP_200_OK):
+    """api_success_response for async views (same body, no DRF Response)."""
+    return json_response({
+        "status": True,
+        "message": message,
+        "data": data if data else {}
+    }, status_code)
+
+
+def json_error_response(message, error_details=None, status_code=status.HTTP_400_BAD_REQUEST):
+    """api_error_response for async views (same body, no DRF Response)."""
+    return json_response({
+        "status": False,
+        "message": message,
+        "error": error_details if error_details else {}
+    }, status_code)
+
+
+class AsyncAPIView(View):
+    """
+    Base for async endpoints served under ASGI.
+
+    DRF's APIView is sync-only, so these are plain Django views with async
+    handlers. Authentication is ClaimsJWTAuthentication, which builds the
+    user from the token without a query and so can run on the event loop;
+    every handler requires an authenticated user. Handlers return
+    json_success_response / json_error_response, and authentication errors
+    have the same bodies and headers as on the DRF views.
+    """
+    authentication_class = ClaimsJWTAuthentication
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticator = self.authentication_class()
+        try:
+            result = authenticator.authenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+        except exceptions.APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(
+                detail, exc.status_code,
+                headers={'WWW-Authenticate': authenticator.authenticate_header(request)}
+            )
+        request.user, request.auth = result
+        return await super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,480 @@
+"""
+API benchmark suite.
+
+`manage.py seed_benchmark` fills the configured database (point it at a
+throwaway local Postgres or SQLite database) with synthetic users,
+categories, budgets and transactions at a chosen scale. `manage.py
+benchmark_api` then drives every request/response endpoint of the API
+(users, expenses, expenses async and insight URLs) in-process through the
+full middleware/auth stack and reports p50/p99 latency, query counts and
+peak Python memory per endpoint as JSON. The task events stream
+(async tasks/events/) is left out: it never finishes, so it has no
+latency to measure. Given a previous run as --baseline it fails on
+regressions.
+
+Benchmark users are bench-<n>@spendsage.invalid; everything they own is
+removed again by `seed_benchmark --reset`.
+"""
+import io
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Optional
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+BENCH_DOMAIN = '@spendsage.invalid'
+BENCH_PASSWORD = 'Bench-password-2024'
+SEED_CHUNK_SIZE = 10_000
+HISTORY_DAYS = 365
+
+CATEGORIES = {
+    'Coffee': 'starbucks, cafe coffee day, blue tokai',
+    'Groceries': 'bigbasket, dmart, blinkit',
+    'Dining': 'swiggy, zomato, restaurant',
+    'Transport': 'uber, ola, metro, rapido',
+    'Fuel': 'indian oil, hpcl, bharat petroleum',
+    'Shopping': 'amazon, flipkart, myntra',
+    'Utilities': 'electricity, broadband, airtel',
+    'Rent': 'rent, nobroker',
+    'Health': 'apollo, pharmeasy, 1mg',
+    'Entertainment': 'netflix, bookmyshow, spotify',
+    'Travel': 'makemytrip, irctc, indigo',
+    'Salary': 'salary, payroll',
+}
+
+
+def bench_email(index):
+    return f"bench-{index}{BENCH_DOMAIN}"
+
+
+def benchmark_users():
+    return get_user_model().objects.filter(email__startswith='bench-', email__endswith=BENCH_DOMAIN)
+
+
+# --- Seeding ---
+
+def reset():
+    """
+    Remove every benchmark user and what they own.
+
+    Child tables are cleared with plain DELETEs first: a cascading ORM
+    delete would load (and signal) a million transactions one by one.
+    """
+    from expenses.models import BackgroundTask, Budget, Category, Transaction
+    from insight.models import DailySpend, MonthlySpend
+    from ml_engine.models import SpendingStats
+
+    user_ids = list(benchmark_users().values_list('id', flat=True))
+    if not user_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (DailySpend, MonthlySpend, SpendingStats, BackgroundTask, Budget, Transaction, Category):
+            cursor.execute(f"DELETE FROM {model._meta.db_table} WHERE user_id IN ({placeholders})", user_ids)
+        benchmark_users().delete()
+    return len(user_ids)
+
+
+def seed(transactions, users=10, rng_seed=42, log=print):
+    """
+    Create `users` benchmark users sharing `transactions` transactions,
+    spread over the last year, then rebuild the derived tables (rollups,
+    anomaly statistics, budget spend) the way a live system would have them.
+    """
+    from expenses.budgets import recalculate_budget
+    from expenses.models import Budget, Category, Transaction
+    from insight.service import rebuild_user_rollups
+    from ml_engine.anomaly import rebuild_user_stats
+
+    rng = random.Random(rng_seed)
+    User = get_user_model()
+    password = make_password(BENCH_PASSWORD)  # hashed once, not per user
+    accounts = User.objects.bulk_create([
+        User(email=bench_email(index), username=bench_email(index), password=password,
+             first_name='Bench', last_name=str(index))
+        for index in range(users)
+    ])
+    categories = Category.objects.bulk_create([
+        Category(user=user, name=name, keywords=keywords)
+        for user in accounts for name, keywords in CATEGORIES.items()
+    ])
+    by_user = {}
+    for category in categories:
+        by_user.setdefault(category.user_id, []).append(category)
+
+    today = timezone.localdate()
+    month_start = today.replace(day=1)
+    Budget.objects.bulk_create([
+        Budget(user_id=category.user_id, category=category,
+               period_start_date=month_start, period_end_date=month_start + timedelta(days=30),
+               limit_amount=Decimal(rng.randrange(2_000, 20_000)))
+        for category in categories if category.name != 'Salary'
+    ])
+    log(f"Created {users} users, {len(categories)} categories")
+
+    now = timezone.now()
+    created = 0
+    while created < transactions:
+        size = min(SEED_CHUNK_SIZE, transactions - created)
+        batch = []
+        for offset in range(size):
+            user = accounts[(created + offset) % users]
+            category = rng.choice(by_user[user.pk])
+            keyword = rng.choice(category.keywords.split(', '))
+            income = category.name == 'Salary'
+            batch.append(Transaction(
+                user=user,
+                # One in ten rows is left uncategorized, as after an import.
+                category=None if rng.random() < 0.1 else category,
+                amount=Decimal(str(round(rng.lognormvariate(6, 1.2), 2))).max(Decimal('1.00')),
+                raw_description=f"POS {rng.randrange(10_000)} {keyword.upper()} #{rng.randrange(1000)}",
+                transaction_type='income' if income else 'expense',
+                created_at=now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86_400)),
+            ))
+        with transaction.atomic():
+            Transaction.objects.bulk_create(batch)
+        created += size
+        log(f"Inserted {created}/{transactions} transactions")
+
+    for user in accounts:
+        rebuild_user_rollups(user.pk)
+        rebuild_user_stats(user.pk)
+    for budget in Budget.objects.filter(user__in=accounts):
+        recalculate_budget(budget)
+    log("Rebuilt rollups, anomaly statistics and budget spend")
+    return accounts
+
+
+# --- Scenarios ---
+
+@dataclass
+class Scenario:
+    """
+    One endpoint call. `request(ctx)` returns (path, body), or (path,
+    body, headers) for per-iteration headers, and runs before the timer
+    starts, so per-iteration setup (creating the row a DELETE removes, a
+    unique name...) is not measured.
+    """
+    name: str
+    method: str
+    request: Callable
+    authenticated: bool = True
+    format: str = 'json'
+    headers: dict = field(default_factory=dict)
+    expected_status: tuple = (200,)
+
+
+class Context:
+    """State shared by the scenarios: the measured user and a few fixtures."""
+
+    def __init__(self, user):
+        from expenses.models import BackgroundTask, Budget, Category, Transaction
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = user
+        refresh = RefreshToken.for_user(user)
+        self.refresh_token = str(refresh)
+        self.access_token = str(refresh.access_token)
+        self.category = Category.objects.filter(user=user, is_active=True).order_by('id').first()
+        self.transaction = Transaction.objects.filter(user=user, is_active=True).order_by('id').first()
+        self.budget = Budget.objects.filter(user=user, is_active=True).order_by('id').first()
+        self.counter = 0
+        self.duplicated = None
+        # A finished task for the task detail and wait endpoints.
+        self.task = BackgroundTask.objects.create(
+            user=user, task_id=self.unique('bench-task'), task_type='export', status='SUCCESS'
+        )
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f"{prefix} {time.time_ns()}-{self.counter}"
+
+    def new_category(self):
+        from expenses.models import Category
+        return Category.objects.create(user=self.user, name=self.unique('Bench category'))
+
+    def new_transactions(self, count):
+        from expenses.models import Transaction
+        return Transaction.objects.bulk_create([
+            Transaction(user=self.user, category=self.category, amount=Decimal('12.50'),
+                        raw_description='BENCH FIXTURE', transaction_type='expense')
+            for _ in range(count)
+        ])
+
+    def duplicate_payload(self):
+        """A payload matching a transaction created today, created on first use."""
+        from expenses.models import Transaction
+
+        payload = _transaction_payload('BENCH DUPLICATE')
+        if self.duplicated is None:
+            self.duplicated = Transaction.objects.create(
+                user=self.user, amount=Decimal(payload['amount']), raw_description=payload['raw_description'],
+                transaction_type=payload['transaction_type'], currency=self.user.currency_preference
+            )
+        return payload
+
+    def new_budget(self):
+        from expenses.models import Budget
+        today = timezone.localdate()
+        return Budget.objects.create(user=self.user, category=self.category, period_start_date=today,
+                                     period_end_date=today + timedelta(days=30), limit_amount=Decimal('500'))
+
+    def deep_cursor(self, offset=5_000):
+        """Cursor for the list page `offset` rows into the user's history."""
+        from expenses.models import Transaction
+        from expenses.pagination import TransactionCursorPagination
+
+        row = (Transaction.objects.filter(user=self.user, is_active=True)
+               .order_by('-created_at', '-id').values('created_at', 'id')[offset:offset + 1].first())
+        if row is None:
+            return ''
+        return TransactionCursorPagination.encode_cursor(row['created_at'], row['id'])
+
+
+def _transaction_payload(description):
+    # Descriptions differ per call: a repeat of today's row is a duplicate.
+    return {'amount': '249.00', 'raw_description': description, 'transaction_type': 'expense'}
+
+
+def _import_file(tag, rows=500):
+    # A fresh tag per upload, or every run after the first is all duplicates.
+    lines = ['date,description,amount'] + [
+        f"{(timezone.localdate() - timedelta(days=index % 90)).isoformat()},POS {index} SWIGGY {tag},"
+        f"-{100 + index % 900}.00"
+        for index in range(rows)
+    ]
+    upload = io.BytesIO('\n'.join(lines).encode())
+    upload.name = 'statement.csv'
+    return upload
+
+
+def scenarios():
+    """
+    Every endpoint in users/urls.py, expenses/urls.py, expenses/async_urls.py
+    and insight/urls.py, except the never-ending tasks/events/ stream.
+    """
+    api = '/api/v1'
+    month_ago = (timezone.localdate() - timedelta(days=30)).isoformat()
+    return [
+        # users/urls.py
+        Scenario('auth.login', 'post', lambda ctx: (
+            f'{api}/auth/login/', {'email': ctx.user.email, 'password': BENCH_PASSWORD}), authenticated=False),
+        Scenario('auth.refresh', 'post', lambda ctx: (
+            f'{api}/auth/refresh/', {'refresh': ctx.refresh_token}), authenticated=False),
+        Scenario('auth.register', 'post', lambda ctx: (f'{api}/auth/register/', {
+            'email': f"bench-reg-{time.time_ns()}{BENCH_DOMAIN}", 'password': BENCH_PASSWORD,
+            'first_name': 'Bench', 'last_name': 'Register'}), authenticated=False, expected_status=(201,)),
+        Scenario('auth.profile.get', 'get', lambda ctx: (f'{api}/auth/profile/', None)),
+        Scenario('auth.profile.put', 'put', lambda ctx: (f'{api}/auth/profile/', {'first_name': 'Bench'})),
+
+        # expenses/urls.py: categories
+        Scenario('categories.list', 'get', lambda ctx: (f'{api}/categories/', None)),
+        Scenario('categories.detail', 'get', lambda ctx: (f'{api}/categories/{ctx.category.pk}/', None)),
+        Scenario('categories.create', 'post', lambda ctx: (
+            f'{api}/categories/', {'name': ctx.unique('Bench category'), 'keywords': 'bench'}),
+            expected_status=(201,)),
+        Scenario('categories.update', 'put', lambda ctx: (
+            f'{api}/categories/{ctx.category.pk}/', {'keywords': ctx.category.keywords})),
+        Scenario('categories.delete', 'delete', lambda ctx: (f'{api}/categories/{ctx.new_category().pk}/', None)),
+        Scenario('categories.bulk_create', 'post', lambda ctx: (f'{api}/categories/bulk/', {
+            'items': [{'name': ctx.unique('Bench bulk')} for _ in range(50)]})),
+
+        # expenses/urls.py: transactions
+        Scenario('transactions.list', 'get', lambda ctx: (f'{api}/expenses_trans/', None)),
+        Scenario('transactions.list_filtered', 'get', lambda ctx: (
+            f'{api}/expenses_trans/?start_date={month_ago}&transaction_type=expense&category={ctx.category.pk}',
+            None)),
+        Scenario('transactions.list_deep_cursor', 'get', lambda ctx: (
+            f'{api}/expenses_trans/?cursor={ctx.deep_cursor()}', None)),
+        Scenario('transactions.search', 'get', lambda ctx: (f'{api}/expenses_trans/search/?q=starbu', None)),
+        Scenario('transactions.search_filtered', 'get', lambda ctx: (
+            f'{api}/expenses_trans/search/?q=swiggy&start_date={month_ago}&min_amount=100', None)),
+        Scenario('expenses.list', 'get', lambda ctx: (f'{api}/expenses/', None)),
+        Scenario('transactions.detail', 'get', lambda ctx: (f'{api}/expenses_trans/{ctx.transaction.pk}/', None)),
+        Scenario('transactions.create', 'post', lambda ctx: (
+            f'{api}/expenses_trans/', _transaction_payload(ctx.unique('POS STARBUCKS'))), expected_status=(201,)),
+        Scenario('transactions.create_duplicate', 'post', lambda ctx: (
+            f'{api}/expenses_trans/', ctx.duplicate_payload(), {'Idempotency-Key': ctx.unique('bench')}),
+            expected_status=(409,)),
+        Scenario('transactions.update', 'put', lambda ctx: (
+            f'{api}/expenses_trans/{ctx.transaction.pk}/', {'amount': str(ctx.transaction.amount)})),
+        Scenario('transactions.delete', 'delete', lambda ctx: (
+            f'{api}/expenses_trans/{ctx.new_transactions(1)[0].pk}/', None)),
+        Scenario('transactions.bulk_create', 'post', lambda ctx: (f'{api}/expenses_trans/bulk/', {
+            'items': [_transaction_payload(ctx.unique('POS STARBUCKS')) for _ in range(100)]})),
+        Scenario('transactions.bulk_update', 'put', lambda ctx: (f'{api}/expenses_trans/bulk/', {
+            'items': [{'id': txn.pk, 'amount': '13.75'} for txn in ctx.new_transactions(100)]})),
+        Scenario('transactions.bulk_delete', 'delete', lambda ctx: (f'{api}/expenses_trans/bulk/', {
+            'ids': [txn.pk for txn in ctx.new_transactions(100)]})),
+        Scenario('transactions.import', 'post', lambda ctx: (
+            f'{api}/expenses_trans/import/', {'file': _import_file(ctx.unique('REF'))}),
+            format='multipart', expected_status=(202,)),
+        Scenario('transactions.export', 'post', lambda ctx: (
+            f'{api}/expenses_trans/export/?start_date={month_ago}', {'format': 'csv'}), expected_status=(202,)),
+
+        # expenses/urls.py: budgets, tasks, sync
+        Scenario('budgets.list', 'get', lambda ctx: (f'{api}/budgets/', None)),
+        Scenario('budgets.detail', 'get', lambda ctx: (f'{api}/budgets/{ctx.budget.pk}/', None)),
+        Scenario('budgets.create', 'post', lambda ctx: (f'{api}/budgets/', {
+            'category': ctx.category.pk, 'period_start_date': timezone.localdate().isoformat(),
+            'period_end_date': (timezone.localdate() + timedelta(days=30)).isoformat(),
+            'limit_amount': '750.00'}), expected_status=(201,)),
+        Scenario('budgets.update', 'put', lambda ctx: (
+            f'{api}/budgets/{ctx.budget.pk}/', {'limit_amount': str(ctx.budget.limit_amount)})),
+        Scenario('budgets.delete', 'delete', lambda ctx: (f'{api}/budgets/{ctx.new_budget().pk}/', None)),
+        Scenario('tasks.list', 'get', lambda ctx: (f'{api}/tasks/', None)),
+        Scenario('tasks.detail', 'get', lambda ctx: (f'{api}/tasks/{ctx.task.pk}/', None)),
+        Scenario('sync.full', 'get', lambda ctx: (f'{api}/sync/', None)),
+        Scenario('recurring.list', 'get', lambda ctx: (f'{api}/recurring/', None)),
+
+        # expenses/async_urls.py
+        Scenario('async.categories.list', 'get', lambda ctx: (f'{api}/async/categories/', None)),
+        Scenario('async.categories.detail', 'get', lambda ctx: (
+            f'{api}/async/categories/{ctx.category.pk}/', None)),
+        Scenario('async.transactions.list', 'get', lambda ctx: (f'{api}/async/expenses_trans/', None)),
+        Scenario('async.transactions.detail', 'get', lambda ctx: (
+            f'{api}/async/expenses_trans/{ctx.transaction.pk}/', None)),
+        Scenario('async.budgets.list', 'get', lambda ctx: (f'{api}/async/budgets/', None)),
+        Scenario('async.budgets.detail', 'get', lambda ctx: (f'{api}/async/budgets/{ctx.budget.pk}/', None)),
+        Scenario('async.tasks.list', 'get', lambda ctx: (f'{api}/async/tasks/', None)),
+        Scenario('async.tasks.detail', 'get', lambda ctx: (f'{api}/async/tasks/{ctx.task.pk}/', None)),
+        # The long poll returns at once: the client's known status is stale.
+        Scenario('async.tasks.wait', 'get', lambda ctx: (
+            f'{api}/async/tasks/{ctx.task.pk}/wait/?status=PENDING&timeout=5', None)),
+
+        # insight/urls.py
+        Scenario('insights.monthly_trend', 'get', lambda ctx: (f'{api}/insights/monthly-trend/', None)),
+        Scenario('insights.category_breakdown', 'get', lambda ctx: (f'{api}/insights/category-breakdown/', None)),
+        Scenario('insights.income_expense', 'get', lambda ctx: (f'{api}/insights/income-expense/', None)),
+    ]
+
+
+# --- Measurement ---
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _call(client, scenario, ctx):
+    path, body, *extra = scenario.request(ctx)
+    headers = {**scenario.headers, **(extra[0] if extra else {})}
+    if scenario.authenticated:
+        headers['Authorization'] = f'Bearer {ctx.access_token}'
+    send = getattr(client, scenario.method)
+    kwargs = {'format': scenario.format} if body is not None else {}
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        response = send(path, body, headers=headers, **kwargs)
+    return time.perf_counter() - started, len(queries), response.status_code
+
+
+def measure(scenario, ctx, client, iterations=30, warmup=3, memory_iterations=3):
+    for _ in range(warmup):
+        _call(client, scenario, ctx)
+
+    timings, query_counts, statuses = [], [], set()
+    for _ in range(iterations):
+        elapsed, queries, status = _call(client, scenario, ctx)
+        timings.append(elapsed * 1000)
+        query_counts.append(queries)
+        statuses.add(status)
+
+    # tracemalloc slows every allocation, so memory gets its own runs.
+    peak = 0
+    for _ in range(memory_iterations):
+        tracemalloc.start()
+        try:
+            _call(client, scenario, ctx)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    unexpected = sorted(status for status in statuses if status not in scenario.expected_status)
+    return {
+        'method': scenario.method.upper(),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(query_counts),
+        'peak_memory_kib': round(peak / 1024, 1),
+        'status_codes': sorted(statuses),
+        'errors': unexpected,
+    }
+
+
+def run(user, iterations=30, warmup=3, memory_iterations=3, only=None, log=print):
+    from expenses.models import Transaction
+    from rest_framework.test import APIClient
+
+    ctx = Context(user)
+    client = APIClient()
+    results = {}
+    for scenario in scenarios():
+        if only and not any(scenario.name.startswith(prefix) for prefix in only):
+            continue
+        results[scenario.name] = measure(scenario, ctx, client, iterations, warmup, memory_iterations)
+        result = results[scenario.name]
+        log(f"{scenario.name:<34} p50 {result['p50_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms  "
+            f"queries {result['queries']:4}  peak {result['peak_memory_kib']:9.1f} KiB"
+            + (f"  UNEXPECTED STATUS {result['errors']}" if result['errors'] else ''))
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'user_transactions': Transaction.objects.filter(user=user).count(),
+            'iterations': iterations,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'endpoints': results,
+    }
+
+
+# --- Threshold mode ---
+
+@dataclass
+class Thresholds:
+    latency_tolerance: float = 0.25  # allowed relative slowdown of p50/p99
+    latency_floor_ms: float = 2.0    # ignore slowdowns smaller than this
+    query_tolerance: int = 0         # allowed extra queries per request
+
+
+def regressions(current, baseline, thresholds: Optional[Thresholds] = None):
+    """Describe every endpoint that got slower or chattier than the baseline."""
+    thresholds = thresholds or Thresholds()
+    found = []
+    for name, now in current['endpoints'].items():
+        if now['errors']:
+            found.append(f"{name}: unexpected status codes {now['errors']}")
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if now['queries'] > before['queries'] + thresholds.query_tolerance:
+            found.append(f"{name}: queries {before['queries']} -> {now['queries']}")
+        for metric in ('p50_ms', 'p99_ms'):
+            limit = max(before[metric] * (1 + thresholds.latency_tolerance),
+                        before[metric] + thresholds.latency_floor_ms)
+            if now[metric] > limit:
+                found.append(f"{name}: {metric} {before[metric]} -> {now[metric]}")
+    return found
+
+
+def write_results(results, path):
+    with open(path, 'w') as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
@@ -0,0 +1,175 @@
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _generation_key(namespace, user_id):
+    return f"gen:{namespace}:{user_id}"
+
+
+def get_generation(namespace, user_id):
+    """
+    Return the current generation token for a user's cached data.
+
+    Anything cached under an older token is stale. If the key was evicted a
+    fresh token is minted, which safely invalidates every older copy.
+    """
+    key = _generation_key(namespace, user_id)
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        token = cache.get(key)
+    return token
+
+
+def bump_generation(namespace, user_id):
+    """Invalidate everything cached for the user in this namespace in O(1)."""
+    cache.set(_generation_key(namespace, user_id), time.time_ns(), timeout=None)
+
+
+def bump_generation_on_commit(namespace, user_id):
+    """
+    bump_generation once the current transaction commits (at once outside
+    one). Bumped earlier, a concurrent read could rebuild the cache from the
+    pre-commit rows and store them under the new generation and ETag.
+    """
+    transaction.on_commit(lambda: bump_generation(namespace, user_id))
+
+
+# --- Per-user read-through cache for list endpoints ---
+
+LIST_CACHE_TIMEOUT = 60 * 5
+
+CATEGORIES_NAMESPACE = 'categories'
+BUDGETS_NAMESPACE = 'budgets'
+TASKS_NAMESPACE = 'tasks'
+
+
+def _etag(namespace, user_id, generation):
+    return f'"{namespace}-{user_id}-{generation}"'
+
+
+def cached_list_response(request, namespace, message, build_data):
+    """
+    Serve a user's list from the cache, rebuilding it only after a write.
+
+    The cache key and the ETag both embed the user's generation token, so
+    a client polling with If-None-Match gets a 304 after a single cache
+    read: no database query and no serialization.
+    """
+    # Imported here to keep this module free of DRF for non-view callers.
+    from django.http import HttpResponseNotModified
+    from common.utils import api_success_response
+
+    user_id = request.user.id
+    generation = get_generation(namespace, user_id)
+    etag = _etag(namespace, user_id, generation)
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        key = f"list:{namespace}:{user_id}:{generation}"
+        data = cache.get(key)
+        if data is None:
+            data = build_data()
+            cache.set(key, data, LIST_CACHE_TIMEOUT)
+        response = api_success_response(message=message, data=data)
+
+    response['ETag'] = etag
+    # Responses differ per token, so shared caches must not reuse them.
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
+
+
+# --- Async access for ASGI views ---
+# Django's async cache methods run the sync client in a worker thread. With
+# django_redis these go to Redis directly through redis.asyncio instead,
+# using django_redis's own key and value encoding, so sync and async code
+# share entries.
+
+ASYNC_REDIS_MAX_CONNECTIONS = 50
+
+_async_redis_clients = weakref.WeakKeyDictionary()
+
+
+def uses_django_redis():
+    return settings.CACHES['default']['BACKEND'] == 'django_redis.cache.RedisCache'
+
+
+def async_redis():
+    """redis.asyncio client for the default cache's server, one per event loop."""
+    import redis.asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _async_redis_clients.get(loop)
+    if client is None:
+        location = settings.CACHES['default']['LOCATION']
+        if isinstance(location, (list, tuple)):
+            location = location[0]
+        # Blocking pool: a burst of waiting clients queues for a connection
+        # instead of opening one each.
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            location, max_connections=ASYNC_REDIS_MAX_CONNECTIONS
+        )
+        client = _async_redis_clients[loop] = redis.asyncio.Redis(connection_pool=pool)
+    return client
+
+
+async def acache_get(key):
+    if not uses_django_redis():
+        return await cache.aget(key)
+    raw = await async_redis().get(cache.client.make_key(key))
+    return None if raw is None else cache.client.decode(raw)
+
+
+async def acache_set(key, value, timeout, only_if_missing=False):
+    """cache.set (or cache.add with only_if_missing); timeout None keeps the key forever."""
+    if not uses_django_redis():
+        if only_if_missing:
+            return await cache.aadd(key, value, timeout)
+        return await cache.aset(key, value, timeout)
+    return await async_redis().set(
+        cache.client.make_key(key), cache.client.encode(value), ex=timeout, nx=only_if_missing
+    )
+
+
+async def aget_generation(namespace, user_id):
+    """get_generation for async views."""
+    key = _generation_key(namespace, user_id)
+    token = await acache_get(key)
+    if token is None:
+        await acache_set(key, time.time_ns(), None, only_if_missing=True)
+        token = await acache_get(key)
+    return token
+
+
+async def acached_list_response(request, namespace, message, build_data):
+    """cached_list_response for async views; build_data is a coroutine function."""
+    from django.http import HttpResponseNotModified
+    from common.async_views import json_success_response
+
+    user_id = request.user.id
+    generation = await aget_generation(namespace, user_id)
+    etag = _etag(namespace, user_id, generation)
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        key = f"list:{namespace}:{user_id}:{generation}"
+        data = await acache_get(key)
+        if data is None:
+            data = await build_data()
+            await acache_set(key, data, LIST_CACHE_TIMEOUT)
+        response = json_success_response(message=message, data=data)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
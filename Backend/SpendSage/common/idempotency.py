@@ -0,0 +1,99 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client that sends `Idempotency-Key: <unique string>` can retry the same
+request safely: the first response is kept in the cache (Redis) for
+IDEMPOTENCY_KEY_TTL and every retry with that key is answered from it,
+marked with `Idempotent-Replayed: true`, without running the view again.
+Keys are scoped to the user and path. A retry that arrives while the first
+request is still running gets 409, and reusing a key for a different
+request body gets 422. Only 2xx responses are kept, so a request that
+failed (validation errors included) can be corrected and sent again
+under the same key.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import status
+from rest_framework.response import Response
+
+from common.utils import api_error_response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# How long a key stays locked while its first request runs.
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+
+def _cache_key(request, key):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return f"idempotency:{request.user.id}:{request.path}:{digest}"
+
+
+def _request_digest(request):
+    """Hash of the request payload; uploads count by name and size, not content."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {
+            name: [[value.name, value.size] if isinstance(value, UploadedFile) else value for value in values]
+            for name, values in data.lists()
+        }
+    payload = json.dumps([sorted(request.query_params.lists()), data], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def idempotent(view_method):
+    """Decorate an APIView post() to honour the Idempotency-Key header."""
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return api_error_response(
+                message=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = _cache_key(request, key)
+        digest = _request_digest(request)
+        if not cache.add(cache_key, {'digest': digest, 'status': None}, timeout=IDEMPOTENCY_LOCK_SECONDS):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, digest)
+            # Expired between add() and get(); run the request.
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if not status.is_success(response.status_code):
+            cache.delete(cache_key)
+        else:
+            cache.set(
+                cache_key,
+                {'digest': digest, 'status': response.status_code, 'data': response.data},
+                timeout=settings.IDEMPOTENCY_KEY_TTL
+            )
+        return response
+
+    return wrapper
+
+
+def _replay(stored, digest):
+    if stored['digest'] != digest:
+        return api_error_response(
+            message=f"{IDEMPOTENCY_HEADER} was already used for a different request",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if stored['status'] is None:
+        return api_error_response(
+            message=f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+            status_code=status.HTTP_409_CONFLICT
+        )
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
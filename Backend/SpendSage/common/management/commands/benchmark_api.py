@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from common.benchmark import Thresholds, bench_email, benchmark_users, regressions, run, write_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p99 latency, query counts and peak memory of every expenses and "
+        "users endpoint against the seeded benchmark data (see seed_benchmark). "
+        "With --baseline, fail when an endpoint regressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--memory-iterations', type=int, default=3)
+        parser.add_argument('--only', nargs='*', default=None,
+                            help="Scenario name prefixes to run, e.g. transactions. budgets.list")
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--baseline', default=None, help="Earlier results JSON to compare against.")
+        parser.add_argument('--latency-tolerance', type=float, default=Thresholds.latency_tolerance,
+                            help="Allowed relative p50/p99 slowdown (0.25 = 25%%).")
+        parser.add_argument('--latency-floor-ms', type=float, default=Thresholds.latency_floor_ms,
+                            help="Slowdowns below this many milliseconds are ignored.")
+        parser.add_argument('--query-tolerance', type=int, default=Thresholds.query_tolerance,
+                            help="Allowed extra queries per request.")
+
+    def handle(self, *args, **options):
+        from SpendSage.celery import app
+
+        user = benchmark_users().filter(email=bench_email(0)).first()
+        if user is None:
+            raise CommandError("No benchmark data; run `manage.py seed_benchmark` first.")
+
+        # Import/export run inline so their cost is part of the measurement
+        # and no broker is needed.
+        app.conf.task_always_eager = True
+        setup_test_environment()
+        try:
+            results = run(
+                user,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                memory_iterations=options['memory_iterations'],
+                only=options['only'],
+                log=self.stdout.write,
+            )
+        finally:
+            teardown_test_environment()
+        write_results(results, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+
+        errors = [f"{name}: unexpected status codes {result['errors']}"
+                  for name, result in results['endpoints'].items() if result['errors']]
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+            thresholds = Thresholds(
+                latency_tolerance=options['latency_tolerance'],
+                latency_floor_ms=options['latency_floor_ms'],
+                query_tolerance=options['query_tolerance'],
+            )
+            errors = regressions(results, baseline, thresholds)
+        if errors:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(errors))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
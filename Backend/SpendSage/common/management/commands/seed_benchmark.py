@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from common.benchmark import SCALES, benchmark_users, reset, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic benchmark users, categories, budgets and transactions. "
+        "Run against a throwaway local database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='1k',
+                            help="Total transactions: 1k, 100k or 1m.")
+        parser.add_argument('--transactions', type=int, default=None,
+                            help="Exact transaction count; overrides --scale.")
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for reproducible data.")
+        parser.add_argument('--reset', action='store_true',
+                            help="Remove existing benchmark users (and their data) first.")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            removed = reset()
+            self.stdout.write(f"Removed {removed} benchmark users")
+        elif benchmark_users().exists():
+            raise CommandError("Benchmark users already exist; pass --reset to replace them.")
+
+        transactions = options['transactions'] or SCALES[options['scale']]
+        seed(transactions, users=options['users'], rng_seed=options['seed'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Seeded {transactions} transactions for {options['users']} users"))
@@ -0,0 +1,196 @@
+"""
+Minimal metrics in the Prometheus text exposition format.
+
+Observing a value is one bisect and a few increments under a lock, cheap
+enough to leave on for every request. The increments collect in the
+process; with django_redis as the cache, each process adds them to shared
+Redis hashes at most every METRICS_FLUSH_SECONDS and /metrics reports the
+Redis totals, so every gunicorn worker is counted whichever one answers the
+scrape. Without Redis the totals are the answering process's own, which is
+only right for a single-process deployment (runserver, tests).
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .cache import uses_django_redis
+
+METRICS_KEY_PREFIX = 'metrics:'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Values are kept as {(labels, part): number}; `part` tells the values of
+    one label set apart (bucket index or 'sum' for histograms).
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _add(self, labels, part, amount):
+        field = (labels, part)
+        self._values[field] = self._values.get(field, 0) + amount
+
+    def take(self):
+        """Return the values collected so far and start over from zero."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def collect(self, values):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._add(labels, None, amount)
+
+    def collect(self, values):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for (labels, _), value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._add(labels, index, 1)
+            self._add(labels, 'sum', value)
+
+    def collect(self, values):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        # labels -> [count per bucket (+Inf last), sum]
+        series = {}
+        for (labels, part), value in values.items():
+            counts, total = series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0]))
+            if part == 'sum':
+                total[0] += value
+            else:
+                counts[part] += value
+        for labels, (counts, (total,)) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(float(total))}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+REQUEST_LABELS = ('view', 'method')
+
+REQUESTS = Counter(
+    'spendsage_http_requests_total', "Requests by view, method and status code.",
+    REQUEST_LABELS + ('status',)
+)
+REQUEST_DURATION = Histogram(
+    'spendsage_http_request_duration_seconds', "Total time spent handling the request.", REQUEST_LABELS
+)
+DB_DURATION = Histogram(
+    'spendsage_http_db_duration_seconds', "Time spent in database queries per request.", REQUEST_LABELS
+)
+DB_QUERIES = Histogram(
+    'spendsage_http_db_queries', "Database queries issued per request.", REQUEST_LABELS, QUERY_COUNT_BUCKETS
+)
+RENDER_DURATION = Histogram(
+    'spendsage_http_render_duration_seconds', "Time spent rendering the response body (JSON encoding).",
+    REQUEST_LABELS
+)
+SERIALIZE_DURATION = Histogram(
+    'spendsage_http_serialize_duration_seconds', "Time spent in serializer.data building the response data.",
+    REQUEST_LABELS
+)
+
+REGISTRY = [REQUESTS, REQUEST_DURATION, DB_DURATION, DB_QUERIES, RENDER_DURATION, SERIALIZE_DURATION]
+
+_last_flush = time.monotonic()
+
+
+def _field(labels, part):
+    return json.dumps([list(labels), part])
+
+
+def _parse_field(field):
+    labels, part = json.loads(field)
+    return tuple(labels), part
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('default')
+
+
+def flush_due():
+    if not uses_django_redis():
+        return False
+    return time.monotonic() - _last_flush >= getattr(settings, 'METRICS_FLUSH_SECONDS', 1)
+
+
+def flush():
+    """Add this process's values to the shared totals in Redis, in one round trip."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    pipeline = _redis().pipeline(transaction=False)
+    for metric in REGISTRY:
+        key = METRICS_KEY_PREFIX + metric.name
+        for (labels, part), value in metric.take().items():
+            if isinstance(value, float):
+                pipeline.hincrbyfloat(key, _field(labels, part), value)
+            else:
+                pipeline.hincrby(key, _field(labels, part), value)
+    pipeline.execute()
+
+
+def render_metrics():
+    if not uses_django_redis():
+        return '\n'.join(line for metric in REGISTRY for line in metric.collect(metric.snapshot())) + '\n'
+    flush()
+    pipeline = _redis().pipeline(transaction=False)
+    for metric in REGISTRY:
+        pipeline.hgetall(METRICS_KEY_PREFIX + metric.name)
+    lines = []
+    for metric, stored in zip(REGISTRY, pipeline.execute()):
+        values = {}
+        for field, value in stored.items():
+            value = value.decode()
+            values[_parse_field(field)] = float(value) if '.' in value or 'e' in value else int(value)
+        lines.extend(metric.collect(values))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,187 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+slow_request_logger = logging.getLogger('spendsage.slow_requests')
+
+SLOW_REQUEST_TOP_STATEMENTS = 5
+
+# The stats of the request being handled, for the serializer timing below.
+_current_stats = ContextVar('request_stats', default=None)
+
+
+class _RequestStats:
+    """execute_wrapper that counts and times every query of one request."""
+
+    def __init__(self, collect_sql):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.serialize_seconds = 0.0
+        # Nesting depth of serializer.data calls; only the outermost is timed.
+        self.serializing = 0
+        # Statement text (parameters excluded), only kept for the slow log.
+        self.statements = Counter() if collect_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            if self.statements is not None:
+                self.statements[sql] += 1
+
+
+def _timed_data(data_property):
+    def data(serializer):
+        stats = _current_stats.get()
+        if stats is None or stats.serializing:
+            return data_property.fget(serializer)
+        stats.serializing += 1
+        started = time.perf_counter()
+        try:
+            return data_property.fget(serializer)
+        finally:
+            stats.serializing -= 1
+            stats.serialize_seconds += time.perf_counter() - started
+
+    data.timed = True
+    return property(data)
+
+
+def instrument_serializers():
+    """
+    Time serializer.data, where views turn model instances into response
+    data. That happens inside the view, before (and apart from) rendering.
+
+    Called once from CommonConfig.ready(); wrapping an already timed
+    property is a no-op, so a second call changes nothing. Outside a
+    request (Celery tasks, shell) the wrapper only does one ContextVar read.
+    """
+    from rest_framework import serializers
+
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not getattr(prop.fget, 'timed', False):
+            cls.data = _timed_data(prop)
+
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Unrouted paths (404s) share one label to keep cardinality bounded.
+        return '<unresolved>'
+    return match.url_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, DB time, serializer time, render time and total time for every
+    request, grouped by resolved URL name, into common.metrics (served at
+    /metrics). Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged to
+    'spendsage.slow_requests' with their most repeated SQL statements,
+    which is where N+1 patterns show up.
+
+    Async-capable, so async views under ASGI keep a fully async stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = _RequestStats(collect_sql=self.slow_threshold_ms is not None)
+        request._request_stats = stats
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, stats)
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        if metrics.flush_due():
+            metrics.flush()
+        return response
+
+    async def __acall__(self, request):
+        stats = _RequestStats(collect_sql=self.slow_threshold_ms is not None)
+        request._request_stats = stats
+        # Context variables follow the request into sync_to_async threads.
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        # The async ORM runs queries in the request's sync_to_async thread
+        # (one per request under ASGI), so the wrappers go on that thread's
+        # connections rather than the event loop's.
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        if metrics.flush_due():
+            await sync_to_async(metrics.flush)()
+        return response
+
+    @staticmethod
+    def wrap_connections(stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def record(self, request, response, stats, elapsed):
+        labels = (_view_label(request), request.method)
+        metrics.REQUESTS.inc(labels + (str(response.status_code),))
+        metrics.REQUEST_DURATION.observe(labels, elapsed)
+        metrics.DB_DURATION.observe(labels, stats.db_seconds)
+        metrics.DB_QUERIES.observe(labels, stats.queries)
+        metrics.RENDER_DURATION.observe(labels, stats.render_seconds)
+        metrics.SERIALIZE_DURATION.observe(labels, stats.serialize_seconds)
+
+        # Long-poll views are slow by design (request.long_poll).
+        slow = self.slow_threshold_ms is not None and elapsed * 1000 >= self.slow_threshold_ms
+        if slow and not getattr(request, 'long_poll', False):
+            self.log_slow_request(request, labels[0], elapsed, stats)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that part.
+        stats = getattr(request, '_request_stats', None)
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def log_slow_request(request, view, elapsed, stats):
+        repeated = [
+            f"{count}x {sql}" for sql, count in stats.statements.most_common(SLOW_REQUEST_TOP_STATEMENTS)
+            if count > 1
+        ]
+        slow_request_logger.warning(
+            "Slow request %s %s (%s): %.1f ms total, %d queries in %.1f ms, serialize %.1f ms, render %.1f ms%s",
+            request.method, request.path, view, elapsed * 1000, stats.queries,
+            stats.db_seconds * 1000, stats.serialize_seconds * 1000, stats.render_seconds * 1000,
+            ''.join(f"\n  {line}" for line in repeated),
+        )
@@ -0,0 +1,44 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    # orjson formats these itself, differently from DRF; defer to DRF's encoder.
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson.
+
+    Emits the same bytes as JSONRenderer with the default settings: compact
+    separators, raw UTF-8, and U+2028/U+2029 escaped. Anything orjson does
+    not handle natively (Decimal, dates, lazy strings) goes through DRF's
+    encoder exactly as before. Pretty-printed responses (?indent / the
+    browsable API) and ASCII-only settings use JSONRenderer itself.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_fallback_encoder.default, option=ORJSON_OPTIONS)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONRendererMixin:
+    """Swap JSONRenderer for ORJSONRenderer in a view's configured renderers."""
+
+    def get_renderers(self):
+        return [
+            ORJSONRenderer() if type(renderer) is JSONRenderer else renderer
+            for renderer in super().get_renderers()
+        ]
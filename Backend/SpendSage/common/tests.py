@@ -1,3 +1,209 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from expenses.models import Budget, Category, Transaction
+from users.models import User
+from .cache import CATEGORIES_NAMESPACE, bump_generation_on_commit, get_generation
+from . import metrics
+from .idempotency import MAX_KEY_LENGTH
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS, TRANSACTION_ENRICHMENT_SYNC=True)
+class CommonTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='common@example.com', username='common@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class ListCacheTests(CommonTestCase):
+    url = '/api/v1/categories/'
+
+    def test_unchanged_list_is_a_304_without_queries(self):
+        Category.objects.create(user=self.user, name='Coffee')
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.data, first.data)
+
+    def test_committed_write_changes_the_etag_and_the_data(self):
+        first = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(self.url, {'name': 'Rent'}, format='json').status_code, 201)
+
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual([row['name'] for row in response.data['data']], ['Rent'])
+
+    def test_generation_moves_only_once_the_write_commits(self):
+        before = get_generation(CATEGORIES_NAMESPACE, self.user.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_generation_on_commit(CATEGORIES_NAMESPACE, self.user.id)
+        self.assertEqual(get_generation(CATEGORIES_NAMESPACE, self.user.id), before)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generation(CATEGORIES_NAMESPACE, self.user.id), before)
+
+    def test_etags_are_per_user(self):
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(other)
+        etag = client.get(self.url)['ETag']
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_budget_list_follows_spend_changes(self):
+        category = Category.objects.create(user=self.user, name='Food')
+        today = timezone.localdate()
+        Budget.objects.create(user=self.user, category=category, period_start_date=today - timedelta(days=1),
+                              period_end_date=today + timedelta(days=1), limit_amount=Decimal('100'))
+        first = self.client.get('/api/v1/budgets/')
+        self.assertEqual(first.data['data'][0]['spent_amount'], '0.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.user, category=category, amount=Decimal('40'),
+                                       raw_description='LUNCH', transaction_type='expense', currency='INR')
+
+        response = self.client.get('/api/v1/budgets/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'][0]['spent_amount'], '40.00')
+
+
+class IdempotencyTests(CommonTestCase):
+    url = '/api/v1/categories/bulk/'
+
+    def post(self, items, key='key-1', client=None):
+        return (client or self.client).post(self.url, {'items': items}, format='json', headers={'Idempotency-Key': key})
+
+    def test_replay_answers_without_running_the_view(self):
+        first = self.post([{'name': 'Rent'}])
+
+        with self.assertNumQueries(0):
+            again = self.post([{'name': 'Rent'}])
+
+        self.assertEqual((again.status_code, again.data), (first.status_code, first.data))
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+
+    def test_key_reused_for_another_body(self):
+        self.post([{'name': 'Rent'}])
+        self.assertEqual(self.post([{'name': 'Food'}]).status_code, 422)
+
+    def test_failed_request_can_be_corrected_under_the_same_key(self):
+        self.assertEqual(self.client.post(self.url, {'items': 'nope'}, format='json',
+                                          headers={'Idempotency-Key': 'key-1'}).status_code, 400)
+        self.assertEqual(self.post([{'name': 'Rent'}]).status_code, 200)
+
+    def test_request_still_running(self):
+        # The first request holds the key but has no response yet.
+        running = {'digest': 'digest', 'status': None}
+        with mock.patch('common.idempotency._request_digest', return_value='digest'), \
+                mock.patch('common.idempotency.cache.add', return_value=False), \
+                mock.patch('common.idempotency.cache.get', return_value=running):
+            self.assertEqual(self.post([{'name': 'Rent'}]).status_code, 409)
+
+    def test_keys_belong_to_one_user(self):
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.post([{'name': 'Rent'}])
+
+        response = self.post([{'name': 'Rent'}], client=client)
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertTrue(Category.objects.filter(user=other, name='Rent').exists())
+
+    def test_overlong_key(self):
+        self.assertEqual(self.post([{'name': 'Rent'}], key='k' * (MAX_KEY_LENGTH + 1)).status_code, 400)
+
+
+class MetricsFormatTests(TestCase):
+    def test_counter(self):
+        counter = metrics.Counter('jobs_total', "Jobs.", ('queue',))
+        counter.inc(('de"fault',))
+        counter.inc(('de"fault',), 2)
+
+        self.assertEqual(list(counter.collect(counter.take())), [
+            '# HELP jobs_total Jobs.', '# TYPE jobs_total counter', 'jobs_total{queue="de\\"fault"} 3',
+        ])
+        self.assertEqual(counter.snapshot(), {})
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('size', "Sizes.", buckets=(1, 5))
+        for value in (0.5, 1, 3, 7):
+            histogram.observe((), value)
+
+        self.assertEqual(list(histogram.collect(histogram.snapshot()))[2:], [
+            'size_bucket{le="1.0"} 2', 'size_bucket{le="5.0"} 3', 'size_bucket{le="+Inf"} 4',
+            'size_sum 11.5', 'size_count 4',
+        ])
+
+
+class RequestMetricsTests(CommonTestCase):
+    labels = ('categories', 'GET')
+
+    def totals(self):
+        """Requests answered 200, queries issued and serializer timings so far."""
+        serialized = metrics.SERIALIZE_DURATION.snapshot()
+        return (
+            metrics.REQUESTS.snapshot().get((self.labels + ('200',), None), 0),
+            metrics.DB_QUERIES.snapshot().get((self.labels, 'sum'), 0),
+            sum(count for (labels, part), count in serialized.items() if labels == self.labels and part != 'sum'),
+        )
+
+    def test_requests_are_counted_with_their_queries(self):
+        before = self.totals()
+        self.client.get('/api/v1/categories/')
+
+        # One request, one query (the list itself), one serializer timing.
+        self.assertEqual([new - old for new, old in zip(self.totals(), before)], [1, 1, 1])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_requests_are_logged_with_repeated_statements(self):
+        with self.assertLogs('spendsage.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/v1/categories/')
+
+        self.assertIn('Slow request GET /api/v1/categories/ (categories)', logs.output[0])
+        self.assertIn('1 queries', logs.output[0])
+
+    def test_serializers_are_timed_once_from_startup(self):
+        from rest_framework import serializers
+        from .middleware import instrument_serializers
+
+        timed = serializers.Serializer.__dict__['data']
+        self.assertTrue(timed.fget.timed)
+        instrument_serializers()
+        self.assertIs(serializers.Serializer.__dict__['data'], timed)
+
+    def test_scrape_access(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE spendsage_http_requests_total counter', response.content)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1', headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(response.status_code, 200)
@@ -20,4 +20,22 @@ class BaseUserViewSet(viewsets.ModelViewSet):
         The HiddenField in the serializer already handles this, but 
         this ensures consistency.
         """
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. When METRICS_TOKEN is set the scraper must
+    send it as a bearer token; without one only METRICS_ALLOWED_IPS
+    (loopback by default) may scrape.
+    """
+    from django.conf import settings
+    from django.http import HttpResponse
+    from .metrics import render_metrics
+
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponse(status=401)
+    elif request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')):
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,10 +1,13 @@
 from django.contrib import admin
-from .models import Category, Transaction, Budget, BackgroundTask
+from .models import Category, Merchant, Transaction, ExchangeRate, RecurringSeries, Budget, BackgroundTask
 
 # Register your models here.
 
 admin.site.register(Category)
+admin.site.register(Merchant)
 admin.site.register(Transaction)
 admin.site.register(Budget)
 admin.site.register(BackgroundTask)
+admin.site.register(ExchangeRate)
+admin.site.register(RecurringSeries)
 
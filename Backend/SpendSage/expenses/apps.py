@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_search_indexes(sender, using, **kwargs):
+    from .search import create_search_indexes
+
+    create_search_indexes(using)
 
 
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Raw SQL indexes for search.py, which migrations cannot describe.
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,158 @@
+"""
+Cold tier for old Transaction partitions.
+
+`manage.py archive_transactions` writes each monthly partition older than
+TRANSACTION_ARCHIVE_AFTER_MONTHS to one zstd-compressed Parquet file in
+TRANSACTION_ARCHIVE_DIR, then detaches and drops the partition. Rows are
+sorted by (user_id, created_at), so a per-user read skips almost every row
+group on the file statistics. The daily/monthly rollups are not touched by
+archiving; rebuild_user_rollups folds the archive back in (insight.service).
+"""
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Transaction
+from .partitions import (
+    add_months, check_postgres, detach_partition, is_partitioned, monthly_partitions, month_start,
+    PartitioningError, TABLE,
+)
+from .spend import SpendEntry
+
+ARCHIVE_CHUNK_SIZE = 50000
+
+
+def archive_dir():
+    return Path(settings.TRANSACTION_ARCHIVE_DIR)
+
+
+def archive_path(month):
+    return archive_dir() / f"transactions_{month.year:04d}_{month.month:02d}.parquet"
+
+
+def _arrow_type(field):
+    import pyarrow as pa
+
+    if field.remote_field:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if internal_type in ('AutoField', 'BigAutoField', 'BigIntegerField', 'IntegerField', 'PositiveIntegerField'):
+        return pa.int64()
+    if internal_type == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if internal_type == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    if internal_type == 'DateField':
+        return pa.date32()
+    if internal_type == 'BooleanField':
+        return pa.bool_()
+    if internal_type in ('CharField', 'TextField'):
+        return pa.string()
+    raise TypeError(f"No archive type for Transaction.{field.name} ({internal_type})")
+
+
+def archive_schema():
+    """Parquet schema mirroring Transaction's columns, derived from the model."""
+    import pyarrow as pa
+
+    return pa.schema([
+        (field.column, _arrow_type(field)) for field in Transaction._meta.concrete_fields
+    ])
+
+
+def _write_month(month, path):
+    import pyarrow.parquet as pq
+
+    schema = archive_schema()
+    # Partition pruning keeps this scan inside the one partition.
+    rows = (
+        Transaction.objects.filter(created_at__gte=month, created_at__lt=add_months(month, 1))
+        .order_by('user_id', 'created_at', 'id')
+        .values_list(*[field.attname for field in Transaction._meta.concrete_fields])
+        .iterator(chunk_size=ARCHIVE_CHUNK_SIZE)
+    )
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == ARCHIVE_CHUNK_SIZE:
+                written += _write_chunk(writer, schema, chunk)
+                chunk = []
+        if chunk:
+            written += _write_chunk(writer, schema, chunk)
+    return written
+
+
+def _write_chunk(writer, schema, chunk):
+    import pyarrow as pa
+
+    columns = list(zip(*chunk))
+    writer.write_table(pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    ))
+    return len(chunk)
+
+
+def archivable_months(older_than_months, now):
+    """Monthly partitions that end at least `older_than_months` before now."""
+    check_postgres()
+    cutoff = add_months(month_start(now), -older_than_months)
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise PartitioningError(f"{TABLE} is not partitioned; run partition_transactions --convert")
+        return sorted(month for month in monthly_partitions(cursor) if month < cutoff)
+
+
+def archive_month(month):
+    """Move one monthly partition to Parquet. Returns the number of rows archived."""
+    check_postgres()
+    path = archive_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.parquet.partial')
+    with transaction.atomic():
+        written = _write_month(month, partial)
+        # The file must be complete before the rows go away; if dropping
+        # the partition fails the file is removed again.
+        os.replace(partial, path)
+        try:
+            with connection.cursor() as cursor:
+                detach_partition(cursor, month)
+        except Exception:
+            path.unlink()
+            raise
+    return written
+
+
+def read_archived_transactions(user_id, columns=None):
+    """
+    The user's archived rows as a pyarrow Table (None when nothing is
+    archived). Only live rows counted by the app are returned.
+    """
+    files = sorted(str(path) for path in archive_dir().glob('*.parquet'))
+    if not files:
+        return None
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(files, format='parquet', schema=archive_schema())
+    return dataset.to_table(
+        columns=columns,
+        filter=(ds.field('user_id') == user_id) & ds.field('is_active') & ~ds.field('enrichment_pending'),
+    )
+
+
+def archived_spend_entries(user_id):
+    """SpendEntry tuples for the user's archived rows, for rollup rebuilds."""
+    table = read_archived_transactions(
+        user_id, columns=['user_id', 'category_id', 'transaction_type', 'created_at', 'amount', 'currency']
+    )
+    if table is None:
+        return []
+    return [
+        SpendEntry(row['user_id'], row['category_id'], (row['transaction_type'] or '').lower(),
+                   row['created_at'], row['amount'], row['currency'])
+        for row in table.to_pylist()
+    ]
@@ -0,0 +1,24 @@
+from django.urls import path
+
+from .async_views import (
+    AsyncCategoryAPIView,
+    AsyncTransactionAPIView,
+    AsyncBudgetAPIView,
+    AsyncBackgroundTaskAPIView,
+    BackgroundTaskWaitAPIView,
+    BackgroundTaskEventsAPIView,
+)
+
+# Mounted under api/v1/async/ (see SpendSage/urls.py); GET only.
+urlpatterns = [
+    path('categories/', AsyncCategoryAPIView.as_view(), name='async_categories'),
+    path('categories/<int:pk>/', AsyncCategoryAPIView.as_view(), name='async_category'),
+    path('expenses_trans/', AsyncTransactionAPIView.as_view(), name='async_expenses_trans'),
+    path('expenses_trans/<int:pk>/', AsyncTransactionAPIView.as_view(), name='async_expenses_tran'),
+    path('budgets/', AsyncBudgetAPIView.as_view(), name='async_budgets'),
+    path('budgets/<int:pk>/', AsyncBudgetAPIView.as_view(), name='async_budget'),
+    path('tasks/', AsyncBackgroundTaskAPIView.as_view(), name='async_tasks'),
+    path('tasks/events/', BackgroundTaskEventsAPIView.as_view(), name='async_task_events'),
+    path('tasks/<int:pk>/', AsyncBackgroundTaskAPIView.as_view(), name='async_task'),
+    path('tasks/<int:pk>/wait/', BackgroundTaskWaitAPIView.as_view(), name='async_task_wait'),
+]
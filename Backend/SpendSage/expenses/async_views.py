@@ -0,0 +1,227 @@
+"""
+Async (ASGI) versions of the read endpoints.
+
+Same responses as the sync views in views.py, but a request waiting on
+Postgres or Redis does not hold a worker thread, so one ASGI process can
+serve many slow or long-polling clients. Writes stay on the sync views.
+"""
+import asyncio
+import math
+
+import orjson
+from django.http import StreamingHttpResponse
+from rest_framework import status
+
+from common.async_views import AsyncAPIView, json_success_response, json_error_response
+from common.cache import (
+    acached_list_response, aget_generation, uses_django_redis,
+    CATEGORIES_NAMESPACE, BUDGETS_NAMESPACE, TASKS_NAMESPACE
+)
+from .filters import filter_transactions, InvalidFilter
+from .models import Transaction, Category, Budget, BackgroundTask
+from .pagination import TransactionCursorPagination, InvalidCursor
+from .readers import TRANSACTION_READER, BUDGET_READER
+from .serializers import CategorySerializer, TransactionSerializer, BudgetSerializer, BackgroundTaskSerializer
+from .task_status import aget_task_status, apending_task_statuses, task_event_hub
+
+# Long-poll on task status: how long one request may wait, and how often it
+# checks the user's task generation token (one Redis GET) while waiting.
+TASK_WAIT_TIMEOUT = 25
+TASK_WAIT_MAX_TIMEOUT = 55
+TASK_WAIT_INTERVAL = 0.5
+# Comment line sent on an idle event stream so proxies keep it open.
+TASK_EVENTS_HEARTBEAT = 15
+TASK_EVENTS_RETRY_MS = 3000
+
+
+def _not_found(label):
+    return json_error_response(message=f"{label} not found", status_code=status.HTTP_404_NOT_FOUND)
+
+
+class AsyncCategoryAPIView(AsyncAPIView):
+    """Async GET for categories (list and detail)."""
+
+    async def get(self, request, pk=None):
+        if pk:
+            category = await Category.objects.filter(user=request.user, is_active=True, pk=pk).afirst()
+            if not category:
+                return _not_found("Category")
+            return json_success_response(
+                message="Categories retrieved successfully", data=CategorySerializer(category).data
+            )
+
+        async def build_data():
+            categories = [c async for c in Category.objects.filter(user=request.user, is_active=True)]
+            return CategorySerializer(categories, many=True).data
+
+        return await acached_list_response(
+            request, CATEGORIES_NAMESPACE, "Categories retrieved successfully", build_data
+        )
+
+
+class AsyncTransactionAPIView(AsyncAPIView):
+    """Async GET for transactions (cursor-paginated list and detail)."""
+
+    async def get(self, request, pk=None):
+        if pk:
+            transaction = await Transaction.objects.select_related('category').filter(
+                user=request.user, is_active=True, pk=pk
+            ).afirst()
+            if not transaction:
+                return _not_found("Transaction")
+            return json_success_response(
+                message="Transaction retrieved successfully", data=TransactionSerializer(transaction).data
+            )
+
+        transactions = Transaction.objects.filter(user=request.user, is_active=True)
+        paginator = TransactionCursorPagination()
+        try:
+            transactions = filter_transactions(transactions, request.GET)
+            page = await paginator.apaginate_queryset(TRANSACTION_READER.values(transactions), request)
+        except (InvalidFilter, InvalidCursor) as exc:
+            return json_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        return json_success_response(
+            message="Transactions retrieved successfully",
+            data=paginator.get_paginated_data(TRANSACTION_READER.format(page))
+        )
+
+
+class AsyncBudgetAPIView(AsyncAPIView):
+    """Async GET for budgets (list and detail)."""
+
+    async def get(self, request, pk=None):
+        budgets = Budget.objects.filter(user=request.user, is_active=True)
+        if pk:
+            rows = [row async for row in BUDGET_READER.values(budgets.filter(pk=pk))]
+            if not rows:
+                return _not_found("Budget")
+            return json_success_response(
+                message="Budget retrieved successfully", data=BUDGET_READER.format(rows)[0]
+            )
+
+        async def build_data():
+            return BUDGET_READER.format([row async for row in BUDGET_READER.values(budgets)])
+
+        return await acached_list_response(
+            request, BUDGETS_NAMESPACE, "Budgets retrieved successfully", build_data
+        )
+
+
+class AsyncBackgroundTaskAPIView(AsyncAPIView):
+    """Async GET for the user's background tasks (list and detail)."""
+
+    async def get(self, request, pk=None):
+        if pk:
+            # Redis first (pushed by the workers), then the row.
+            task_status = await aget_task_status(request.user, pk)
+            if not task_status:
+                return _not_found("Background task")
+            return json_success_response(message="Background task retrieved successfully", data=task_status)
+
+        async def build_data():
+            tasks = [t async for t in BackgroundTask.objects.filter(user=request.user)]
+            return BackgroundTaskSerializer(tasks, many=True).data
+
+        return await acached_list_response(
+            request, TASKS_NAMESPACE, "Background tasks retrieved successfully", build_data
+        )
+
+
+class BackgroundTaskWaitAPIView(AsyncAPIView):
+    """
+    Long-poll for a task status change: GET tasks/<pk>/wait/?status=PENDING.
+
+    Returns as soon as the task's status differs from `status`, or with the
+    unchanged task after `timeout` seconds (default 25, max 55); the client
+    then asks again. While waiting only the user's task generation token is
+    read, which every BackgroundTask save bumps, and the row is re-read only
+    after it moves.
+    """
+
+    async def get(self, request, pk):
+        request.long_poll = True  # kept out of the slow request log
+        try:
+            timeout = float(request.GET.get('timeout', TASK_WAIT_TIMEOUT))
+            if not math.isfinite(timeout):
+                raise ValueError
+        except ValueError:
+            return json_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": "timeout must be a number"},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        known_status = request.GET.get('status')
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(max(timeout, 0), TASK_WAIT_MAX_TIMEOUT)
+
+        generation = None
+        while True:
+            current = await aget_generation(TASKS_NAMESPACE, request.user.id)
+            if current != generation:
+                generation = current
+                task = await BackgroundTask.objects.filter(user=request.user, pk=pk).afirst()
+                if not task:
+                    return _not_found("Background task")
+                if task.status != known_status:
+                    break
+            if loop.time() >= deadline:
+                break
+            await asyncio.sleep(TASK_WAIT_INTERVAL)
+
+        return json_success_response(
+            message="Background task retrieved successfully", data=BackgroundTaskSerializer(task).data
+        )
+
+
+def _sse(data):
+    return b'event: task\ndata: ' + data + b'\n\n'
+
+
+class BackgroundTaskEventsAPIView(AsyncAPIView):
+    """
+    Server-sent events for the user's tasks: GET tasks/events/.
+
+    Opens with the state of every PENDING task, then relays each status
+    and progress update the workers publish (task_status.py) as an
+    `event: task` message. Needs django_redis, whose pub/sub carries the
+    updates; use tasks/<pk>/wait/ otherwise.
+    """
+
+    async def get(self, request):
+        if not uses_django_redis():
+            return json_error_response(
+                message="Task events need the Redis cache backend",
+                status_code=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        request.long_poll = True  # kept out of the slow request log
+        response = StreamingHttpResponse(self.stream(request.user), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+        return response
+
+    async def stream(self, user):
+        # EventSource reconnects by itself after this delay when the stream ends.
+        yield f"retry: {TASK_EVENTS_RETRY_MS}\n\n".encode()
+        hub = task_event_hub()
+        try:
+            async with hub.subscribe(user.id) as queue:
+                for payload in await apending_task_statuses(user):
+                    yield _sse(orjson.dumps(payload))
+                while True:
+                    try:
+                        data = await asyncio.wait_for(queue.get(), TASK_EVENTS_HEARTBEAT)
+                    except TimeoutError:
+                        if hub.reader.done():
+                            return
+                        yield b': keep-alive\n\n'
+                        continue
+                    if data is None:
+                        return
+                    yield _sse(data)
+        except TimeoutError:
+            # The hub could not subscribe in time; the client retries.
+            return
@@ -0,0 +1,148 @@
+"""
+Budget evaluation engine.
+
+Budget.spent_amount and Budget.status are maintained incrementally: each
+transaction write only touches the budgets whose category and period
+contain it, and the new status is computed inside the same UPDATE. Listing
+budgets therefore never aggregates transactions.
+
+Budgets are kept in the owner's currency_preference; spending in other
+currencies is converted at the rate of its day (currency.py). Changing the
+preference recalculates all of the user's budgets (recalculate_user_budgets).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+
+from common.cache import bump_generation_on_commit, BUDGETS_NAMESPACE
+from .currency import convert_amounts, convert_rows, user_currency
+from .models import Budget, Transaction
+
+# Spending at or above this share of the limit puts a budget AT_RISK.
+AT_RISK_RATIO = Decimal('0.8')
+
+
+def budget_status(spent, limit):
+    if spent > limit:
+        return 'EXCEEDED'
+    if spent >= limit * AT_RISK_RATIO:
+        return 'AT_RISK'
+    return 'ON_TRACK'
+
+
+def _status_expression(spent):
+    """SQL CASE mirroring budget_status() for an UPDATE."""
+    return Case(
+        When(GreaterThan(spent, F('limit_amount')), then=Value('EXCEEDED')),
+        When(GreaterThanOrEqual(spent, F('limit_amount') * AT_RISK_RATIO), then=Value('AT_RISK')),
+        default=Value('ON_TRACK'),
+    )
+
+
+def _budget_entries(entries):
+    # Budgets only track categorized spending.
+    return [e for e in entries if e.transaction_type == 'expense' and e.category_id is not None]
+
+
+def apply_spend_changes(removed, added):
+    """
+    Adjust spent_amount/status of only the budgets affected by the changes.
+
+    One SELECT finds the candidate budgets for the whole batch, then each
+    affected budget gets a single relative UPDATE (safe under concurrency).
+    """
+    signed = [(entry, -1) for entry in _budget_entries(removed)] + [(entry, 1) for entry in _budget_entries(added)]
+    if not signed:
+        return
+
+    days = [timezone.localdate(entry.created_at) for entry, _ in signed]
+    by_owner = defaultdict(list)
+    for index, (entry, _) in enumerate(signed):
+        by_owner[(entry.user_id, entry.category_id)].append((days[index], index))
+
+    window = Q()
+    for (user_id, category_id), changes in by_owner.items():
+        owner_days = [day for day, _ in changes]
+        window |= Q(
+            user_id=user_id, category_id=category_id,
+            period_start_date__lte=max(owner_days), period_end_date__gte=min(owner_days)
+        )
+    budgets = list(
+        Budget.objects.filter(window, is_active=True)
+        .values_list('id', 'user_id', 'category_id', 'period_start_date', 'period_end_date')
+    )
+    if not budgets:
+        return
+
+    # Converted to the owners' currencies only once a budget is affected.
+    targets = {user_id: user_currency(user_id) for _, user_id, *_ in budgets}
+    amounts = convert_amounts(
+        [entry.amount * sign for entry, sign in signed], [entry.currency for entry, _ in signed], days,
+        [targets.get(entry.user_id, entry.currency) for entry, _ in signed]
+    )
+    deltas = defaultdict(Decimal)
+    for pk, user_id, category_id, start, end in budgets:
+        for day, index in by_owner[(user_id, category_id)]:
+            if start <= day <= end:
+                deltas[pk] += amounts[index]
+
+    budget_owners = {pk: user_id for pk, user_id, *_ in budgets}
+    touched_users = set()
+    for pk, delta in deltas.items():
+        if delta:
+            spent = F('spent_amount') + delta
+            # update() skips auto_now; delta sync relies on updated_at moving.
+            # The clock is read here rather than with Now(), which is the
+            # start of the database transaction and can lag far behind.
+            Budget.objects.filter(pk=pk).update(
+                spent_amount=spent, status=_status_expression(spent), updated_at=timezone.now()
+            )
+            touched_users.add(budget_owners[pk])
+    # update() sends no signals, so invalidate cached budget lists here.
+    for user_id in touched_users:
+        bump_generation_on_commit(BUDGETS_NAMESPACE, user_id)
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def recalculate_budget(budget):
+    """
+    Recompute one budget from its transactions.
+
+    Used when the budget itself changes (new, other category, window or
+    limit); served by the (user, category, created_at) transaction index.
+    """
+    rows = Transaction.objects.filter(
+        user_id=budget.user_id,
+        category_id=budget.category_id,
+        is_active=True,
+        enrichment_pending=False,
+        transaction_type__in=['expense', 'EXPENSE'],
+        created_at__gte=_start_of_day(budget.period_start_date),
+        created_at__lt=_start_of_day(budget.period_end_date + timedelta(days=1)),
+    ).annotate(day=TruncDate('created_at')).values('currency', 'day').annotate(total=Sum('amount')).order_by()
+    # One row per day and currency, converted together.
+    rows = convert_rows(list(rows), user_currency(budget.user_id), 'day')
+    spent = sum((row['total'] for row in rows), Decimal('0'))
+    budget.spent_amount = spent
+    budget.status = budget_status(spent, budget.limit_amount)
+    Budget.objects.filter(pk=budget.pk).update(
+        spent_amount=budget.spent_amount, status=budget.status, updated_at=timezone.now()
+    )
+    bump_generation_on_commit(BUDGETS_NAMESPACE, budget.user_id)
+    return budget
+
+
+def recalculate_user_budgets(user_id):
+    """Recompute every active budget of a user, e.g. after their currency changed."""
+    budgets = Budget.objects.filter(user_id=user_id, is_active=True)
+    for budget in budgets:
+        recalculate_budget(budget)
+    return len(budgets)
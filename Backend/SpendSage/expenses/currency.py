@@ -0,0 +1,226 @@
+"""
+Currency conversion for totals.
+
+Transaction amounts are stored in their own currency; insight totals and
+budgets are reported in the owner's currency_preference. Rates come from
+ExchangeRate (loaded from a file by `manage.py load_exchange_rates`), each
+quoted as units of currency per one EXCHANGE_RATE_BASE. A day converts at
+the latest rate on or before it, or the earliest rate for days before the
+table starts.
+
+Callers convert aggregated rows (one per bucket and currency), never
+single transactions, and a whole result set goes through numpy in one
+pass: amounts become integer cents and each rate a fixed-point integer
+(mantissa / 10**exponent), so the arithmetic is exact and rounds half away
+from zero like Decimal's ROUND_HALF_UP. Rows already in the target
+currency skip all of it.
+"""
+import csv
+import time
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from datetime import date
+from decimal import Context, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from users.models import cached_user_row
+from .models import ExchangeRate
+
+# Significant digits kept of a cross rate: more than any published rate has,
+# and small enough that cents * mantissa fits in int64 for real totals.
+RATE_DIGITS = 8
+# Each process re-reads the rate table this often, picking up new loads.
+RATE_TABLE_SECONDS = 10 * 60
+RATE_PAIR_CACHE_SIZE = 4096
+RATE_LOAD_BATCH_SIZE = 5000
+INT64_MAX = 2 ** 63 - 1
+
+_rate_context = Context(prec=RATE_DIGITS)
+
+
+class MissingRate(LookupError):
+    """No exchange rate is loaded for a currency."""
+
+
+class InvalidRateFile(ValueError):
+    """A line of the exchange-rate file could not be read."""
+
+
+def _fixed_point(rate):
+    """(mantissa, exponent) with rate == mantissa / 10**exponent."""
+    _, digits, exponent = _rate_context.plus(rate).as_tuple()
+    mantissa = int(''.join(map(str, digits)))
+    if exponent > 0:
+        return mantissa * 10 ** exponent, 0
+    return mantissa, -exponent
+
+
+class RateTable:
+    """
+    The ExchangeRate rows of one process: {currency: (days, rates)} sorted
+    by day, and the fixed-point cross rates worked out from them, cached
+    per (day, from, to) with LRU eviction.
+    """
+
+    def __init__(self, series):
+        self.series = series
+        self.loaded_at = time.monotonic()
+        self.pairs = OrderedDict()
+
+    @classmethod
+    def load(cls):
+        series = defaultdict(lambda: ([], []))
+        rows = ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate')
+        for currency, day, rate in rows.iterator(chunk_size=5000):
+            days, rates = series[currency]
+            days.append(day)
+            rates.append(rate)
+        return cls(dict(series))
+
+    def has(self, currency):
+        return currency == settings.EXCHANGE_RATE_BASE or currency in self.series
+
+    def base_rate(self, currency, day):
+        if currency == settings.EXCHANGE_RATE_BASE:
+            return Decimal(1)
+        try:
+            days, rates = self.series[currency]
+        except KeyError:
+            raise MissingRate(f"No exchange rate loaded for {currency}")
+        return rates[max(bisect_right(days, day) - 1, 0)]
+
+    def pair_rate(self, day, from_currency, to_currency):
+        key = (day, from_currency, to_currency)
+        rate = self.pairs.get(key)
+        if rate is not None:
+            self.pairs.move_to_end(key)
+            return rate
+        rate = self.pairs[key] = _fixed_point(
+            self.base_rate(to_currency, day) / self.base_rate(from_currency, day)
+        )
+        if len(self.pairs) > RATE_PAIR_CACHE_SIZE:
+            self.pairs.popitem(last=False)
+        return rate
+
+
+_table = None
+
+
+def rate_table():
+    global _table
+    table = _table
+    if table is None or time.monotonic() - table.loaded_at > RATE_TABLE_SECONDS:
+        table = _table = RateTable.load()
+    return table
+
+
+def clear_rate_table():
+    """Drop this process's rates, e.g. after loading new ones."""
+    global _table
+    _table = None
+
+
+def _parse_rate_line(line_number, row):
+    try:
+        currency = row['currency'].strip().upper()
+        day = date.fromisoformat(row['date'].strip())
+        rate = Decimal(row['rate'].strip())
+    except (KeyError, AttributeError, ValueError, InvalidOperation):
+        raise InvalidRateFile(f"Line {line_number}: expected date,currency,rate, got {row}")
+    if len(currency) != 3 or not currency.isalpha() or not rate > 0:
+        raise InvalidRateFile(f"Line {line_number}: invalid currency or rate")
+    return ExchangeRate(currency=currency, date=day, rate=rate)
+
+
+@transaction.atomic
+def load_exchange_rates(path):
+    """
+    Upsert the rates of a CSV file with a date,currency,rate header (rates per
+    one EXCHANGE_RATE_BASE). Returns the number of rows read.
+    """
+    count = 0
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        reader = csv.DictReader(stream)
+        batch = []
+        for row in reader:
+            batch.append(_parse_rate_line(reader.line_num, row))
+            if len(batch) == RATE_LOAD_BATCH_SIZE:
+                count += _upsert_rates(batch)
+                batch = []
+        count += _upsert_rates(batch)
+    clear_rate_table()
+    return count
+
+
+def _upsert_rates(batch):
+    ExchangeRate.objects.bulk_create(
+        batch, update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate']
+    )
+    return len(batch)
+
+
+def is_convertible(from_currency, to_currency):
+    if from_currency == to_currency:
+        return True
+    table = rate_table()
+    return table.has(from_currency) and table.has(to_currency)
+
+
+def user_currency(user_id):
+    """The user's currency_preference, from the cached user row."""
+    return cached_user_row(user_id)['currency_preference']
+
+
+def convert_amounts(amounts, currencies, days, to_currency):
+    """
+    Convert amounts[i] (a Decimal in currencies[i]) at the rate of days[i]
+    into to_currency, a code or one code per amount. Returns Decimals in
+    currency units rounded to two places (cents); raises MissingRate if a
+    currency has no rates.
+    """
+    count = len(amounts)
+    targets = [to_currency] * count if isinstance(to_currency, str) else list(to_currency)
+    if all(source == target for source, target in zip(currencies, targets)):
+        return list(amounts)
+    import numpy as np
+
+    # One rate per distinct (day, from, to); rows index into them.
+    keys = list(zip(days, currencies, targets))
+    distinct = {}
+    positions = np.fromiter((distinct.setdefault(key, len(distinct)) for key in keys), dtype=np.int64, count=count)
+    table = rate_table()
+    rates = [
+        (1, 0) if source == target else table.pair_rate(day, source, target)
+        for day, source, target in distinct
+    ]
+    cents = [int(amount * 100) for amount in amounts]
+    mantissas = [mantissa for mantissa, _ in rates]
+    divisors = [10 ** exponent for _, exponent in rates]
+
+    # Python ints (exact, slower) only if int64 could overflow.
+    fits = (
+        max(map(abs, cents), default=0) * max(map(abs, mantissas)) <= INT64_MAX
+        and max(divisors) <= INT64_MAX
+    )
+    dtype = np.int64 if fits else object
+    product = np.array(cents, dtype=dtype) * np.array(mantissas, dtype=dtype)[positions]
+    divisor = np.array(divisors, dtype=dtype)[positions]
+    rounded = (abs(product) + divisor // 2) // divisor
+    converted = np.where(product < 0, -rounded, rounded)
+    return [Decimal(int(value)).scaleb(-2) for value in converted]
+
+
+def convert_rows(rows, to_currency, day_key):
+    """
+    Convert the 'total' of aggregate rows (dicts with a 'currency' and a
+    date under day_key) into to_currency, in place. Returns the rows.
+    """
+    converted = convert_amounts(
+        [row['total'] for row in rows], [row['currency'] for row in rows], [row[day_key] for row in rows],
+        to_currency
+    )
+    for row, total in zip(rows, converted):
+        row['total'] = total
+    return rows
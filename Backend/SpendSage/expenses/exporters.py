@@ -0,0 +1,121 @@
+import csv
+import io
+import tempfile
+from itertools import islice
+
+from django.core.files import File
+
+from .filters import filter_transactions
+from .models import Transaction
+from .task_status import TaskProgress
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = ('csv', 'parquet')
+EXPORT_COLUMNS = (
+    'id', 'created_at', 'amount', 'currency', 'transaction_type',
+    'category_name', 'raw_description', 'merchant', 'is_anomaly',
+)
+# ORM lookups backing EXPORT_COLUMNS, in the same order.
+EXPORT_FIELDS = (
+    'id', 'created_at', 'amount', 'currency', 'transaction_type',
+    'category__name', 'raw_description', 'merchant', 'is_anomaly',
+)
+
+
+def export_queryset(user, filters=None):
+    queryset = Transaction.objects.filter(user=user, is_active=True)
+    if filters:
+        queryset = filter_transactions(queryset, filters)
+    return queryset
+
+
+def iter_export_rows(user, filters=None):
+    """
+    Yield export tuples for the user's transactions.
+
+    iterator() streams through a server-side cursor on Postgres, so only
+    one chunk of rows is materialised at a time; values_list skips model
+    and serializer construction entirely.
+    """
+    return (
+        export_queryset(user, filters).order_by('-created_at', '-id')
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def _with_progress(rows, progress, total):
+    """Pass rows through, publishing progress once per export chunk."""
+    for done, row in enumerate(rows, 1):
+        yield row
+        if done % EXPORT_CHUNK_SIZE == 0:
+            progress.update(done, total)
+
+
+def _iter_chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows, fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _iter_chunks(rows, EXPORT_CHUNK_SIZE):
+        writer.writerows(
+            (pk, created_at.isoformat(), amount, currency, transaction_type, category or '', description, merchant,
+             is_anomaly)
+            for pk, created_at, amount, currency, transaction_type, category, description, merchant, is_anomaly
+            in chunk
+        )
+    text.flush()
+    # Hand the binary file back to the caller instead of closing it.
+    text.detach()
+
+
+def write_parquet(rows, fileobj):
+    """Write one Parquet row group per chunk so memory stays bounded."""
+    # pyarrow is heavy and only needed by export workers.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+        ('amount', pa.decimal128(10, 2)),
+        ('currency', pa.string()),
+        ('transaction_type', pa.string()),
+        ('category_name', pa.string()),
+        ('raw_description', pa.string()),
+        ('merchant', pa.string()),
+        ('is_anomaly', pa.bool_()),
+    ])
+    with pq.ParquetWriter(fileobj, schema, compression='zstd') as writer:
+        for chunk in _iter_chunks(rows, EXPORT_CHUNK_SIZE):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+
+def export_transactions(background_task, file_format='csv', filters=None):
+    """Stream the user's transactions to a file and attach it to the task."""
+    writer = write_parquet if file_format == 'parquet' else write_csv
+    # One COUNT up front gives the denominator for progress percentages.
+    total = export_queryset(background_task.user, filters).count()
+    rows = _with_progress(iter_export_rows(background_task.user, filters), TaskProgress(background_task), total)
+    with tempfile.TemporaryFile() as tmp:
+        writer(rows, tmp)
+        tmp.seek(0)
+        background_task.result_file.save(
+            f"export_{background_task.task_id}.{file_format}",
+            File(tmp),
+            save=False
+        )
+    background_task.status = 'SUCCESS'
+    background_task.save(update_fields=['result_file', 'status'])
@@ -0,0 +1,88 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from .models import TRANSACTION_TYPE
+
+
+class InvalidFilter(ValueError):
+    """Raised when a list filter query parameter cannot be parsed."""
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilter(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def _parse_amount(value, name):
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise InvalidFilter(f"{name} must be a number")
+    if not amount.is_finite():
+        raise InvalidFilter(f"{name} must be a number")
+    return amount
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_transactions(queryset, params):
+    """
+    Apply the transaction list filters from the query string.
+
+    Supported params: start_date, end_date (inclusive, YYYY-MM-DD),
+    transaction_type, category, merchant (canonical name, exact),
+    min_amount, max_amount (inclusive, in each row's own currency) and
+    is_anomaly. Dates are turned into a half-open created_at range rather
+    than a __date lookup so the (user, created_at) index can serve them.
+    """
+    start_date = params.get('start_date')
+    if start_date:
+        queryset = queryset.filter(created_at__gte=_start_of_day(_parse_date(start_date, 'start_date')))
+
+    end_date = params.get('end_date')
+    if end_date:
+        next_day = _parse_date(end_date, 'end_date') + timedelta(days=1)
+        queryset = queryset.filter(created_at__lt=_start_of_day(next_day))
+
+    transaction_type = params.get('transaction_type')
+    if transaction_type:
+        valid_types = {value for value, _ in TRANSACTION_TYPE}
+        if transaction_type.lower() not in valid_types:
+            raise InvalidFilter(f"transaction_type must be one of {', '.join(sorted(valid_types))}")
+        # Rows created without an explicit type carry the legacy 'EXPENSE'
+        # default, so match both spellings with an index-friendly IN.
+        transaction_type = transaction_type.lower()
+        queryset = queryset.filter(transaction_type__in=[transaction_type, transaction_type.upper()])
+
+    category = params.get('category')
+    if category:
+        if not category.isdigit():
+            raise InvalidFilter("category must be a category id")
+        queryset = queryset.filter(category_id=int(category))
+
+    merchant = params.get('merchant')
+    if merchant:
+        queryset = queryset.filter(merchant=merchant)
+
+    min_amount = params.get('min_amount')
+    if min_amount:
+        queryset = queryset.filter(amount__gte=_parse_amount(min_amount, 'min_amount'))
+
+    max_amount = params.get('max_amount')
+    if max_amount:
+        queryset = queryset.filter(amount__lte=_parse_amount(max_amount, 'max_amount'))
+
+    is_anomaly = params.get('is_anomaly')
+    if is_anomaly:
+        flag = is_anomaly.lower()
+        if flag not in ('true', 'false', '1', '0'):
+            raise InvalidFilter("is_anomaly must be true or false")
+        queryset = queryset.filter(is_anomaly=flag in ('true', '1'))
+
+    return queryset
@@ -0,0 +1,290 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ml_engine.predictor import get_keyword_matcher, categorize_many
+from .currency import is_convertible
+from .duplicates import drop_duplicates, transaction_fingerprint
+from .merchants import canonical_merchants
+from .models import Category, Transaction, TRANSACTION_TYPE
+from .spend import spend_entry
+from .signals import spend_changed
+from .task_status import TaskProgress
+
+IMPORT_BATCH_SIZE = 1000
+# Rewrite the progress report every N batches, not on every row.
+PROGRESS_EVERY_BATCHES = 10
+# Keep only the first errors so a broken file cannot grow the report unbounded.
+MAX_REPORTED_ERRORS = 500
+
+MAX_AMOUNT = Decimal('99999999.99')  # Transaction.amount is max_digits=10, decimal_places=2
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%d-%m-%Y')
+VALID_TYPES = {value for value, _ in TRANSACTION_TYPE}
+
+
+class RowError(ValueError):
+    """A single statement line that failed validation."""
+
+
+# --- Streaming parsers ---
+
+def iter_csv_rows(stream):
+    """
+    Yield (line_number, row) pairs from a CSV statement one line at a time.
+
+    Expected headers: date, description (or raw_description), amount and the
+    optional transaction_type, category and currency columns.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        yield reader.line_num, {
+            'date': row.get('date', ''),
+            'description': row.get('description') or row.get('raw_description', ''),
+            'amount': row.get('amount', ''),
+            'transaction_type': row.get('transaction_type', ''),
+            'category': row.get('category', ''),
+            'currency': row.get('currency', ''),
+        }
+
+
+OFX_TOKEN = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_ofx_tokens(stream):
+    buffer = ''
+    while True:
+        chunk = stream.read(OFX_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        # Hold back everything from the last '<' in case that tag is cut in half.
+        cut = buffer.rfind('<')
+        complete, buffer = (buffer[:cut], buffer[cut:]) if cut > 0 else ('', buffer)
+        for match in OFX_TOKEN.finditer(complete):
+            yield match.groups()
+    for match in OFX_TOKEN.finditer(buffer):
+        yield match.groups()
+
+
+def iter_ofx_rows(stream):
+    """
+    Yield (index, row) pairs for every <STMTTRN> block in an OFX statement.
+
+    Works for both the SGML (OFX 1.x, unclosed leaf tags) and XML (OFX 2.x)
+    variants and reads the file in fixed-size chunks.
+    """
+    current = None
+    index = 0
+    for closing, tag, value in _iter_ofx_tokens(stream):
+        tag = tag.upper()
+        if tag == 'STMTTRN':
+            if closing and current is not None:
+                index += 1
+                amount = current.get('TRNAMT', '')
+                yield index, {
+                    'date': current.get('DTPOSTED', '')[:8],
+                    'description': current.get('NAME') or current.get('MEMO', ''),
+                    'amount': amount,
+                    'transaction_type': '',
+                    'category': '',
+                    'currency': '',
+                }
+                current = None
+            elif not closing:
+                current = {}
+        elif current is not None and not closing:
+            current[tag] = value.strip()
+
+
+def get_row_iterator(stream, file_format):
+    if file_format == 'ofx':
+        return iter_ofx_rows(stream)
+    return iter_csv_rows(stream)
+
+
+# --- Validation ---
+
+def _parse_date(value):
+    if not value:
+        return timezone.now()
+    if len(value) == 8 and value.isdigit():  # OFX YYYYMMDD
+        value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    for fmt in CSV_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+            parsed = datetime.combine(parsed.date(), time(12))
+        return timezone.make_aware(parsed)
+    raise RowError(f"Unrecognised date '{value}'")
+
+
+def build_transaction(row, user, categories):
+    """Validate one parsed row and return an unsaved Transaction."""
+    description = row['description']
+    if not description:
+        raise RowError("Description is required")
+    if len(description) > 255:
+        raise RowError("Description is longer than 255 characters")
+
+    try:
+        amount = Decimal(row['amount'].replace(',', ''))
+    except (InvalidOperation, AttributeError):
+        raise RowError(f"Invalid amount '{row['amount']}'")
+
+    transaction_type = row['transaction_type'].lower()
+    if not transaction_type:
+        # Bank statements sign the amount instead of naming the type.
+        transaction_type = 'expense' if amount < 0 else 'income'
+    elif transaction_type not in VALID_TYPES:
+        raise RowError(f"Invalid transaction_type '{row['transaction_type']}'")
+
+    amount = abs(amount).quantize(Decimal('0.01'))
+    if amount > MAX_AMOUNT:
+        raise RowError("Amount is too large")
+
+    # Rows without a currency are in the user's own.
+    currency = (row['currency'] or user.currency_preference).upper()
+    if len(currency) != 3 or not currency.isalpha():
+        raise RowError(f"Invalid currency '{row['currency']}'")
+    if not is_convertible(currency, user.currency_preference):
+        raise RowError(f"No exchange rate loaded for {currency}")
+
+    category_id = None
+    if row['category']:
+        category_id = categories.get(row['category'].lower())
+        if category_id is None:
+            raise RowError(f"Unknown category '{row['category']}'")
+
+    return Transaction(
+        user=user,
+        amount=amount,
+        raw_description=description,
+        transaction_type=transaction_type,
+        category_id=category_id,
+        category_confirmed=category_id is not None,
+        currency=currency,
+        created_at=_parse_date(row['date']),
+    )
+
+
+# --- Import job ---
+
+class TransactionImporter:
+    """
+    Streams a statement file into Transaction rows in fixed-size batches.
+
+    Only the current batch and a capped error list are held in memory, so a
+    50k-line statement costs the same RAM as a 500-line one. Rows already
+    stored by an earlier, overlapping upload are skipped as duplicates.
+    """
+
+    def __init__(self, background_task, file_path, file_format='csv', batch_size=IMPORT_BATCH_SIZE):
+        self.task = background_task
+        self.user = background_task.user
+        self.file_path = file_path
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.errors = []
+        # Rows inserted from here on (higher ids) are this import's own, not duplicates.
+        self.last_id_before = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def run(self):
+        # Categories are looked up by name once per import, not once per row.
+        categories = {
+            name.lower(): pk
+            for pk, name in Category.objects.filter(user=self.user, is_active=True).values_list('id', 'name')
+        }
+        # Compiled once per import and applied to every uncategorized row.
+        self.matcher = get_keyword_matcher(self.user.id)
+        batch = []
+        batches_done = 0
+        # Progress is the share of the file read so far.
+        progress = TaskProgress(self.task)
+        size = default_storage.size(self.file_path)
+        with default_storage.open(self.file_path, 'rb') as raw:
+            stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            for line, row in get_row_iterator(stream, self.file_format):
+                self.processed += 1
+                try:
+                    batch.append(build_transaction(row, self.user, categories))
+                except RowError as exc:
+                    self._record_error(line, str(exc))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+                    batches_done += 1
+                    progress.update(raw.tell(), size)
+                    if batches_done % PROGRESS_EVERY_BATCHES == 0:
+                        self.write_report('PENDING')
+            if batch:
+                self._flush(batch)
+        return self
+
+    def _record_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    @transaction.atomic
+    def _flush(self, batch):
+        # Rows of an overlapping statement that are already stored are skipped.
+        for obj in batch:
+            obj.fingerprint = transaction_fingerprint(obj)
+        kept = drop_duplicates(self.user.id, batch, last_id=self.last_id_before)
+        self.duplicates += len(batch) - len(kept)
+        batch = kept
+        if not batch:
+            return
+        for obj, merchant in zip(batch, canonical_merchants([obj.raw_description for obj in batch])):
+            obj.merchant = merchant
+        uncategorized = [obj for obj in batch if obj.category_id is None]
+        if uncategorized:
+            predicted = categorize_many(
+                self.user.id, [obj.raw_description for obj in uncategorized], matcher=self.matcher,
+                merchants=[obj.merchant for obj in uncategorized]
+            )
+            for obj, category_id in zip(uncategorized, predicted):
+                obj.category_id = category_id
+        # created_at already holds the statement date; it is inserted as is.
+        created = Transaction.objects.bulk_create(batch, batch_size=self.batch_size)
+        # bulk_create skips post_save, so announce the whole batch at once.
+        spend_changed.send(sender=Transaction, removed=[], added=[spend_entry(obj) for obj in created])
+        self.imported += len(created)
+
+    def write_report(self, status):
+        """Save the current progress and errors to the task's result_file."""
+        report = {
+            'status': status,
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+        if self.task.result_file:
+            self.task.result_file.delete(save=False)
+        self.task.result_file.save(
+            f"import_{self.task.task_id}.json",
+            ContentFile(json.dumps(report).encode()),
+            save=False
+        )
+        self.task.status = status
+        self.task.save(update_fields=['result_file', 'status'])
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from expenses.archive import archivable_months, archive_month, archive_path
+from expenses.partitions import PartitioningError, partition_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Move monthly Transaction partitions older than --older-than-months to "
+        "Parquet files in TRANSACTION_ARCHIVE_DIR and drop them from PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-months', type=int, default=settings.TRANSACTION_ARCHIVE_AFTER_MONTHS)
+        parser.add_argument('--dry-run', action='store_true', help="List the partitions without archiving.")
+
+    def handle(self, *args, **options):
+        if options['older_than_months'] < 1:
+            raise CommandError("--older-than-months must be at least 1")
+        try:
+            months = archivable_months(options['older_than_months'], timezone.now())
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f"  {partition_name(month)} -> {archive_path(month)}")
+                continue
+            rows = archive_month(month)
+            self.stdout.write(f"  {partition_name(month)}: {rows} rows -> {archive_path(month)}")
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(months)} partitions"))
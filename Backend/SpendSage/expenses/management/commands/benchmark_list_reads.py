@@ -0,0 +1,101 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from common.renderers import ORJSONRenderer
+from common.utils import api_success_response
+from expenses.models import Budget, Category, Transaction
+from expenses.readers import BUDGET_READER, TRANSACTION_READER
+from expenses.serializers import BudgetSerializer, TransactionSerializer
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark fixtures."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the ModelSerializer + JSONRenderer list path with the values() + "
+        "orjson fast path on throwaway rows; checks the bytes are identical."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        user = get_user_model().objects.create_user(
+            email='benchmark@spendsage.invalid', username='benchmark@spendsage.invalid', password=None
+        )
+        categories = Category.objects.bulk_create([
+            Category(user=user, name=f"Category {index}") for index in range(20)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user,
+                # Every tenth row is uncategorized, with a non-ASCII description.
+                category=None if index % 10 == 0 else categories[index % 20],
+                amount=Decimal(index % 5000) + Decimal('0.25'),
+                raw_description=f"POS {index} CAFÉ   ☕" if index % 10 == 0 else f"POS {index} STARBUCKS",
+                transaction_type='expense',
+            )
+            for index in range(rows)
+        ], batch_size=5000)
+        Budget.objects.bulk_create([
+            Budget(
+                user=user, category=categories[index % 20],
+                period_start_date=date(2025, 1, 1), period_end_date=date(2025, 12, 31),
+                limit_amount=Decimal('1000.00'), spent_amount=Decimal(index) / 4,
+            )
+            for index in range(rows)
+        ], batch_size=5000)
+
+        transactions = Transaction.objects.filter(user=user, is_active=True)
+        budgets = Budget.objects.filter(user=user, is_active=True)
+        cases = [
+            (
+                "transactions",
+                lambda: TransactionSerializer(transactions.select_related('category'), many=True).data,
+                lambda: TRANSACTION_READER.format(TRANSACTION_READER.values(transactions)),
+            ),
+            (
+                "budgets",
+                lambda: BudgetSerializer(budgets.all(), many=True).data,
+                lambda: BUDGET_READER.format(BUDGET_READER.values(budgets)),
+            ),
+        ]
+        for name, legacy, fast in cases:
+            legacy_seconds, legacy_body = self.measure(legacy, JSONRenderer(), repeat)
+            fast_seconds, fast_body = self.measure(fast, ORJSONRenderer(), repeat)
+            if legacy_body != fast_body:
+                raise CommandError(f"{name}: fast path output differs from the serializer path")
+            self.stdout.write(
+                f"{name:<13} {rows} rows  serializer {legacy_seconds * 1000:8.1f} ms  "
+                f"fast path {fast_seconds * 1000:8.1f} ms  speedup {legacy_seconds / fast_seconds:5.1f}x  "
+                f"({len(fast_body)} identical bytes)"
+            )
+
+    @staticmethod
+    def measure(build_data, renderer, repeat):
+        """Best wall time over `repeat` runs of query + serialize + render."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = api_success_response(message="Benchmark", data=build_data())
+            body = renderer.render(response.data)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
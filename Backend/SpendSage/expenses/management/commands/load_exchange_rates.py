@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.currency import InvalidRateFile, load_exchange_rates
+
+
+class Command(BaseCommand):
+    help = (
+        "Load exchange rates from a CSV file with a date,currency,rate header, rates "
+        "quoted per one EXCHANGE_RATE_BASE. Existing (currency, date) rows are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(settings.EXCHANGE_RATES_FILE))
+
+    def handle(self, *args, **options):
+        try:
+            count = load_exchange_rates(options['path'])
+        except (OSError, InvalidRateFile) as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} exchange rates"))
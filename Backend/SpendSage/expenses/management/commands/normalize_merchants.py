@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from expenses.merchants import backfill_merchants
+
+
+class Command(BaseCommand):
+    help = (
+        "Set the canonical merchant on transactions that have none. With --all, "
+        "recompute every transaction, e.g. after Merchant aliases changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every transaction")
+
+    def handle(self, *args, **options):
+        count = backfill_merchants(recompute=options['all'])
+        self.stdout.write(self.style.SUCCESS(f"Updated the merchant of {count} transactions"))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.partitions import convert_to_partitioned, ensure_partitions, PartitioningError
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly Transaction partitions (PostgreSQL). With --convert, "
+        "first rebuild the plain table as a partitioned one; this locks the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help="One-off: convert the existing table to a partitioned table.")
+        parser.add_argument('--months-ahead', type=int, default=settings.TRANSACTION_PARTITION_MONTHS_AHEAD)
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                created = convert_to_partitioned(options['months_ahead'])
+            else:
+                created = ensure_partitions(options['months_ahead'])
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+        for name in created:
+            self.stdout.write(f"  {name}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions"))
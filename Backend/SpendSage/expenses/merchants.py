@@ -0,0 +1,220 @@
+"""
+Canonical merchant names from noisy bank descriptions.
+
+normalize_merchant() strips what differs between two charges of the same
+merchant - payment channel prefixes (POS, UPI, ...), dates, reference
+numbers, domains, trailing locations and company suffixes - with rules
+compiled once at import. The result is looked up among the Merchant
+aliases, longest leading run of words first, so "POS 1234 AMZN MKTP IN*2X3"
+and "AMAZON.IN" both become "Amazon". Descriptions without an alias keep
+their cleaned words ("xyz traders" -> "Xyz Traders").
+
+Bank strings repeat endlessly, so results are cached twice: a bounded LRU
+in each process and the shared cache (Redis) behind it, both keyed by the
+raw string under the merchant table's generation, which every Merchant
+change bumps. Transaction.merchant stores the result at write time, so
+consumers never parse descriptions themselves.
+"""
+import hashlib
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from common.cache import get_generation, bump_generation
+
+MERCHANTS_NAMESPACE = 'merchants'
+# The merchant table is shared by all users.
+MERCHANTS_SCOPE = 'all'
+MERCHANT_MAX_LENGTH = 100
+# Descriptions kept per process; least recently used are dropped first.
+LOCAL_CACHE_SIZE = 50000
+SHARED_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# How often a process checks whether the merchant table changed.
+GENERATION_CHECK_INTERVAL = 60
+BACKFILL_CHUNK_SIZE = 5000
+
+MONTHS = 'jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec'
+LOCATIONS = (
+    'mumbai', 'navi mumbai', 'thane', 'delhi', 'new delhi', 'gurgaon', 'gurugram', 'noida', 'bangalore',
+    'bengaluru', 'chennai', 'kolkata', 'hyderabad', 'pune', 'ahmedabad', 'jaipur', 'lucknow', 'chandigarh',
+    'kochi', 'indore', 'in', 'ind', 'india', 'us', 'usa', 'uk', 'gb', 'sg', 'ie', 'nl',
+)
+COMPANY_SUFFIXES = ('pvt', 'private', 'ltd', 'limited', 'llp', 'llc', 'inc', 'corp', 'corporation', 'co')
+_TRAILING_WORDS = '|'.join(sorted(map(re.escape, LOCATIONS + COMPANY_SUFFIXES), key=len, reverse=True))
+
+# Applied in order to the lower-cased description.
+RULES = [
+    # Card networks and payment rails in front of the merchant.
+    (re.compile(
+        r'^(?:(?:pos|upi|neft|imps|rtgs|ach|nach|ecom|atm|visa|mastercard|rupay|debit card|credit card|'
+        r'purchase|payment|txn|card)\b[\s/:*#-]*)+'
+    ), ''),
+    # Aggregators that prefix the real merchant: "SQ *BLUE TOKAI", "PAYPAL *NETFLIX".
+    (re.compile(r'^(?:sq|tst|paypal|pp|razorpay|rzp|payu)\s*\*\s*'), ''),
+    # Dates: 12/03/2024, 2024-03-12, 12-03, 12 MAR 2024.
+    (re.compile(r'\b\d{1,4}[/.-]\d{1,2}(?:[/.-]\d{1,4})?\b'), ' '),
+    (re.compile(rf'\b\d{{1,2}}\s*(?:{MONTHS})[a-z]*(?:\s*\d{{2,4}})?\b'), ' '),
+    # Reference numbers: "#887", "REF 12AB34", and any word holding a digit.
+    (re.compile(r'(?:#|\bref\b\.?|\bno\b\.?)\s*\w*\d\w*'), ' '),
+    (re.compile(r'\b\w*\d\w*\b'), ' '),
+    (re.compile(r'\bwww\.|\.(?:com|co|in|net|org|io)\b'), ' '),
+    (re.compile(r"[^\w\s&']+|_"), ' '),
+    # Trailing locations and company suffixes, in any order.
+    (re.compile(rf'(?:\s+(?:{_TRAILING_WORDS}))+\s*$'), ''),
+]
+
+
+def normalize_merchant(description):
+    """The description with everything but the merchant stripped, lower-cased."""
+    text = (description or '').lower()
+    for pattern, replacement in RULES:
+        text = pattern.sub(replacement, text)
+    return ' '.join(text.split())[:MERCHANT_MAX_LENGTH]
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+class MerchantTable:
+    """The Merchant aliases of one generation: {normalized alias: canonical name}."""
+
+    def __init__(self, generation):
+        from .models import Merchant
+
+        self.generation = generation
+        self.aliases = {}
+        for name, aliases in Merchant.objects.order_by('id').values_list('name', 'aliases'):
+            for alias in [name, *aliases.split(',')]:
+                alias = normalize_merchant(alias)
+                if alias:
+                    self.aliases.setdefault(alias, name)
+
+    def canonical(self, description):
+        words = normalize_merchant(description).split()
+        for end in range(len(words), 0, -1):
+            name = self.aliases.get(' '.join(words[:end]))
+            if name:
+                return name
+        return string.capwords(' '.join(words))
+
+
+_local = LRUCache(LOCAL_CACHE_SIZE)
+_table = None
+_checked_at = None
+_table_lock = threading.Lock()
+
+
+def merchant_table():
+    """The current MerchantTable, re-checking the generation once a minute."""
+    global _table, _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < GENERATION_CHECK_INTERVAL:
+        return _table
+    with _table_lock:
+        generation = get_generation(MERCHANTS_NAMESPACE, MERCHANTS_SCOPE)
+        if _table is None or _table.generation != generation:
+            _table = MerchantTable(generation)
+        _checked_at = now
+    return _table
+
+
+def invalidate_merchants():
+    """Called whenever a Merchant is saved or deleted."""
+    global _checked_at
+    bump_generation(MERCHANTS_NAMESPACE, MERCHANTS_SCOPE)
+    _checked_at = None
+
+
+def _shared_key(generation, description):
+    digest = hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+    return f"merchant:{generation}:{digest}"
+
+
+def canonical_merchants(descriptions):
+    """
+    Canonical merchant names for a batch of descriptions: process LRU
+    first, then one get_many on the shared cache, and only the rest are
+    normalized (and written back to both tiers).
+    """
+    table = merchant_table()
+    generation = table.generation
+    found = {}
+    missing = {}
+    for description in set(descriptions):
+        name = _local.get((generation, description))
+        if name is None:
+            missing[_shared_key(generation, description)] = description
+        else:
+            found[description] = name
+
+    if missing:
+        shared = cache.get_many(list(missing))
+        computed = {key: table.canonical(description) for key, description in missing.items() if key not in shared}
+        if computed:
+            cache.set_many(computed, SHARED_CACHE_TIMEOUT)
+        for key, description in missing.items():
+            name = found[description] = shared[key] if key in shared else computed[key]
+            _local.put((generation, description), name)
+    return [found[description] for description in descriptions]
+
+
+def canonical_merchant(description):
+    return canonical_merchants([description])[0]
+
+
+def backfill_merchants(recompute=False, chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    Set Transaction.merchant on rows without one, or on every row when
+    recompute is set (after Merchant aliases change). Walks the table in
+    id order, one bulk_update per chunk; returns the number of rows changed.
+    """
+    from django.utils import timezone
+
+    from .models import Transaction
+    from .recurring import GROUP_FIELDS, record_group_moves
+
+    rows = Transaction.objects.all() if recompute else Transaction.objects.filter(merchant='')
+    changed = 0
+    last_id = 0
+    while True:
+        chunk = list(
+            rows.filter(id__gt=last_id).order_by('id')
+            .only('id', 'user_id', 'created_at', *GROUP_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            return changed
+        last_id = chunk[-1].id
+        now = timezone.now()
+        updated = []
+        for txn, merchant in zip(chunk, canonical_merchants([txn.raw_description for txn in chunk])):
+            if txn.merchant != merchant:
+                txn.merchant = merchant
+                txn.updated_at = now
+                updated.append(txn)
+        record_group_moves(updated)
+        Transaction.objects.bulk_update(updated, ['merchant', 'updated_at'])
+        changed += len(updated)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from common.models import BaseModel
 
@@ -17,6 +18,18 @@ TASK_STATUS = (
     ('FAILED', 'Failed'),
 )
 
+RECURRENCE_PERIOD = (
+    ('weekly', 'Weekly'),
+    ('monthly', 'Monthly'),
+    ('yearly', 'Yearly'),
+)
+
+BUDGET_STATUS = (
+    ('ON_TRACK', 'On Track'),
+    ('AT_RISK', 'At Risk'),
+    ('EXCEEDED', 'Exceeded'),
+)
+
 class Category(BaseModel):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,10 +41,27 @@ class Category(BaseModel):
 
     class Meta:
         unique_together = ('user', 'name')
+        # Delta sync walks each user's rows by updated_at.
+        indexes = [models.Index(fields=['user', 'updated_at'], name='category_user_updated_idx')]
+
+class Merchant(models.Model):
+    """A canonical merchant that descriptions are mapped to (expenses.merchants)."""
+    name = models.CharField(max_length=100, unique=True)
+    aliases = models.TextField(
+        blank=True,
+        help_text="Comma-separated description forms (e.g., 'AMZN MKTP, AMAZON PAY')"
+    )
+
+    def __str__(self):
+        return self.name
 
 # Expenses
 
 class Transaction(BaseModel):
+    # A default rather than auto_now_add, so imports can insert the
+    # statement date directly instead of fixing it up with a second write
+    # (which would also move the row to another partition).
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, help_text="The final, user-confirmed category.") # ML and Classification Fields (Modifications)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -41,10 +71,126 @@ class Transaction(BaseModel):
         help_text="Flagged by the ML Anomaly Detector (FR-08)."
     )
     raw_description = models.TextField(max_length=255)
+    # ISO 4217 code; defaults to the owner's currency_preference on create
+    currency = models.CharField(max_length=3, default='INR')
+    # Canonical merchant of raw_description, set on every write that changes it
+    merchant = models.CharField(max_length=100, blank=True, default='')
+    # Hash of user, amount, currency, description and posting day (expenses.duplicates)
+    fingerprint = models.CharField(max_length=32, blank=True, default='')
+    # Set on API creates until the enrichment pipeline has categorized/scored the row
+    enrichment_pending = models.BooleanField(default=False)
+    # True when the user chose the category (API, bulk, import column); the
+    # categorizer's own guesses stay False and are never trained on
+    category_confirmed = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-created_at', '-id']
-        indexes = [models.Index(fields=['user', 'created_at'])]
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user', 'updated_at'], name='txn_user_updated_idx'),
+            # Serve the list filters without leaving the per-user time index.
+            models.Index(fields=['user', 'transaction_type', 'created_at'], name='txn_user_type_created_idx'),
+            models.Index(fields=['user', 'category', 'created_at'], name='txn_user_cat_created_idx'),
+            models.Index(fields=['user', 'merchant', 'created_at'], name='txn_user_merchant_created_idx'),
+            models.Index(
+                fields=['user', 'created_at'],
+                condition=models.Q(is_anomaly=True),
+                name='txn_user_anomaly_created_idx'
+            ),
+            # Duplicate checks; tombstones never count as duplicates.
+            models.Index(
+                fields=['user', 'fingerprint'],
+                condition=models.Q(is_active=True),
+                name='txn_user_fingerprint_idx'
+            ),
+            # The enrichment queue: only pending rows are indexed.
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(enrichment_pending=True),
+                name='txn_enrichment_pending_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so write signals can compute deltas for
+        # rollups and budgets without re-reading the row.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class RecurringSeries(BaseModel):
+    """
+    A run of transactions repeating at a fixed period (a subscription, rent,
+    salary), found by expenses.recurring. Transactions are matched by
+    normalized description, currency and a band of similar amounts.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    transaction_type = models.CharField(max_length=10)
+    description_key = models.CharField(max_length=255, help_text="Lower-cased merchant, or raw_description normalized")
+    currency = models.CharField(max_length=3)
+    amount_band = models.IntegerField(help_text="log-scale bucket of the amount (see recurring.py)")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="The latest amount.")
+    period = models.CharField(max_length=10, choices=RECURRENCE_PERIOD)
+    interval_days = models.FloatField(help_text="Mean gap between occurrences.")
+    occurrences = models.IntegerField()
+    first_date = models.DateField()
+    last_date = models.DateField()
+    next_date = models.DateField()
+
+    class Meta:
+        ordering = ['next_date', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'transaction_type', 'description_key', 'currency', 'amount_band'],
+                name='unique_recurring_series'
+            ),
+        ]
+        indexes = [models.Index(fields=['user', 'is_active', 'next_date'], name='recurring_user_next_idx')]
+
+
+class RecurringScan(models.Model):
+    """How far the recurrence detector has read a user's transaction changes."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    scanned_until = models.DateTimeField(null=True, blank=True, help_text="Unset until the first scan.")
+
+
+class RecurringGroupChange(models.Model):
+    """
+    A recurrence group an edited transaction left. The row's changes only
+    show its new group, so the old one is queued here for the next scan.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    transaction_type = models.CharField(max_length=10)
+    description_key = models.CharField(max_length=255)
+    currency = models.CharField(max_length=3)
+    amount_band = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'transaction_type', 'description_key', 'currency', 'amount_band'],
+                name='unique_recurring_group_change'
+            ),
+        ]
+
+
+class ExchangeRate(models.Model):
+    """One day's rate for a currency, loaded by `manage.py load_exchange_rates`."""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(
+        max_digits=20,
+        decimal_places=10,
+        help_text="Units of this currency per one unit of EXCHANGE_RATE_BASE."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
 
 
 class Budget(BaseModel):
@@ -62,10 +208,16 @@ class Budget(BaseModel):
         blank=True,
         help_text="Predicted spending by the ML model for this period."
     )
-    status = models.CharField(max_length=20, default='ON_TRACK')
+    # Kept up to date incrementally by the budget engine on every transaction write
+    spent_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    status = models.CharField(max_length=20, choices=BUDGET_STATUS, default='ON_TRACK')
     
     class Meta:
         ordering = ['user', 'category', 'period_start_date']
+        indexes = [
+            models.Index(fields=['user', 'category', 'period_start_date', 'period_end_date']),
+            models.Index(fields=['user', 'updated_at'], name='budget_user_updated_idx'),
+        ]
 
 
 class BackgroundTask(models.Model):
@@ -0,0 +1,135 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when the client sends a cursor we did not issue."""
+
+
+class TransactionCursorPagination:
+    """
+    Keyset (cursor) pagination over ('-created_at', '-id').
+
+    Each page continues strictly after the last row of the previous page, so
+    the database walks the (user, created_at) index instead of counting and
+    skipping OFFSET rows. Page cost stays flat no matter how deep the client
+    scrolls into the history.
+    """
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.next_cursor = None
+
+    def get_page_size(self, query_params):
+        raw = query_params.get(self.page_size_query_param)
+        if not raw:
+            return self.page_size
+        try:
+            size = int(raw)
+        except ValueError:
+            raise InvalidCursor("page_size must be an integer")
+        if size < 1:
+            raise InvalidCursor("page_size must be positive")
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of objects and remember the cursor for the next."""
+        queryset, page_size = self.page_queryset(queryset, request.query_params)
+        return self.trim_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset for async views (request.GET instead of query_params)."""
+        queryset, page_size = self.page_queryset(queryset, request.GET)
+        return self.trim_page([row async for row in queryset], page_size)
+
+    def page_queryset(self, queryset, query_params):
+        page_size = self.get_page_size(query_params)
+        position = self.decode_cursor(query_params.get(self.cursor_query_param))
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        # Fetch one extra row to find out whether another page exists.
+        return queryset.order_by('-created_at', '-id')[:page_size + 1], page_size
+
+    def trim_page(self, rows, page_size):
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            if isinstance(last, dict):
+                # values() rows from the fast read path
+                self.next_cursor = self.encode_cursor(last['created_at'], last['id'])
+            else:
+                self.next_cursor = self.encode_cursor(last.created_at, last.id)
+        return rows
+
+    def get_paginated_data(self, data):
+        return {
+            'results': data,
+            'next_cursor': self.next_cursor,
+        }
+
+    @staticmethod
+    def encode_cursor(created_at, pk):
+        raw = f"{created_at.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise InvalidCursor("Invalid cursor")
+
+
+class RankedPagination(TransactionCursorPagination):
+    """
+    Page-number pagination for ranked results (search), whose order is not a
+    column a keyset cursor can continue from. Pages past max_page stop being
+    served; nobody reads that deep into a relevance-ordered list.
+    """
+    page_query_param = 'page'
+    max_page = 20
+
+    def __init__(self):
+        super().__init__()
+        self.next_page = None
+
+    def paginate_queryset(self, queryset, request):
+        page_size = self.get_page_size(request.query_params)
+        page = self.get_page(request.query_params)
+        offset = (page - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            if page < self.max_page:
+                self.next_page = page + 1
+        return rows
+
+    def get_page(self, query_params):
+        raw = query_params.get(self.page_query_param)
+        if not raw:
+            return 1
+        try:
+            page = int(raw)
+        except ValueError:
+            raise InvalidCursor("page must be an integer")
+        if not 1 <= page <= self.max_page:
+            raise InvalidCursor(f"page must be between 1 and {self.max_page}")
+        return page
+
+    def get_paginated_data(self, data):
+        return {
+            'results': data,
+            'next_page': self.next_page,
+        }
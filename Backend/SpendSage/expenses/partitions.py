@@ -0,0 +1,195 @@
+"""
+Monthly range partitions of the Transaction table (PostgreSQL only).
+
+The table is partitioned by created_at into one partition per UTC month,
+named <table>_pYYYY_MM, plus a default partition that catches rows outside
+every range (e.g. imported statements from years back). Queries bounded
+by created_at are pruned to the matching months, and each partition keeps
+its own small indexes and vacuum cycle.
+
+Partitioning constrains the schema: the primary key is (id, created_at),
+so no unique constraint can leave out created_at and no foreign key can
+point at Transaction.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import Transaction
+from .search import create_search_indexes
+
+TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+class PartitioningError(Exception):
+    """The database cannot be (or is not yet) partitioned as asked."""
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def check_postgres():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError("Transaction partitioning needs PostgreSQL")
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def monthly_partitions(cursor):
+    """{month start: partition name} for the partitions attached to the table."""
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        """,
+        [TABLE]
+    )
+    prefix = f"{TABLE}_p"
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('_')
+            partitions[datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def _months_with_rows(cursor, table):
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {_qn(table)}"
+    )
+    return sorted(month_start(month) for (month,) in cursor.fetchall())
+
+
+def _bounds(month):
+    return month.isoformat(), add_months(month, 1).isoformat()
+
+
+def _for_values(start, end):
+    # DDL takes no bind parameters; both bounds are ISO timestamps we built.
+    return f"FOR VALUES FROM ('{start}') TO ('{end}')"
+
+
+def _create_partition(cursor, month):
+    """Create the month's partition, moving its rows out of the default partition."""
+    name = partition_name(month)
+    start, end = _bounds(month)
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {_qn(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s)",
+        [start, end]
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            f"CREATE TABLE {_qn(name)} PARTITION OF {_qn(TABLE)} {_for_values(start, end)}"
+        )
+        return name
+    # Attaching a range that still has rows in the default partition fails,
+    # so fill a standalone table first; ATTACH builds its indexes.
+    cursor.execute(f"CREATE TABLE {_qn(name)} (LIKE {_qn(TABLE)} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {_qn(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s "
+        f"RETURNING *) INSERT INTO {_qn(name)} SELECT * FROM moved",
+        [start, end]
+    )
+    cursor.execute(
+        f"ALTER TABLE {_qn(TABLE)} ATTACH PARTITION {_qn(name)} {_for_values(start, end)}"
+    )
+    return name
+
+
+@transaction.atomic
+def ensure_partitions(months_ahead, now=None):
+    """
+    Create the partitions from the current month through `months_ahead`
+    months ahead, and give every month found in the default partition its
+    own partition. Returns the names created.
+    """
+    check_postgres()
+    first = month_start(now or datetime.now(dt_timezone.utc))
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise PartitioningError(f"{TABLE} is not partitioned; run partition_transactions --convert")
+        existing = monthly_partitions(cursor)
+        wanted = set(_months_with_rows(cursor, DEFAULT_PARTITION))
+        wanted.update(add_months(first, offset) for offset in range(months_ahead + 1))
+        return [_create_partition(cursor, month) for month in sorted(wanted - existing.keys())]
+
+
+@transaction.atomic
+def convert_to_partitioned(months_ahead, now=None):
+    """
+    Rebuild the plain Transaction table as a partitioned one, in place.
+
+    Takes an ACCESS EXCLUSIVE lock and copies every row, so run it in a
+    maintenance window. Index names are the ones Django's migrations
+    generate, so later migrations still find them.
+    """
+    check_postgres()
+    old = f"{TABLE}_unpartitioned"
+    first = month_start(now or datetime.now(dt_timezone.utc))
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            raise PartitioningError(f"{TABLE} is already partitioned")
+        cursor.execute(f"LOCK TABLE {_qn(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        months = set(_months_with_rows(cursor, TABLE))
+        months.update(add_months(first, offset) for offset in range(months_ahead + 1))
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {_qn(TABLE)}")
+        next_id = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} RENAME TO {_qn(old)}")
+        cursor.execute(
+            f"CREATE TABLE {_qn(TABLE)} (LIKE {_qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} ALTER COLUMN id RESTART WITH {int(next_id)}")
+        cursor.execute(f"CREATE TABLE {_qn(DEFAULT_PARTITION)} PARTITION OF {_qn(TABLE)} DEFAULT")
+        for month in sorted(months):
+            _create_partition(cursor, month)
+        cursor.execute(f"INSERT INTO {_qn(TABLE)} SELECT * FROM {_qn(old)}")
+        cursor.execute(f"DROP TABLE {_qn(old)}")
+
+        # Constraints and indexes go on after the copy, which is faster than
+        # maintaining them row by row, and take back the dropped names.
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} ADD PRIMARY KEY (id, created_at)")
+        for field in Transaction._meta.concrete_fields:
+            if field.remote_field and field.db_constraint:
+                target = field.target_field
+                cursor.execute(
+                    f"ALTER TABLE {_qn(TABLE)} ADD FOREIGN KEY ({_qn(field.column)}) "
+                    f"REFERENCES {_qn(target.model._meta.db_table)} ({_qn(target.column)}) "
+                    f"DEFERRABLE INITIALLY DEFERRED"
+                )
+    with connection.schema_editor(atomic=False) as editor:
+        for statement in editor._model_indexes_sql(Transaction):
+            editor.execute(statement)
+    # The raw search indexes went with the old table too.
+    create_search_indexes()
+    return sorted(partition_name(month) for month in months)
+
+
+def detach_partition(cursor, month):
+    """Detach and drop one monthly partition (its rows must be archived first)."""
+    name = partition_name(month)
+    cursor.execute(f"ALTER TABLE {_qn(TABLE)} DETACH PARTITION {_qn(name)}")
+    cursor.execute(f"DROP TABLE {_qn(name)}")
@@ -0,0 +1,291 @@
+"""
+Recurring transaction (subscription) detection.
+
+A user's transactions are grouped by transaction type, merchant, currency
+and amount band: the canonical merchant (expenses.merchants) when there is
+one, else the description without digits and punctuation ("NETFLIX.COM
+0423 #12" -> "netflix com"); amounts within about 10% of each other share
+a band. The gaps between a group's dates are
+tested against the weekly, monthly and yearly periods, and a group where
+most gaps fit one period becomes a RecurringSeries with its next date.
+
+All groups of a user are tested together: one lexsort by (group, day), one
+np.diff over the sorted days and per-group counts with np.bincount, so the
+cost is a handful of array operations however many groups there are.
+
+The job is incremental. RecurringScan records how far each user's changes
+(Transaction.updated_at) have been read; a scan only re-examines the groups
+of rows changed since then, plus the groups edited rows moved out of
+(RecurringGroupChange, written by record_group_moves), and reads the
+history of those groups alone. A user without changes costs two queries.
+"""
+import math
+import re
+from calendar import monthrange
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DEFERRED, Q
+from django.utils import timezone
+
+from .models import RecurringGroupChange, RecurringScan, RecurringSeries, Transaction
+
+# (period, mean days, tolerance in days, fewest fitting gaps)
+PERIODS = (
+    ('weekly', 7, 1, 3),
+    ('monthly', 30.44, 3.5, 2),
+    ('yearly', 365.25, 10, 1),
+)
+PERIOD_DAYS = {name: days for name, days, _, _ in PERIODS}
+# Share of a group's gaps that must fit its period.
+MIN_REGULARITY = 0.75
+AMOUNT_BAND_WIDTH = 0.1
+LOOKBACK_DAYS = 3 * 366
+# Changes are re-read with this overlap, so a row committed late with an
+# older updated_at is not skipped.
+SCAN_OVERLAP = timedelta(minutes=5)
+SCAN_CHUNK_SIZE = 5000
+# Groups whose history is read by one query.
+HISTORY_CHUNK_SIZE = 100
+# The fields of a transaction its group depends on, in group_key() order.
+GROUP_FIELDS = ('transaction_type', 'raw_description', 'merchant', 'currency', 'amount')
+# What a scan writes on a series it re-examined.
+SERIES_FIELDS = (
+    'category', 'amount', 'period', 'interval_days', 'occurrences',
+    'first_date', 'last_date', 'next_date', 'is_active', 'updated_at',
+)
+
+_NOISE = re.compile(r'[\W\d_]+')
+
+
+def normalize_description(text):
+    return ' '.join(_NOISE.sub(' ', (text or '').lower()).split())[:255]
+
+
+def amount_band(amount):
+    """Log-scale bucket: amounts within ~10% of each other share a band."""
+    return math.floor(math.log(float(amount)) / math.log1p(AMOUNT_BAND_WIDTH))
+
+
+def group_key(transaction_type, raw_description, merchant, currency, amount):
+    """The group a transaction belongs to, or None if it cannot recur."""
+    description = merchant.lower() if merchant else normalize_description(raw_description)
+    if not description or amount <= 0:
+        return None
+    return (transaction_type or '').lower(), description, currency, amount_band(amount)
+
+
+def loaded_group_key(txn):
+    """The group the transaction was in when loaded, or None if unknown."""
+    loaded = getattr(txn, '_loaded_values', None) or {}
+    values = [loaded.get(name, DEFERRED) for name in GROUP_FIELDS]
+    if any(value is DEFERRED for value in values):
+        return None
+    return group_key(*values)
+
+
+def record_group_moves(transactions):
+    """
+    Queue the old groups of edited transactions that moved to another one;
+    call before their loaded values are refreshed.
+    """
+    changes = []
+    for txn in transactions:
+        old = loaded_group_key(txn)
+        if old is not None and old != group_key(*(getattr(txn, name) for name in GROUP_FIELDS)):
+            transaction_type, description, currency, band = old
+            changes.append(RecurringGroupChange(
+                user_id=txn.user_id, transaction_type=transaction_type, description_key=description,
+                currency=currency, amount_band=band
+            ))
+    RecurringGroupChange.objects.bulk_create(changes, ignore_conflicts=True)
+
+
+def next_occurrence(day, period, count=1):
+    if period == 'weekly':
+        return day + timedelta(weeks=count)
+    index = day.year * 12 + day.month - 1 + (count if period == 'monthly' else 12 * count)
+    year, month = index // 12, index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def is_expired(next_date, period, today):
+    """A series lapses once it is more than a period overdue."""
+    return next_date + timedelta(days=round(PERIOD_DAYS[period])) < today
+
+
+def detect(groups, today):
+    """
+    Find the recurring groups among {key: [(day, amount, category_id)]},
+    each list in date order. Returns {key: RecurringSeries field values}.
+    """
+    if not groups:
+        return {}
+    import numpy as np
+
+    keys = list(groups)
+    sizes = [len(groups[key]) for key in keys]
+    group_of = np.repeat(np.arange(len(keys)), sizes)
+    days = np.fromiter(
+        (day.toordinal() for key in keys for day, _, _ in groups[key]), dtype=np.float64, count=sum(sizes)
+    )
+    order = np.lexsort((days, group_of))
+    group_of, days = group_of[order], days[order]
+
+    gaps = np.diff(days)
+    gap_group = group_of[1:]
+    # Gaps inside one group; several charges on one day are one occurrence.
+    counted = (gap_group == group_of[:-1]) & (gaps > 0)
+    total_gaps = np.bincount(gap_group[counted], minlength=len(keys))
+    fitting, mean_gap = [], []
+    for _, period_days, tolerance, _ in PERIODS:
+        fits = counted & (np.abs(gaps - period_days) <= tolerance)
+        count = np.bincount(gap_group[fits], minlength=len(keys))
+        fitting.append(count)
+        gap_sum = np.bincount(gap_group[fits], weights=gaps[fits], minlength=len(keys))
+        mean_gap.append(gap_sum / np.maximum(count, 1))
+    fitting, mean_gap = np.stack(fitting), np.stack(mean_gap)
+    best = fitting.argmax(axis=0)
+    columns = np.arange(len(keys))
+    best_count = fitting[best, columns]
+    min_gaps = np.array([minimum for _, _, _, minimum in PERIODS])[best]
+    recurring = (best_count >= min_gaps) & (best_count >= MIN_REGULARITY * total_gaps)
+
+    found = {}
+    for index in np.flatnonzero(recurring):
+        key = keys[index]
+        rows = groups[key]
+        period = PERIODS[best[index]][0]
+        last_date = rows[-1][0]
+        next_date = next_occurrence(last_date, period)
+        found[key] = {
+            'category_id': next((category for _, _, category in reversed(rows) if category), None),
+            'amount': rows[-1][1],
+            'period': period,
+            'interval_days': round(float(mean_gap[best[index], index]), 2),
+            'occurrences': int(total_gaps[index]) + 1,
+            'first_date': rows[0][0],
+            'last_date': last_date,
+            'next_date': next_date,
+            'is_active': not is_expired(next_date, period, today),
+        }
+    return found
+
+
+def _changed_groups(user_id, since):
+    changed = Transaction.objects.filter(user_id=user_id)
+    if since is not None:
+        changed = changed.filter(updated_at__gt=since - SCAN_OVERLAP)
+    rows = changed.values_list(*GROUP_FIELDS)
+    keys = {key for key in (group_key(*row) for row in rows.iterator(chunk_size=SCAN_CHUNK_SIZE)) if key}
+    moved = list(
+        RecurringGroupChange.objects.filter(user_id=user_id)
+        .values_list('id', 'transaction_type', 'description_key', 'currency', 'amount_band')
+    )
+    keys.update(tuple(row[1:]) for row in moved)
+    RecurringGroupChange.objects.filter(id__in=[row[0] for row in moved]).delete()
+    return keys
+
+
+def _group_filter(key):
+    """
+    A superset of the group's rows: the merchant, or for descriptions
+    without one the longest word of the normalized description, together
+    with the amount band (widened a little against float rounding).
+    """
+    transaction_type, description, currency, band = key
+    step = 1 + AMOUNT_BAND_WIDTH
+    word = max(description.split(), key=len)
+    return (
+        Q(transaction_type__iexact=transaction_type, currency=currency)
+        & Q(amount__gte=step ** band * 0.999, amount__lt=step ** (band + 1) * 1.001)
+        & (Q(merchant__iexact=description) | Q(merchant='', raw_description__icontains=word))
+    )
+
+
+def _group_history(user_id, keys, now):
+    history = defaultdict(list)
+    keys = list(keys)
+    for start in range(0, len(keys), HISTORY_CHUNK_SIZE):
+        chunk = keys[start:start + HISTORY_CHUNK_SIZE]
+        groups = Q()
+        for key in chunk:
+            groups |= _group_filter(key)
+        rows = (
+            Transaction.objects.filter(
+                groups, user_id=user_id, is_active=True, enrichment_pending=False,
+                created_at__gte=now - timedelta(days=LOOKBACK_DAYS),
+            )
+            .order_by('created_at', 'id')
+            .values_list(*GROUP_FIELDS, 'created_at', 'category_id')
+        )
+        wanted = set(chunk)
+        for row in rows.iterator(chunk_size=SCAN_CHUNK_SIZE):
+            key = group_key(*row[:5])
+            if key in wanted:
+                _, _, _, _, amount, created_at, category_id = row
+                history[key].append((timezone.localdate(created_at), amount, category_id))
+    return history
+
+
+def _save_series(user_id, keys, found):
+    existing = {
+        (series.transaction_type, series.description_key, series.currency, series.amount_band): series
+        for series in RecurringSeries.objects.filter(
+            user_id=user_id, description_key__in={description for _, description, _, _ in keys}
+        )
+    }
+    now = timezone.now()
+    created, updated = [], []
+    for key in keys:
+        series = existing.get(key)
+        values = found.get(key)
+        if values is None:
+            # The group no longer recurs (rows deleted or edited away).
+            if series and series.is_active:
+                series.is_active = False
+                series.updated_at = now
+                updated.append(series)
+            continue
+        if series is None:
+            transaction_type, description, currency, band = key
+            created.append(RecurringSeries(
+                user_id=user_id, transaction_type=transaction_type, description_key=description,
+                currency=currency, amount_band=band, **values
+            ))
+            continue
+        for name, value in values.items():
+            setattr(series, name, value)
+        series.updated_at = now
+        updated.append(series)
+    RecurringSeries.objects.bulk_create(created)
+    RecurringSeries.objects.bulk_update(updated, SERIES_FIELDS)
+
+
+@transaction.atomic
+def scan_user(user_id, now=None):
+    """Re-examine the user's groups changed since the last scan; returns how many."""
+    now = now or timezone.now()
+    # Create the row first so concurrent first scans serialize on its lock
+    # instead of racing to insert it.
+    RecurringScan.objects.get_or_create(user_id=user_id)
+    scan = RecurringScan.objects.select_for_update().get(user_id=user_id)
+    keys = _changed_groups(user_id, scan.scanned_until)
+    if keys:
+        found = detect(_group_history(user_id, keys, now), timezone.localdate(now))
+        _save_series(user_id, keys, found)
+    scan.scanned_until = now
+    scan.save(update_fields=['scanned_until'])
+    return len(keys)
+
+
+def expire_series(today=None):
+    """Deactivate series whose next occurrence is more than a period overdue."""
+    today = today or timezone.localdate()
+    return sum(
+        RecurringSeries.objects.filter(
+            is_active=True, period=period, next_date__lt=today - timedelta(days=round(period_days))
+        ).update(is_active=False, updated_at=timezone.now())
+        for period, period_days, _, _ in PERIODS
+    )
@@ -0,0 +1,91 @@
+"""
+Search over Transaction.raw_description.
+
+On PostgreSQL two GIN indexes serve it, both led by user_id (btree_gin) so
+one user's search only reads that user's postings:
+
+  full-text  to_tsvector('simple', raw_description), queried with every
+             term as a prefix ("star buc" -> star:* & buc:*) for type-ahead
+  trigram    raw_description gin_trgm_ops, which still finds the row when
+             the query has a typo (word similarity)
+
+Results are ranked by ts_rank plus word similarity. The indexes are not
+expressible as portable Django indexes, so they are created after every
+migrate (see apps.py). Other databases, SQLite in tests, fall back to an
+icontains scan: every term must appear, and rows starting with the first
+term rank first.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, IntegerField, When
+from django.db.models.expressions import RawSQL
+
+from .models import Transaction
+
+MAX_QUERY_TERMS = 8
+
+TABLE = Transaction._meta.db_table
+SEARCH_VECTOR_SQL = "to_tsvector('simple', raw_description)"
+
+SEARCH_INDEXES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    f"CREATE INDEX IF NOT EXISTS txn_user_fts_idx ON {TABLE} USING gin (user_id, {SEARCH_VECTOR_SQL})",
+    f"CREATE INDEX IF NOT EXISTS txn_user_trgm_idx ON {TABLE} USING gin (user_id, raw_description gin_trgm_ops)",
+]
+
+
+class InvalidSearch(ValueError):
+    """Raised when the search query has nothing to search for."""
+
+
+def search_terms(query):
+    terms = re.findall(r'\w+', (query or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        raise InvalidSearch("q must contain at least one letter or digit")
+    return terms
+
+
+def create_search_indexes(using='default'):
+    """Create the search extensions and indexes if missing (PostgreSQL only)."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for statement in SEARCH_INDEXES_SQL:
+            cursor.execute(statement)
+
+
+def search_transactions(queryset, query):
+    """Filter a Transaction queryset to rows matching `query`, best match first."""
+    terms = search_terms(query)
+    if connections[queryset.db].vendor == 'postgresql':
+        return _postgres_search(queryset, terms)
+    return _fallback_search(queryset, terms)
+
+
+def _postgres_search(queryset, terms):
+    # Written out rather than built from SearchVector, whose SQL wraps the
+    # column in COALESCE/casts that would no longer match the index expression.
+    column = f'"{TABLE}"."raw_description"'
+    vector = SEARCH_VECTOR_SQL.replace('raw_description', column)
+    tsquery = ' & '.join(f"{term}:*" for term in terms)
+    text = ' '.join(terms)
+    matches = RawSQL(
+        f"({vector} @@ to_tsquery('simple', %s) OR %s <%% {column})", [tsquery, text],
+        output_field=BooleanField()
+    )
+    rank = RawSQL(
+        f"ts_rank({vector}, to_tsquery('simple', %s)) + word_similarity(%s, {column})", [tsquery, text],
+        output_field=FloatField()
+    )
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', '-created_at', '-id')
+
+
+def _fallback_search(queryset, terms):
+    # Every term must appear; rows starting with the first term rank first.
+    for term in terms:
+        queryset = queryset.filter(raw_description__icontains=term)
+    rank = Case(When(raw_description__istartswith=terms[0], then=1), default=0, output_field=IntegerField())
+    return queryset.annotate(rank=rank).order_by('-rank', '-created_at', '-id')
@@ -1,8 +1,13 @@
 
 from rest_framework import serializers
-from .models import Category, Transaction, Budget, BackgroundTask
+from rest_framework.validators import UniqueTogetherValidator
+from .models import Category, Transaction, Budget, BackgroundTask, RecurringSeries, TRANSACTION_TYPE
 from django.db import transaction
 from rest_framework.views import exception_handler
+from .budgets import recalculate_budget
+from .currency import is_convertible, user_currency
+from .recurring import next_occurrence
+from .service import TransactionService, CategoryService
 
 class CurrentUserDefault:
     """Sets the user field automatically to the logged-in user."""
@@ -18,6 +23,29 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'user', 'name', 'keywords']
         read_only_fields = ['user']
+        # Deleted categories are kept as tombstones; only live ones own a name.
+        validators = [
+            UniqueTogetherValidator(queryset=Category.objects.filter(is_active=True), fields=['user', 'name'])
+        ]
+
+    @transaction.atomic
+    def create(self, validated_data):
+        CategoryService.release_names(validated_data['user'], [validated_data['name']])
+        return super().create(validated_data)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        if validated_data.get('name', instance.name) != instance.name:
+            CategoryService.release_names(instance.user, [validated_data['name']])
+        return super().update(instance, validated_data)
+
+RECURRING_UPCOMING_COUNT = 3
+
+def currency_code(value):
+    code = value.upper()
+    if len(code) != 3 or not code.isalpha():
+        raise serializers.ValidationError("Enter a three-letter ISO 4217 currency code.")
+    return code
 
 class TransactionSerializer(serializers.ModelSerializer):
     """Handles Transaction CRUD and integrates ML/Anomaly fields."""
@@ -29,29 +57,55 @@ class TransactionSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = [
             'id', 'user', 'amount', 'raw_description', 
-            'category', 'category_name', 'is_anomaly', 'transaction_type'
+            'category', 'category_name', 'is_anomaly', 'transaction_type', 'currency', 'merchant'
         ]
-        # is_anomaly is set by the service layer/ML model, not the user
-        read_only_fields = ['is_anomaly'] 
+        # is_anomaly is set by the service layer/ML model, not the user;
+        # merchant is derived from raw_description on save
+        read_only_fields = ['is_anomaly', 'merchant']
+        extra_kwargs = {'category': {'queryset': Category.objects.filter(is_active=True)}}
+
+    def validate_currency(self, value):
+        return currency_code(value)
+
+    def validate(self, attrs):
+        # Totals are reported in the user's currency, so it must convert.
+        currency = attrs.get('currency')
+        if currency and not is_convertible(currency, user_currency(self.context['request'].user.id)):
+            raise serializers.ValidationError({'currency': [f"No exchange rate loaded for {currency}."]})
+        if 'category' in attrs:
+            attrs['category_confirmed'] = attrs['category'] is not None
+        return attrs
         
     @transaction.atomic 
     def create(self, validated_data):
-        # NOTE: The actual ML/Anomaly logic will be handled 
-        # in the TransactionService layer
-        return Transaction.objects.create(**validated_data)
+        # NOTE: The actual ML/Anomaly logic is handled asynchronously
+        # by the TransactionService enrichment pipeline
+        return TransactionService.create(validated_data, duplicates=self.context.get('duplicates', 'warn'))
 
 class BudgetSerializer(serializers.ModelSerializer):
     """Handles Budget CRUD and exposes ML prediction field."""
     user = serializers.HiddenField(default=CurrentUserDefault())
+    remaining_amount = serializers.SerializerMethodField()
     
     class Meta:
         model = Budget
         fields = [
             'id', 'user', 'category', 'period_start_date', 'period_end_date', 
-            'limit_amount', 'ml_prediction_amount', 'status'
+            'limit_amount', 'ml_prediction_amount', 'spent_amount', 'remaining_amount', 'status'
         ]
         # Prediction amount is set by the Time Series Model, not the user
-        read_only_fields = ['ml_prediction_amount', 'status']
+        # spent_amount and status are maintained by the budget engine
+        read_only_fields = ['ml_prediction_amount', 'spent_amount', 'status']
+        extra_kwargs = {'category': {'queryset': Category.objects.filter(is_active=True)}}
+
+    def get_remaining_amount(self, obj):
+        return str(obj.limit_amount - obj.spent_amount)
+
+    def create(self, validated_data):
+        return recalculate_budget(super().create(validated_data))
+
+    def update(self, instance, validated_data):
+        return recalculate_budget(super().update(instance, validated_data))
 
 class BackgroundTaskSerializer(serializers.ModelSerializer):
     """Handles tracking status of async jobs (FR-13, FR-14)."""
@@ -63,4 +117,44 @@ class BackgroundTaskSerializer(serializers.ModelSerializer):
             'id', 'user', 'task_id', 'task_type', 'status', 'created_at', 'result_file'
         ]
         # All fields are read-only except for the initial creation/viewing
-        read_only_fields = ['task_id', 'status', 'created_at', 'result_file']
\ No newline at end of file
+        read_only_fields = ['task_id', 'status', 'created_at', 'result_file']
+
+class RecurringSeriesSerializer(serializers.ModelSerializer):
+    """Read-only view of a detected recurring series and its coming dates."""
+    upcoming_dates = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecurringSeries
+        fields = [
+            'id', 'category', 'transaction_type', 'description_key', 'currency', 'amount', 'period',
+            'interval_days', 'occurrences', 'first_date', 'last_date', 'next_date', 'upcoming_dates'
+        ]
+        read_only_fields = fields
+
+    def get_upcoming_dates(self, obj):
+        return [
+            next_occurrence(obj.last_date, obj.period, count).isoformat()
+            for count in range(1, RECURRING_UPCOMING_COUNT + 1)
+        ]
+
+# --- Bulk endpoints ---
+# Items are validated without touching the database; ownership of the
+# referenced ids is checked for the whole batch in the service layer.
+
+class TransactionBulkItemSerializer(serializers.Serializer):
+    """One item of a bulk transaction create/update."""
+    id = serializers.IntegerField(required=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    raw_description = serializers.CharField(max_length=255)
+    category = serializers.IntegerField(required=False, allow_null=True)
+    transaction_type = serializers.ChoiceField(choices=TRANSACTION_TYPE, required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+
+    def validate_currency(self, value):
+        return currency_code(value)
+
+class CategoryBulkItemSerializer(serializers.Serializer):
+    """One item of a bulk category create/update."""
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=100)
+    keywords = serializers.CharField(required=False, allow_blank=True)
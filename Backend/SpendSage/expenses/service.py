@@ -1 +1,422 @@
-# business logic
\ No newline at end of file
+# business logic
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, Left
+from django.utils import timezone
+
+from common.cache import bump_generation_on_commit, CATEGORIES_NAMESPACE, BUDGETS_NAMESPACE
+from ml_engine.anomaly import is_scored, score_many
+from ml_engine.predictor import categorize_many, invalidate_keyword_matcher
+from .currency import is_convertible, user_currency
+from .duplicates import DuplicateTransaction, find_duplicate, fingerprint, transaction_fingerprint
+from .merchants import canonical_merchants
+from .recurring import record_group_moves
+from .models import Category, Transaction, Budget
+from .signals import spend_changed
+from .spend import spend_entry, spend_changes, mark_loaded
+
+ENRICHMENT_BATCH_SIZE = 500
+# Upper bound on the items accepted by one bulk request.
+MAX_BULK_ITEMS = 500
+# New transactions within this window share one scheduled drain task.
+ENRICHMENT_DEBOUNCE_SECONDS = 1
+ENRICHMENT_SCHEDULED_KEY = 'enrichment:scheduled'
+# Room kept for the "#<id>" appended to a deleted category's name.
+TOMBSTONE_SUFFIX_LENGTH = 21
+
+
+class TransactionService:
+    """
+    Owns the transaction write path.
+
+    The request only inserts the row, flagged enrichment_pending. A Celery
+    task then drains pending rows in batches: categorization, anomaly
+    scoring and the rollup/budget updates all run there, and each batch is
+    committed with one bulk_update. Set TRANSACTION_ENRICHMENT_SYNC = True
+    (e.g. in tests) to enrich inline instead.
+    """
+
+    @classmethod
+    def create(cls, validated_data, duplicates='warn'):
+        """
+        `duplicates` decides what happens when the same row was already
+        created today: 'warn' saves it and sets possible_duplicate_of on the
+        instance, 'reject' raises DuplicateTransaction, 'allow' skips the check.
+        """
+        user = validated_data['user']
+        validated_data.setdefault('currency', user_currency(user.id))
+        duplicate_of = None
+        if duplicates != 'allow':
+            now = timezone.now()
+            duplicate_of = find_duplicate(user.id, fingerprint(
+                user.id, validated_data['amount'], validated_data['currency'], validated_data['raw_description'], now
+            ), timezone.localdate(now))
+            if duplicate_of is not None and duplicates == 'reject':
+                raise DuplicateTransaction(duplicate_of)
+        instance = Transaction.objects.create(enrichment_pending=True, **validated_data)
+        instance.possible_duplicate_of = duplicate_of
+        if getattr(settings, 'TRANSACTION_ENRICHMENT_SYNC', False):
+            cls.enrich(Transaction.objects.filter(pk=instance.pk))
+            instance.refresh_from_db()
+        else:
+            transaction.on_commit(cls.schedule_enrichment)
+        return instance
+
+    @staticmethod
+    def schedule_enrichment():
+        """Queue one drain task per debounce window rather than one per create."""
+        from .tasks import enrich_pending_transactions_task
+
+        if cache.add(ENRICHMENT_SCHEDULED_KEY, 1, timeout=ENRICHMENT_DEBOUNCE_SECONDS):
+            enrich_pending_transactions_task.apply_async(countdown=ENRICHMENT_DEBOUNCE_SECONDS)
+
+    @classmethod
+    @transaction.atomic
+    def enrich(cls, queryset=None, batch_size=ENRICHMENT_BATCH_SIZE):
+        """
+        Enrich one batch of pending transactions; returns how many were done.
+
+        Rows are claimed with SKIP LOCKED so several workers can drain the
+        queue side by side without processing a row twice.
+        """
+        if queryset is None:
+            queryset = Transaction.objects.all()
+        batch = list(
+            queryset.filter(enrichment_pending=True)
+            .order_by('created_at', 'id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        by_user = {}
+        for txn in batch:
+            by_user.setdefault(txn.user_id, []).append(txn)
+
+        # One compiled matcher / model call per user, not per row.
+        for user_id, rows in by_user.items():
+            uncategorized = [txn for txn in rows if txn.category_id is None]
+            if uncategorized:
+                predicted = categorize_many(
+                    user_id, [txn.raw_description for txn in uncategorized],
+                    merchants=[txn.merchant for txn in uncategorized]
+                )
+                for txn, category_id in zip(uncategorized, predicted):
+                    txn.category_id = category_id
+
+        flags = score_many([
+            (txn.pk, txn.user_id, txn.category_id, txn.amount)
+            for txn in batch if txn.is_active and is_scored(txn.transaction_type)
+        ])
+        now = timezone.now()
+        for txn in batch:
+            txn.is_anomaly = flags.get(txn.pk, False)
+            txn.enrichment_pending = False
+            txn.updated_at = now
+
+        Transaction.objects.bulk_update(batch, ['category', 'is_anomaly', 'enrichment_pending', 'updated_at'])
+        # bulk_update sends no post_save, so hand the batch to rollups/budgets at once.
+        spend_changed.send(
+            sender=Transaction,
+            removed=[],
+            added=[entry for entry in map(spend_entry, batch) if entry]
+        )
+        for txn in batch:
+            mark_loaded(txn)
+        return len(batch)
+
+    # --- Bulk operations ---
+    # bulk_create/bulk_update send no model signals, so every bulk path
+    # announces its spend changes itself, once for the whole batch.
+
+    @classmethod
+    def bulk_create(cls, user, items):
+        from .serializers import TransactionBulkItemSerializer
+
+        valid, results = validate_bulk_items(items, TransactionBulkItemSerializer)
+        owned = owned_category_ids(user, [data.get('category') for _, data in valid])
+        currency = user_currency(user.id)
+        pending = []
+        for index, data in valid:
+            category_id = data.get('category')
+            if category_id is not None and category_id not in owned:
+                results.append(bulk_error(index, {'category': ['Category not found.']}))
+                continue
+            if 'currency' in data and not is_convertible(data['currency'], currency):
+                results.append(bulk_error(index, {'currency': [f"No exchange rate loaded for {data['currency']}."]}))
+                continue
+            fields = {key: value for key, value in data.items() if key not in ('id', 'category')}
+            fields.setdefault('currency', currency)
+            pending.append((index, Transaction(
+                user=user, category_id=category_id, category_confirmed=category_id is not None,
+                enrichment_pending=True, **fields
+            )))
+
+        merchants = canonical_merchants([txn.raw_description for _, txn in pending])
+        for (_, txn), merchant in zip(pending, merchants):
+            txn.merchant = merchant
+            txn.fingerprint = transaction_fingerprint(txn)
+
+        with transaction.atomic():
+            Transaction.objects.bulk_create([txn for _, txn in pending])
+            if pending and not getattr(settings, 'TRANSACTION_ENRICHMENT_SYNC', False):
+                transaction.on_commit(cls.schedule_enrichment)
+        if pending and getattr(settings, 'TRANSACTION_ENRICHMENT_SYNC', False):
+            cls.enrich(Transaction.objects.filter(pk__in=[txn.pk for _, txn in pending]))
+        results.extend({'index': index, 'id': txn.pk, 'status': 'created'} for index, txn in pending)
+        return sorted(results, key=lambda result: result['index'])
+
+    @classmethod
+    @transaction.atomic
+    def bulk_update(cls, user, items):
+        from .serializers import TransactionBulkItemSerializer
+
+        valid, results = validate_bulk_items(items, TransactionBulkItemSerializer, partial=True)
+        valid, id_errors = require_ids(valid)
+        results.extend(id_errors)
+        rows = Transaction.objects.select_for_update().filter(user=user, is_active=True).in_bulk(
+            [data['id'] for _, data in valid]
+        )
+        owned = owned_category_ids(user, [data.get('category') for _, data in valid])
+        currency = user_currency(user.id)
+        now = timezone.now()
+        updated, removed, added = [], [], []
+        for index, data in valid:
+            txn = rows.get(data['id'])
+            if txn is None:
+                results.append(bulk_error(index, {'id': ['Transaction not found.']}))
+                continue
+            if data.get('category') is not None and data['category'] not in owned:
+                results.append(bulk_error(index, {'category': ['Category not found.']}))
+                continue
+            if 'currency' in data and not is_convertible(data['currency'], currency):
+                results.append(bulk_error(index, {'currency': [f"No exchange rate loaded for {data['currency']}."]}))
+                continue
+            for key, value in data.items():
+                if key == 'category':
+                    txn.category_id = value
+                    txn.category_confirmed = value is not None
+                elif key != 'id':
+                    setattr(txn, key, value)
+            # bulk_update bypasses auto_now.
+            txn.updated_at = now
+            old, new = spend_changes(txn)
+            if old:
+                removed.append(old)
+            if new:
+                added.append(new)
+            updated.append(txn)
+            results.append({'index': index, 'id': txn.pk, 'status': 'updated'})
+
+        renamed = [txn for txn in updated if txn._loaded_values.get('raw_description') != txn.raw_description]
+        for txn, merchant in zip(renamed, canonical_merchants([txn.raw_description for txn in renamed])):
+            txn.merchant = merchant
+        for txn in updated:
+            txn.fingerprint = transaction_fingerprint(txn)
+        Transaction.objects.bulk_update(
+            updated, [
+                'amount', 'raw_description', 'merchant', 'fingerprint', 'category', 'category_confirmed',
+                'transaction_type', 'currency', 'updated_at',
+            ]
+        )
+        record_group_moves(updated)
+        if removed or added:
+            spend_changed.send(sender=Transaction, removed=removed, added=added)
+        for txn in updated:
+            mark_loaded(txn)
+        return sorted(results, key=lambda result: result['index'])
+
+    @classmethod
+    @transaction.atomic
+    def bulk_delete(cls, user, ids):
+        """Soft delete: rows stay behind as is_active=False tombstones for delta sync."""
+        rows = list(
+            Transaction.objects.select_for_update().filter(user=user, is_active=True, id__in=dict.fromkeys(ids))
+        )
+        removed = [entry for entry in map(spend_entry, rows) if entry]
+        Transaction.objects.filter(pk__in=[txn.pk for txn in rows]).update(
+            is_active=False, updated_at=timezone.now()
+        )
+        if removed:
+            spend_changed.send(sender=Transaction, removed=removed, added=[])
+        return deleted_results(ids, {txn.pk for txn in rows}, 'Transaction not found.')
+
+
+class CategoryService:
+    """Bulk writes for categories; single-row writes go through the serializer."""
+
+    @staticmethod
+    def categories_changed(user_id):
+        """What the Category signals do per row, done once per batch."""
+        invalidate_keyword_matcher(user_id)
+        bump_generation_on_commit(CATEGORIES_NAMESPACE, user_id)
+
+    @staticmethod
+    def release_names(user, names):
+        """
+        Rename deleted categories holding any of these names to "<name>#<id>"
+        so a live category can take them over ((user, name) is unique in the
+        table). The tombstones stay: delta sync still has to report them, and
+        deleting them would cascade to their transactions and budgets.
+        """
+        suffix = Concat(Value('#'), Cast('id', CharField()))
+        # Leave room for the suffix within max_length.
+        keep = Category._meta.get_field('name').max_length - TOMBSTONE_SUFFIX_LENGTH
+        Category.objects.filter(user=user, is_active=False, name__in=names).update(
+            name=Concat(Left('name', keep), suffix, output_field=CharField())
+        )
+
+    @classmethod
+    @transaction.atomic
+    def soft_delete(cls, user, categories):
+        """
+        Tombstone categories together with their transactions and budgets,
+        mirroring what the CASCADE foreign keys do on a hard delete.
+        """
+        category_ids = [category.pk for category in categories]
+        if not category_ids:
+            return
+        now = timezone.now()
+        transactions = Transaction.objects.filter(category_id__in=category_ids, is_active=True)
+        removed = [entry for entry in map(spend_entry, transactions.select_for_update()) if entry]
+        transactions.update(is_active=False, updated_at=now)
+        Budget.objects.filter(category_id__in=category_ids, is_active=True).update(is_active=False, updated_at=now)
+        Category.objects.filter(pk__in=category_ids).update(is_active=False, updated_at=now)
+        if removed:
+            spend_changed.send(sender=Transaction, removed=removed, added=[])
+        cls.categories_changed(user.id)
+        bump_generation_on_commit(BUDGETS_NAMESPACE, user.id)
+
+    @classmethod
+    def bulk_create(cls, user, items):
+        from .serializers import CategoryBulkItemSerializer
+
+        valid, results = validate_bulk_items(items, CategoryBulkItemSerializer)
+        taken = set(
+            Category.objects.filter(user=user, is_active=True, name__in=[data['name'] for _, data in valid])
+            .values_list('name', flat=True)
+        )
+        pending = []
+        for index, data in valid:
+            if data['name'] in taken:
+                results.append(bulk_error(index, {'name': ['A category with this name already exists.']}))
+                continue
+            taken.add(data['name'])
+            pending.append((index, Category(user=user, name=data['name'], keywords=data.get('keywords', ''))))
+
+        with transaction.atomic():
+            cls.release_names(user, [category.name for _, category in pending])
+            Category.objects.bulk_create([category for _, category in pending])
+        if pending:
+            cls.categories_changed(user.id)
+        results.extend({'index': index, 'id': category.pk, 'status': 'created'} for index, category in pending)
+        return sorted(results, key=lambda result: result['index'])
+
+    @classmethod
+    def bulk_update(cls, user, items):
+        from .serializers import CategoryBulkItemSerializer
+
+        valid, results = validate_bulk_items(items, CategoryBulkItemSerializer, partial=True)
+        valid, id_errors = require_ids(valid)
+        results.extend(id_errors)
+        now = timezone.now()
+        updated = []
+        with transaction.atomic():
+            rows = Category.objects.select_for_update().filter(user=user, is_active=True).in_bulk(
+                [data['id'] for _, data in valid]
+            )
+            found = []
+            for index, data in valid:
+                category = rows.get(data['id'])
+                if category is None:
+                    results.append(bulk_error(index, {'id': ['Category not found.']}))
+                else:
+                    found.append((index, data, category, data.get('name', category.name)))
+            # A final name may not be held by a category outside the batch
+            # or by another category of the batch.
+            final_names = [name for _, _, _, name in found]
+            taken = set(
+                Category.objects.filter(user=user, is_active=True, name__in=final_names)
+                .exclude(id__in=[category.pk for _, _, category, _ in found])
+                .values_list('name', flat=True)
+            )
+            duplicated = {name for name in final_names if final_names.count(name) > 1}
+            for index, data, category, name in found:
+                if name in taken or name in duplicated:
+                    results.append(bulk_error(index, {'name': ['A category with this name already exists.']}))
+                    continue
+                category.name = name
+                category.keywords = data.get('keywords', category.keywords)
+                category.updated_at = now
+                updated.append(category)
+                results.append({'index': index, 'id': category.pk, 'status': 'updated'})
+            cls.release_names(user, [category.name for category in updated])
+            Category.objects.bulk_update(updated, ['name', 'keywords', 'updated_at'])
+        if updated:
+            cls.categories_changed(user.id)
+        return sorted(results, key=lambda result: result['index'])
+
+    @classmethod
+    @transaction.atomic
+    def bulk_delete(cls, user, ids):
+        rows = list(Category.objects.select_for_update().filter(user=user, is_active=True, id__in=dict.fromkeys(ids)))
+        cls.soft_delete(user, rows)
+        return deleted_results(ids, {category.pk for category in rows}, 'Category not found.')
+
+
+# --- Bulk helpers ---
+
+def bulk_error(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+def validate_bulk_items(items, serializer_class, partial=False):
+    """
+    Validate every item of a batch without touching the database.
+    Returns ([(index, validated_data)], [error results]).
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item, partial=partial)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append(bulk_error(index, serializer.errors))
+    return valid, errors
+
+
+def require_ids(valid):
+    """Updates need an id, and each id may appear once per batch."""
+    seen, kept, errors = set(), [], []
+    for index, data in valid:
+        if 'id' not in data:
+            errors.append(bulk_error(index, {'id': ['This field is required.']}))
+        elif data['id'] in seen:
+            errors.append(bulk_error(index, {'id': ['Duplicate id in this batch.']}))
+        else:
+            seen.add(data['id'])
+            kept.append((index, data))
+    return kept, errors
+
+
+def owned_category_ids(user, category_ids):
+    """Ownership check for every category a batch references, in one query."""
+    category_ids = {category_id for category_id in category_ids if category_id is not None}
+    if not category_ids:
+        return set()
+    return set(
+        Category.objects.filter(user=user, is_active=True, id__in=category_ids).values_list('id', flat=True)
+    )
+
+
+def deleted_results(ids, deleted_ids, missing_message):
+    """Per-item delete results; a repeated id is reported deleted only once."""
+    first_index = {pk: index for index, pk in reversed(list(enumerate(ids)))}
+    return [
+        bulk_error(index, {'id': ['Duplicate id in this batch.']}) if first_index[pk] != index
+        else {'index': index, 'id': pk, 'status': 'deleted'} if pk in deleted_ids
+        else bulk_error(index, {'id': [missing_message]})
+        for index, pk in enumerate(ids)
+    ]
@@ -0,0 +1,131 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from users.models import User, ClaimsUser, user_row_cache_key
+from common.cache import (
+    bump_generation_on_commit, CATEGORIES_NAMESPACE, BUDGETS_NAMESPACE, TASKS_NAMESPACE
+)
+from ml_engine.predictor import invalidate_keyword_matcher
+from .budgets import apply_spend_changes
+from .duplicates import FINGERPRINT_FIELDS, transaction_fingerprint
+from .merchants import canonical_merchant, invalidate_merchants
+from .recurring import record_group_moves
+from .models import Category, Merchant, Transaction, Budget, BackgroundTask
+from .spend import spend_changes, mark_loaded
+from .task_status import publish_task_status, task_status_key
+
+# Sent with lists of SpendEntry tuples whenever transaction totals change:
+# `removed` stopped counting, `added` started counting. Sent once per batch
+# by bulk paths (imports) and once per row by ordinary saves and deletes.
+spend_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categorizer(sender, instance, **kwargs):
+    """Recompile the user's keyword matcher after any category change."""
+    invalidate_keyword_matcher(instance.user_id)
+    bump_generation_on_commit(CATEGORIES_NAMESPACE, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Budget)
+def invalidate_budget_list(sender, instance, **kwargs):
+    bump_generation_on_commit(BUDGETS_NAMESPACE, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=BackgroundTask)
+def invalidate_task_list(sender, instance, **kwargs):
+    # Also fires when Celery workers move a task to SUCCESS/FAILED.
+    bump_generation_on_commit(TASKS_NAMESPACE, instance.user_id)
+
+
+@receiver(post_save, sender=BackgroundTask)
+def push_task_status(sender, instance, created, **kwargs):
+    # Intermediate PENDING saves (import progress reports) are covered by
+    # TaskProgress; push the creation and the final SUCCESS/FAILED.
+    if created or instance.status != 'PENDING':
+        transaction.on_commit(lambda: publish_task_status(instance))
+
+
+@receiver(post_delete, sender=BackgroundTask)
+def drop_task_status(sender, instance, **kwargs):
+    cache.delete(task_status_key(instance.user_id, instance.pk))
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ClaimsUser)
+def remember_currency(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and 'currency_preference' not in update_fields):
+        return
+    instance._saved_currency = (
+        User.objects.filter(pk=instance.pk).values_list('currency_preference', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def currency_changed(sender, instance, **kwargs):
+    """Budget spend is converted to the user's currency, so recompute it."""
+    saved = getattr(instance, '_saved_currency', None)
+    instance._saved_currency = None
+    if saved is not None and saved != instance.currency_preference:
+        from .tasks import recalculate_user_budgets_task
+
+        def recalculate():
+            # A read before the commit may have cached the old currency again.
+            cache.delete(user_row_cache_key(instance.pk))
+            recalculate_user_budgets_task.delay(instance.pk)
+
+        transaction.on_commit(recalculate)
+
+
+@receiver([post_save, post_delete], sender=Merchant)
+def merchants_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_merchants)
+
+
+@receiver(pre_save, sender=Transaction)
+def set_merchant(sender, instance, update_fields=None, **kwargs):
+    """Canonicalize the merchant whenever raw_description is new or changed."""
+    if update_fields is not None and 'merchant' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if instance._state.adding or loaded.get('raw_description') != instance.raw_description:
+        instance.merchant = canonical_merchant(instance.raw_description)
+
+
+@receiver(pre_save, sender=Transaction)
+def set_fingerprint(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'fingerprint' not in update_fields:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if instance._state.adding or any(loaded.get(name) != getattr(instance, name) for name in FINGERPRINT_FIELDS):
+        instance.fingerprint = transaction_fingerprint(instance)
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    if not created:
+        record_group_moves([instance])
+    removed, added = spend_changes(instance, created=created)
+    if removed or added:
+        spend_changed.send(
+            sender=Transaction,
+            removed=[removed] if removed else [],
+            added=[added] if added else []
+        )
+    mark_loaded(instance)
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    removed, _ = spend_changes(instance, deleted=True)
+    if removed:
+        spend_changed.send(sender=Transaction, removed=[removed], added=[])
+
+
+@receiver(spend_changed)
+def update_budgets(sender, removed, added, **kwargs):
+    """Move spent/status of the budgets covering the changed transactions."""
+    apply_spend_changes(removed, added)
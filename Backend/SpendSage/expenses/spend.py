@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+from django.db.models import DEFERRED
+
+# The parts of a transaction that derived totals (rollups, budgets) depend on.
+SpendEntry = namedtuple(
+    'SpendEntry', ['user_id', 'category_id', 'transaction_type', 'created_at', 'amount', 'currency']
+)
+
+ENTRY_FIELDS = ('user_id', 'category_id', 'transaction_type', 'created_at', 'amount', 'currency')
+
+
+def spend_entry(transaction):
+    """The entry a saved transaction contributes now, or None if it contributes nothing."""
+    # Rows waiting for enrichment are counted once the pipeline has categorized them.
+    if not transaction.is_active or transaction.enrichment_pending:
+        return None
+    return SpendEntry(
+        transaction.user_id,
+        transaction.category_id,
+        (transaction.transaction_type or '').lower(),
+        transaction.created_at,
+        transaction.amount,
+        transaction.currency,
+    )
+
+
+def loaded_spend_entry(transaction):
+    """The entry the transaction contributed when it was loaded from the database."""
+    loaded = getattr(transaction, '_loaded_values', None)
+    if not loaded or not loaded.get('is_active', True) or loaded.get('enrichment_pending'):
+        return None
+    if any(loaded.get(name, DEFERRED) is DEFERRED for name in ENTRY_FIELDS):
+        return None
+    return SpendEntry(
+        loaded['user_id'],
+        loaded['category_id'],
+        (loaded['transaction_type'] or '').lower(),
+        loaded['created_at'],
+        loaded['amount'],
+        loaded['currency'],
+    )
+
+
+def spend_changes(transaction, created=False, deleted=False):
+    """
+    Return (removed, added) entries describing how a write changed the totals.
+
+    Either side may be None; an update that did not touch any entry field
+    returns (None, None) so callers can skip the work entirely.
+    """
+    removed = None if created else loaded_spend_entry(transaction)
+    added = None if deleted else spend_entry(transaction)
+    if removed == added:
+        return None, None
+    return removed, added
+
+
+def mark_loaded(transaction):
+    """Refresh the loaded snapshot after a save so the next save diffs correctly."""
+    transaction._loaded_values = {
+        'is_active': transaction.is_active,
+        'enrichment_pending': transaction.enrichment_pending,
+        'raw_description': transaction.raw_description,
+        'merchant': transaction.merchant,
+        **{name: getattr(transaction, name) for name in ENTRY_FIELDS},
+    }
@@ -0,0 +1,166 @@
+"""
+Push-based BackgroundTask status.
+
+Whoever moves a task (the web process creating it, Celery workers updating
+it) stores its latest state in the cache under task_status_key and, with
+django_redis, publishes it on the owner's Redis channel. Status reads try
+that key before the database, and the SSE stream in async_views relays the
+channel to the browser, so clients no longer poll BackgroundTask rows.
+"""
+import asyncio
+import contextlib
+import weakref
+from collections import defaultdict
+
+import orjson
+from django.core.cache import cache
+
+from common.cache import uses_django_redis, async_redis, acache_get
+
+TASK_STATUS_TIMEOUT = 60 * 60 * 24
+TASK_CHANNEL_PREFIX = 'tasks:user:'
+# Events buffered per SSE client; a client that falls this far behind
+# drops events and catches up from the snapshot when it reconnects.
+TASK_EVENT_QUEUE_SIZE = 100
+TASK_HUB_READY_TIMEOUT = 5
+
+
+def task_channel(user_id):
+    return f"{TASK_CHANNEL_PREFIX}{user_id}"
+
+
+def task_status_key(user_id, task_pk):
+    # The owner is part of the key, so a hit is already ownership-checked.
+    return f"task:status:{user_id}:{task_pk}"
+
+
+def task_status_payload(task, progress=None):
+    """BackgroundTaskSerializer data plus a 0-100 progress percentage."""
+    from .serializers import BackgroundTaskSerializer
+
+    data = dict(BackgroundTaskSerializer(task).data)
+    if progress is None:
+        progress = 0 if task.status == 'PENDING' else 100
+    data['progress'] = progress
+    return data
+
+
+def publish_task_status(task, progress=None):
+    payload = task_status_payload(task, progress)
+    cache.set(task_status_key(task.user_id, task.pk), payload, TASK_STATUS_TIMEOUT)
+    if uses_django_redis():
+        from django_redis import get_redis_connection
+
+        get_redis_connection('default').publish(task_channel(task.user_id), orjson.dumps(payload))
+    return payload
+
+
+def get_task_status(user, task_pk):
+    """The task's latest state from the cache, else from its row; None if not the user's."""
+    payload = cache.get(task_status_key(user.id, task_pk))
+    if payload is None:
+        from .models import BackgroundTask
+
+        task = BackgroundTask.objects.filter(user=user, pk=task_pk).first()
+        payload = task_status_payload(task) if task else None
+    return payload
+
+
+async def aget_task_status(user, task_pk):
+    """get_task_status for async views."""
+    payload = await acache_get(task_status_key(user.id, task_pk))
+    if payload is None:
+        from .models import BackgroundTask
+
+        task = await BackgroundTask.objects.filter(user=user, pk=task_pk).afirst()
+        payload = task_status_payload(task) if task else None
+    return payload
+
+
+async def apending_task_statuses(user):
+    """Latest state of each of the user's PENDING tasks."""
+    from .models import BackgroundTask
+
+    return [
+        await acache_get(task_status_key(user.id, task.pk)) or task_status_payload(task)
+        async for task in BackgroundTask.objects.filter(user=user, status='PENDING')
+    ]
+
+
+class TaskProgress:
+    """Publish a running task's progress, at most once per whole percent."""
+
+    def __init__(self, task):
+        self.task = task
+        self.percent = None
+
+    def update(self, done, total):
+        # 100 is left for the SUCCESS/FAILED transition itself.
+        percent = min(int(done * 100 / total), 99) if total else 0
+        if percent != self.percent:
+            self.percent = percent
+            publish_task_status(self.task, percent)
+
+
+class TaskEventHub:
+    """
+    One Redis pattern subscription per process, fanned out to SSE clients.
+
+    Every open stream gets an asyncio.Queue fed from a single pub/sub
+    connection, so thousands of waiting clients cost one Redis connection
+    rather than one each.
+    """
+
+    def __init__(self):
+        self.listeners = defaultdict(set)  # user_id -> queues
+        self.reader = None
+        self.ready = asyncio.Event()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, user_id):
+        """Yield a queue of the user's events (None: stream ended, reconnect)."""
+        queue = asyncio.Queue(maxsize=TASK_EVENT_QUEUE_SIZE)
+        self.listeners[user_id].add(queue)
+        try:
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.get_running_loop().create_task(self.read())
+            # Subscribed before the caller takes its snapshot, so no event
+            # falls in between.
+            await asyncio.wait_for(self.ready.wait(), TASK_HUB_READY_TIMEOUT)
+            yield queue
+        finally:
+            listeners = self.listeners[user_id]
+            listeners.discard(queue)
+            if not listeners:
+                del self.listeners[user_id]
+
+    async def read(self):
+        pubsub = async_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(f"{TASK_CHANNEL_PREFIX}*")
+            self.ready.set()
+            async for message in pubsub.listen():
+                user_id = int(message['channel'][len(TASK_CHANNEL_PREFIX):])
+                for queue in self.listeners.get(user_id, ()):
+                    with contextlib.suppress(asyncio.QueueFull):
+                        queue.put_nowait(message['data'])
+        finally:
+            self.ready.clear()
+            await pubsub.aclose()
+            # End every open stream; EventSource clients reconnect on their own.
+            for queues in self.listeners.values():
+                for queue in queues:
+                    with contextlib.suppress(asyncio.QueueFull):
+                        queue.put_nowait(None)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def task_event_hub():
+    """The TaskEventHub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = TaskEventHub()
+    return hub
@@ -0,0 +1,103 @@
+import logging
+
+from celery import group, shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+
+from ml_engine.tasks import rebuild_anomaly_stats_task
+from .budgets import recalculate_user_budgets
+from .exporters import export_transactions
+from .importers import TransactionImporter
+from .models import BackgroundTask
+from .partitions import ensure_partitions, PartitioningError
+from .recurring import expire_series, scan_user
+from .service import TransactionService, ENRICHMENT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Users per Celery subtask of the recurrence scan.
+RECURRING_USERS_PER_TASK = 100
+
+
+@shared_task
+def import_transactions_task(background_task_id, file_path, file_format='csv'):
+    """Import an uploaded bank statement for the task's user (FR-13)."""
+    task = BackgroundTask.objects.select_related('user').get(pk=background_task_id)
+    importer = TransactionImporter(task, file_path, file_format)
+    try:
+        importer.run()
+    except Exception:
+        logger.exception("Transaction import %s failed", task.task_id)
+        importer.write_report('FAILED')
+        raise
+    else:
+        importer.write_report('SUCCESS')
+        # Imported rows are historical and arrive out of order, so back-score
+        # the whole history instead of scoring them one by one.
+        if importer.imported:
+            rebuild_anomaly_stats_task.delay([task.user_id])
+    finally:
+        default_storage.delete(file_path)
+
+
+@shared_task
+def export_transactions_task(background_task_id, file_format='csv', filters=None):
+    """Export the task user's transactions to result_file (FR-14)."""
+    task = BackgroundTask.objects.select_related('user').get(pk=background_task_id)
+    try:
+        export_transactions(task, file_format, filters)
+    except Exception:
+        logger.exception("Transaction export %s failed", task.task_id)
+        task.status = 'FAILED'
+        task.save(update_fields=['status'])
+        raise
+
+
+@shared_task
+def enrich_pending_transactions_task():
+    """Drain the enrichment queue batch by batch until it is empty."""
+    enriched = 0
+    while True:
+        done = TransactionService.enrich(batch_size=ENRICHMENT_BATCH_SIZE)
+        enriched += done
+        if done < ENRICHMENT_BATCH_SIZE:
+            return enriched
+
+
+@shared_task
+def recalculate_user_budgets_task(user_id):
+    """Re-convert a user's budget spend after their currency_preference changed."""
+    return recalculate_user_budgets(user_id)
+
+
+@shared_task
+def create_transaction_partitions_task():
+    """Keep TRANSACTION_PARTITION_MONTHS_AHEAD months of partitions ready."""
+    try:
+        created = ensure_partitions(settings.TRANSACTION_PARTITION_MONTHS_AHEAD)
+    except PartitioningError as exc:
+        logger.info("Skipping transaction partitions: %s", exc)
+        return []
+    if created:
+        logger.info("Created transaction partitions %s", ', '.join(created))
+    return created
+
+
+@shared_task
+def detect_recurring_task(user_ids):
+    """Scan one chunk of users for recurring transactions."""
+    return sum(scan_user(user_id) for user_id in user_ids)
+
+
+@shared_task
+def detect_all_recurring_task():
+    """Lapse overdue series, then fan the incremental scan out over workers by user."""
+    expire_series()
+    user_ids = list(get_user_model().objects.values_list('id', flat=True).order_by('id'))
+    chunks = [
+        user_ids[start:start + RECURRING_USERS_PER_TASK]
+        for start in range(0, len(user_ids), RECURRING_USERS_PER_TASK)
+    ]
+    group(detect_recurring_task.s(chunk) for chunk in chunks).apply_async()
+    return len(chunks)
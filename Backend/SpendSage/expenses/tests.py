@@ -1,3 +1,1104 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.cache import TASKS_NAMESPACE, bump_generation
+from ml_engine.anomaly import MIN_HISTORY
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from .budgets import budget_status, recalculate_budget
+from .currency import MissingRate, clear_rate_table, convert_amounts
+from .exporters import EXPORT_COLUMNS
+from .importers import TransactionImporter, iter_ofx_rows
+from .merchants import backfill_merchants, canonical_merchants, invalidate_merchants, normalize_merchant
+from .models import (
+    BackgroundTask, Budget, Category, ExchangeRate, Merchant, RecurringGroupChange, RecurringScan, RecurringSeries,
+    Transaction,
+)
+from .pagination import TransactionCursorPagination
+from .recurring import detect, group_key, next_occurrence, scan_user
+from .partitions import (
+    PartitioningError, add_months, check_postgres, convert_to_partitioned, ensure_partitions, partition_name
+)
+from .service import ENRICHMENT_DEBOUNCE_SECONDS, ENRICHMENT_SCHEDULED_KEY, TransactionService
+from .sync import changes_since
+from .task_status import TaskEventHub, publish_task_status, task_status_key
+from .tasks import enrich_pending_transactions_task, export_transactions_task, recalculate_user_budgets_task
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS, TRANSACTION_ENRICHMENT_SYNC=True)
+class ExpensesTestCase(TestCase):
+    """An authenticated API client for a fresh user, on a private cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@example.com', username='owner@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_transaction(self, amount='10.00', description='COFFEE', user=None, **fields):
+        return Transaction.objects.create(
+            user=user or self.user, amount=Decimal(amount), raw_description=description,
+            transaction_type=fields.pop('transaction_type', 'expense'), **fields
+        )
+
+
+class TransactionPaginationTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/'
+
+    def walk(self, page_size):
+        """Follow next_cursor to the end; returns the ids of every page."""
+        pages, cursor = [], None
+        while True:
+            params = {'page_size': page_size, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.data['data']
+            pages.append([row['id'] for row in data['results']])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_rows_sharing_a_timestamp_are_neither_skipped_nor_repeated(self):
+        moment = timezone.now() - timedelta(days=1)
+        ids = [self.make_transaction(created_at=moment).pk for _ in range(5)]
+
+        pages = self.walk(page_size=2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), sorted(ids, reverse=True))
+
+    def test_exact_multiple_of_page_size_ends_without_a_cursor(self):
+        now = timezone.now()
+        ids = [self.make_transaction(created_at=now - timedelta(hours=hour)).pk for hour in range(4)]
+
+        pages = self.walk(page_size=2)
+
+        self.assertEqual(pages, [ids[:2], ids[2:]])
+
+    def test_newest_first_across_days(self):
+        now = timezone.now()
+        older = self.make_transaction(created_at=now - timedelta(days=3))
+        newer = self.make_transaction(created_at=now - timedelta(days=1))
+
+        self.assertEqual(self.walk(page_size=1), [[newer.pk], [older.pk]])
+
+    def test_only_the_owners_active_rows_are_listed(self):
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        self.make_transaction(user=other)
+        self.make_transaction(is_active=False)
+        mine = self.make_transaction()
+
+        self.assertEqual(self.walk(page_size=10), [[mine.pk]])
+
+    def test_category_name_comes_with_the_row(self):
+        category = Category.objects.create(user=self.user, name='Coffee')
+        self.make_transaction(category=category)
+
+        row = self.client.get(self.url).data['data']['results'][0]
+
+        self.assertEqual((row['category'], row['category_name']), (category.pk, 'Coffee'))
+
+    def test_page_size_is_capped(self):
+        paginator = TransactionCursorPagination()
+        self.assertEqual(paginator.get_page_size({'page_size': '100000'}), paginator.max_page_size)
+
+    def test_bad_cursor_and_page_size_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'page_size': '0'}, {'page_size': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        cursor = TransactionCursorPagination.encode_cursor(moment, 42)
+        self.assertEqual(TransactionCursorPagination.decode_cursor(cursor), (moment, 42))
+
+
+class TransactionImportTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.category = Category.objects.create(user=self.user, name='Coffee')
+
+    def run_import(self, content, file_format='csv', **options):
+        task = BackgroundTask.objects.create(user=self.user, task_id=f'import-{time.time_ns()}', task_type='import')
+        path = default_storage.save(f'imports/statement.{file_format}', ContentFile(content.encode()))
+        importer = TransactionImporter(task, path, file_format, **options).run()
+        importer.write_report('SUCCESS')
+        with task.result_file.open('rb') as handle:
+            return importer, json.load(handle)
+
+    def test_bad_rows_are_reported_by_line_and_the_rest_imported(self):
+        importer, report = self.run_import(
+            "date,description,amount,category,currency\n"
+            "2024-03-01,STARBUCKS,-250.00,coffee,\n"
+            "2024-03-02,,-10,,\n"
+            "2024-03-03,RENT,abc,,\n"
+            "not a date,SHOP,-5,,\n"
+            "2024-03-04,SHOP,-5,Unknown,\n"
+            "2024-03-05,SALARY,50000,,\n"
+        )
+
+        self.assertEqual((report['processed'], report['imported'], report['failed']), (6, 2, 4))
+        self.assertEqual(report['errors'], [
+            {'line': 3, 'error': 'Description is required'},
+            {'line': 4, 'error': "Invalid amount 'abc'"},
+            {'line': 5, 'error': "Unrecognised date 'not a date'"},
+            {'line': 6, 'error': "Unknown category 'Unknown'"},
+        ])
+        self.assertFalse(report['errors_truncated'])
+        rows = {txn.raw_description: txn for txn in Transaction.objects.filter(user=self.user)}
+        self.assertEqual(set(rows), {'STARBUCKS', 'SALARY'})
+        # The sign names the type; the statement date is kept as is.
+        self.assertEqual((rows['STARBUCKS'].transaction_type, rows['STARBUCKS'].amount), ('expense', Decimal('250.00')))
+        self.assertEqual(rows['SALARY'].transaction_type, 'income')
+        self.assertEqual(timezone.localdate(rows['STARBUCKS'].created_at).isoformat(), '2024-03-01')
+        self.assertEqual(rows['STARBUCKS'].category_id, self.category.pk)
+        self.assertTrue(rows['STARBUCKS'].category_confirmed)
+
+    def test_error_list_is_capped(self):
+        lines = ''.join(f"2024-03-01,ROW {index},oops\n" for index in range(5))
+        with mock.patch('expenses.importers.MAX_REPORTED_ERRORS', 2):
+            _, report = self.run_import("date,description,amount\n" + lines)
+
+        self.assertEqual(report['failed'], 5)
+        self.assertEqual(len(report['errors']), 2)
+        self.assertTrue(report['errors_truncated'])
+
+    def test_rows_span_several_batches(self):
+        lines = ''.join(f"2024-03-{day:02d},SHOP {day},-{day}\n" for day in range(1, 6))
+        importer, report = self.run_import("date,description,amount\n" + lines, batch_size=2)
+
+        self.assertEqual(report['imported'], 5)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 5)
+
+    def test_ofx_tags_cut_by_the_read_chunk(self):
+        statement = (
+            "OFXHEADER:100\n<OFX><BANKTRANLIST>"
+            "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301120000<TRNAMT>-12.50<NAME>UBER TRIP</STMTTRN>"
+            "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240302<TRNAMT>100.00<MEMO>REFUND</STMTTRN>"
+            "</BANKTRANLIST></OFX>"
+        )
+        with mock.patch('expenses.importers.OFX_CHUNK_SIZE', 7):
+            rows = list(iter_ofx_rows(io.StringIO(statement)))
+
+        self.assertEqual([row for _, row in rows], [
+            {'date': '20240301', 'description': 'UBER TRIP', 'amount': '-12.50',
+             'transaction_type': '', 'category': '', 'currency': ''},
+            {'date': '20240302', 'description': 'REFUND', 'amount': '100.00',
+             'transaction_type': '', 'category': '', 'currency': ''},
+        ])
+
+    def test_reuploaded_statement_skips_the_overlap_only(self):
+        statement = "date,description,amount\n" + "2024-03-01,COFFEE,-5\n" * 2
+        self.run_import(statement)
+        # Same day again plus one more coffee and a new day.
+        _, report = self.run_import(statement + "2024-03-01,COFFEE,-5\n2024-03-02,COFFEE,-5\n")
+
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 4)
+
+    def test_ofx_import(self):
+        _, report = self.run_import(
+            "<OFX><STMTTRN><DTPOSTED>20240301<TRNAMT>-12.50<NAME>UBER TRIP</STMTTRN></OFX>", file_format='ofx'
+        )
+        self.assertEqual(report['imported'], 1)
+
+
+class SyncTests(ExpensesTestCase):
+    url = '/api/v1/sync/'
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def settled(self, *rows):
+        """Move rows behind the settle window, as if written a while ago."""
+        moment = timezone.now() - timedelta(minutes=1)
+        for row in rows:
+            type(row).objects.filter(pk=row.pk).update(updated_at=moment)
+
+    def test_first_sync_sends_live_rows_only(self):
+        live = Category.objects.create(user=self.user, name='Coffee')
+        gone = Category.objects.create(user=self.user, name='Old', is_active=False)
+        self.settled(live, gone)
+
+        data = self.sync()
+
+        self.assertEqual([row['id'] for row in data['categories']], [live.pk])
+        self.assertTrue(data['categories'][0]['is_active'])
+        self.assertFalse(data['has_more'])
+
+    @mock.patch('expenses.sync.SYNC_SETTLE_SECONDS', 0)
+    def test_deletes_come_back_as_tombstones(self):
+        category = Category.objects.create(user=self.user, name='Coffee')
+        txn = self.make_transaction(category=category)
+        token = self.sync()['next_token']
+
+        self.assertEqual(self.client.delete(f'/api/v1/categories/{category.pk}/').status_code, 200)
+        data = self.sync(token)
+
+        # The category's transactions go with it.
+        for name, pk in (('categories', category.pk), ('transactions', txn.pk)):
+            self.assertEqual(len(data[name]), 1)
+            self.assertEqual({key: data[name][0][key] for key in ('id', 'is_active')}, {'id': pk, 'is_active': False})
+            self.assertNotIn('name', data[name][0])
+        self.assertEqual(self.sync(data['next_token'])['categories'], [])
+
+    def test_recent_writes_wait_for_the_settle_window(self):
+        token = self.sync()['next_token']
+        Category.objects.create(user=self.user, name='Coffee')
+
+        self.assertEqual(self.sync(token)['categories'], [])
+
+    def test_pages_continue_from_the_last_row(self):
+        rows = [Category.objects.create(user=self.user, name=f'C{index}') for index in range(3)]
+        self.settled(*rows)
+        # Same updated_at for all three: the id breaks the tie.
+        first = changes_since(self.user, None, page_size=2)
+        second = changes_since(self.user, first['next_token'], page_size=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual([row['id'] for row in first['categories'] + second['categories']], [row.pk for row in rows])
+
+    def test_only_the_users_rows(self):
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        self.settled(Category.objects.create(user=other, name='Theirs'))
+        self.assertEqual(self.sync()['categories'], [])
+
+    def test_bad_token_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'garbage'}).status_code, 400)
+
+
+class CategoryTombstoneTests(ExpensesTestCase):
+    url = '/api/v1/categories/'
+
+    def test_deleted_name_can_be_reused(self):
+        old = Category.objects.create(user=self.user, name='Coffee')
+        self.client.delete(f'{self.url}{old.pk}/')
+
+        response = self.client.post(self.url, {'name': 'Coffee'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        old.refresh_from_db()
+        self.assertEqual((old.name, old.is_active), (f'Coffee#{old.pk}', False))
+
+    def test_renamed_tombstone_fits_the_column(self):
+        name = 'x' * Category._meta.get_field('name').max_length
+        old = Category.objects.create(user=self.user, name=name)
+        self.client.delete(f'{self.url}{old.pk}/')
+
+        self.assertEqual(self.client.post(self.url, {'name': name}, format='json').status_code, 201)
+        old.refresh_from_db()
+        self.assertTrue(old.name.endswith(f'#{old.pk}'))
+        self.assertLessEqual(len(old.name), len(name))
+
+
+class PartitionTests(ExpensesTestCase):
+    def test_month_arithmetic(self):
+        december = datetime(2024, 12, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(add_months(december, 1), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(december, -12), datetime(2023, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name(december), f'{Transaction._meta.db_table}_p2024_12')
+
+    def test_given_created_at_is_kept(self):
+        moment = timezone.now() - timedelta(days=400)
+        self.assertEqual(self.make_transaction(created_at=moment).created_at, moment)
+        self.assertEqual(Transaction.objects.get().created_at, moment)
+
+    def test_import_writes_created_at_once(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        task = BackgroundTask.objects.create(user=self.user, task_id='import-once', task_type='import')
+        path = default_storage.save('imports/statement.csv', ContentFile(b"date,description,amount\n2021-06-15,SHOP,-5\n"))
+
+        with CaptureQueriesContext(connection) as queries:
+            TransactionImporter(task, path, 'csv').run()
+
+        # Moving a row between partitions is a delete plus an insert, so the
+        # statement date must go in with the INSERT, not a later UPDATE.
+        table = Transaction._meta.db_table
+        updates = [query['sql'] for query in queries if query['sql'].startswith(f'UPDATE "{table}"')]
+        self.assertEqual([sql for sql in updates if '"created_at"' in sql.split('WHERE')[0]], [])
+        self.assertEqual(timezone.localdate(Transaction.objects.get().created_at).isoformat(), '2021-06-15')
+
+    @skipIf(connection.vendor == 'postgresql', "partitioning is available")
+    def test_other_databases_are_refused(self):
+        with self.assertRaises(PartitioningError):
+            check_postgres()
+
+    @skipUnless(connection.vendor == 'postgresql', "partitioning needs PostgreSQL")
+    def test_date_bounded_queries_read_one_partition(self):
+        now = datetime(2024, 5, 20, tzinfo=dt_timezone.utc)
+        for months in (-2, -1, 0):
+            self.make_transaction(created_at=add_months(now, months))
+        names = convert_to_partitioned(months_ahead=1, now=now)
+        self.assertIn(partition_name(datetime(2024, 3, 1, tzinfo=dt_timezone.utc)), names)
+        self.assertEqual(ensure_partitions(months_ahead=1, now=now), [])
+
+        queryset = Transaction.objects.filter(
+            user=self.user, created_at__gte=datetime(2024, 4, 1, tzinfo=dt_timezone.utc),
+            created_at__lt=datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        )
+        plan = queryset.explain()
+
+        self.assertEqual(queryset.count(), 1)
+        self.assertIn(partition_name(datetime(2024, 4, 1, tzinfo=dt_timezone.utc)), plan)
+        for month in (3, 5):
+            self.assertNotIn(partition_name(datetime(2024, month, 1, tzinfo=dt_timezone.utc)), plan)
+
+
+class TransactionSearchTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/search/'
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def ids(self, **params):
+        return [row['id'] for row in self.search(**params)['results']]
+
+    def test_every_term_must_match_as_a_substring(self):
+        hit = self.make_transaction(description='STARBUCKS COFFEE MG ROAD')
+        self.make_transaction(description='STARBUCKS')
+        self.make_transaction(description='BLUE TOKAI COFFEE')
+
+        self.assertEqual(self.ids(q='star coff'), [hit.pk])
+
+    @skipIf(connection.vendor == 'postgresql', "PostgreSQL ranks by ts_rank and similarity")
+    def test_rows_starting_with_the_first_term_rank_first(self):
+        now = timezone.now()
+        prefix = self.make_transaction(description='UBER TRIP', created_at=now - timedelta(days=2))
+        inside = self.make_transaction(description='VISA UBER', created_at=now)
+
+        self.assertEqual(self.ids(q='uber'), [prefix.pk, inside.pk])
+
+    def test_filters_narrow_the_search(self):
+        category = Category.objects.create(user=self.user, name='Coffee')
+        cheap = self.make_transaction(amount='5.00', description='CAFE', category=category)
+        self.make_transaction(amount='50.00', description='CAFE', category=category)
+        self.make_transaction(amount='5.00', description='CAFE')
+
+        self.assertEqual(self.ids(q='cafe', category=category.pk, max_amount='5'), [cheap.pk])
+
+    def test_amount_bounds_are_inclusive(self):
+        rows = [self.make_transaction(amount=amount, description='SHOP') for amount in ('9.99', '10.00', '20.00', '20.01')]
+
+        self.assertEqual(sorted(self.ids(q='shop', min_amount='10', max_amount='20.00')), [rows[1].pk, rows[2].pk])
+
+    def test_other_users_and_deleted_rows_are_not_found(self):
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        self.make_transaction(description='COFFEE', user=other)
+        self.make_transaction(description='COFFEE', is_active=False)
+
+        self.assertEqual(self.ids(q='coffee'), [])
+
+    def test_pages(self):
+        for _ in range(3):
+            self.make_transaction(description='SHOP')
+
+        first = self.search(q='shop', page_size=2)
+        second = self.search(q='shop', page_size=2, page=2)
+
+        self.assertEqual((len(first['results']), first['next_page']), (2, 2))
+        self.assertEqual((len(second['results']), second['next_page']), (1, None))
+
+    def test_bad_queries_are_rejected(self):
+        for params in ({'q': ''}, {'q': '!!'}, {'q': 'shop', 'page': '99'}, {'q': 'shop', 'min_amount': 'NaN'},
+                       {'q': 'shop', 'max_amount': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+@override_settings(EXCHANGE_RATE_BASE='EUR')
+class CurrencyTests(ExpensesTestCase):
+    RATES = [
+        ('USD', date(2024, 1, 1), '1.10'), ('USD', date(2024, 2, 1), '1.08'),
+        ('INR', date(2024, 1, 1), '90.00'), ('GBP', date(2024, 1, 1), '0.5'), ('IDR', date(2024, 1, 1), '17000'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        ExchangeRate.objects.bulk_create(
+            ExchangeRate(currency=currency, date=day, rate=Decimal(rate)) for currency, day, rate in self.RATES
+        )
+        clear_rate_table()
+        self.addCleanup(clear_rate_table)
+
+    def convert(self, amounts, from_currency, to_currency, day=date(2024, 1, 15)):
+        return convert_amounts([Decimal(amount) for amount in amounts], [from_currency] * len(amounts),
+                               [day] * len(amounts), to_currency)
+
+    def test_halves_round_away_from_zero(self):
+        self.assertEqual(
+            self.convert(['0.01', '-0.01', '0.03', '-0.03', '0.02'], 'EUR', 'GBP'),
+            [Decimal('0.01'), Decimal('-0.01'), Decimal('0.02'), Decimal('-0.02'), Decimal('0.01')]
+        )
+
+    def test_cross_rates_through_the_base(self):
+        # 90 / 1.10 = 81.818182 (to eight digits).
+        self.assertEqual(self.convert(['1.00', '100.00'], 'USD', 'INR'), [Decimal('81.82'), Decimal('8181.82')])
+        self.assertEqual(self.convert(['1.23'], 'GBP', 'EUR'), [Decimal('2.46')])
+
+    def test_a_day_uses_the_latest_rate_on_or_before_it(self):
+        self.assertEqual(self.convert(['1.00'], 'USD', 'INR', date(2024, 2, 15)), [Decimal('83.33')])
+        # Before the first rate: the earliest one.
+        self.assertEqual(self.convert(['1.00'], 'USD', 'INR', date(2023, 6, 1)), [Decimal('81.82')])
+
+    def test_each_row_has_its_own_target(self):
+        result = convert_amounts(
+            [Decimal('1.00'), Decimal('1.00')], ['USD', 'USD'], [date(2024, 1, 15)] * 2, ['INR', 'USD']
+        )
+        self.assertEqual(result, [Decimal('81.82'), Decimal('1.00')])
+
+    def test_same_currency_is_not_touched(self):
+        amounts = [Decimal('1.005'), Decimal('2')]
+        self.assertEqual(convert_amounts(amounts, ['XYZ', 'XYZ'], [date(2024, 1, 1)] * 2, 'XYZ'), amounts)
+
+    def test_totals_too_big_for_int64_stay_exact(self):
+        amount = '92233720368547758.07'
+        with localcontext() as context:
+            context.prec = 50
+            # 90 / 17000 to eight digits.
+            expected = (Decimal(amount) * Decimal('0.0052941176')).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        self.assertEqual(self.convert([amount], 'IDR', 'INR'), [expected])
+
+    def test_unknown_currency(self):
+        with self.assertRaises(MissingRate):
+            self.convert(['1.00'], 'XYZ', 'INR')
+
+    def test_budget_follows_a_currency_change(self):
+        category = Category.objects.create(user=self.user, name='Food')
+        budget = Budget.objects.create(user=self.user, category=category, period_start_date=date(2024, 1, 1),
+                                       period_end_date=date(2024, 1, 31), limit_amount=Decimal('100000'))
+        moment = datetime(2024, 1, 15, 12, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_transaction(amount='10.00', currency='USD', category=category, created_at=moment)
+            self.make_transaction(amount='90.00', currency='INR', category=category, created_at=moment)
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent_amount, Decimal('908.18'))
+
+        with mock.patch.object(recalculate_user_budgets_task, 'delay', side_effect=recalculate_user_budgets_task):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.currency_preference = 'USD'
+                self.user.save()
+
+        budget.refresh_from_db()
+        # 90 INR at 1.10 / 90 = 1.10 USD.
+        self.assertEqual(budget.spent_amount, Decimal('11.10'))
+
+
+class RecurringDetectionTests(ExpensesTestCase):
+    KEY = ('expense', 'netflix', 'INR', 0)
+
+    def detect(self, days, today=date(2024, 5, 10)):
+        return detect({self.KEY: [(day, Decimal('649'), None) for day in days]}, today).get(self.KEY)
+
+    def test_monthly(self):
+        found = self.detect([date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+
+        self.assertEqual((found['period'], found['occurrences']), ('monthly', 4))
+        self.assertEqual((found['first_date'], found['next_date']), (date(2024, 1, 31), date(2024, 5, 30)))
+        self.assertTrue(found['is_active'])
+
+    def test_weekly_needs_three_gaps(self):
+        days = [date(2024, 5, 1) + timedelta(weeks=week) for week in range(4)]
+        self.assertEqual(self.detect(days, today=date(2024, 5, 25))['period'], 'weekly')
+        self.assertIsNone(self.detect(days[:3], today=date(2024, 5, 25)))
+
+    def test_irregular_and_same_day_charges(self):
+        self.assertIsNone(self.detect([date(2024, 1, 1), date(2024, 1, 20), date(2024, 3, 29), date(2024, 4, 3)]))
+        # Two charges on one day are one occurrence.
+        found = self.detect([date(2024, 2, 5), date(2024, 3, 5), date(2024, 3, 5), date(2024, 4, 5)])
+        self.assertEqual(found['occurrences'], 3)
+
+    def test_lapsed_series_is_inactive(self):
+        found = self.detect([date(2023, 1, 5), date(2023, 2, 5), date(2023, 3, 5)])
+        self.assertFalse(found['is_active'])
+
+    def test_month_ends_are_clamped(self):
+        self.assertEqual(next_occurrence(date(2024, 1, 31), 'monthly'), date(2024, 2, 29))
+        self.assertEqual(next_occurrence(date(2024, 2, 29), 'yearly'), date(2025, 2, 28))
+
+    def test_grouping(self):
+        self.assertEqual(group_key('EXPENSE', 'NETFLIX.COM 0423 #12', '', 'INR', Decimal('649')),
+                         group_key('expense', 'netflix com', '', 'INR', Decimal('640')))
+        self.assertNotEqual(group_key('expense', 'NETFLIX', '', 'INR', Decimal('649')),
+                            group_key('expense', 'NETFLIX', '', 'INR', Decimal('799')))
+        # The canonical merchant wins over the description.
+        self.assertEqual(group_key('expense', 'POS 1234', 'Netflix', 'INR', Decimal('649'))[1], 'netflix')
+        self.assertIsNone(group_key('expense', '1234', '', 'INR', Decimal('649')))
+
+
+class RecurringScanTests(ExpensesTestCase):
+    def monthly(self, description, count=3):
+        now = timezone.now()
+        return [
+            self.make_transaction(amount='649.00', description=description, created_at=now - timedelta(days=30 * months))
+            for months in range(count)
+        ]
+
+    def series(self):
+        return {series.description_key: series.is_active for series in RecurringSeries.objects.filter(user=self.user)}
+
+    def test_first_scan_finds_series_and_later_ones_only_changes(self):
+        self.monthly('NETFLIX.COM')
+        # One gap is not enough to call it monthly.
+        self.monthly('SPOTIFY', count=2)
+        self.make_transaction(description='ONE OFF')
+
+        scan_user(self.user.id)
+
+        # Grouped by the canonical merchant (expenses.merchants).
+        self.assertEqual(self.series(), {'netflix': True})
+        self.assertIsNotNone(RecurringScan.objects.get(user=self.user).scanned_until)
+        # Nothing changed since (beyond the re-read overlap): no group is looked at.
+        Transaction.objects.filter(user=self.user).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(scan_user(self.user.id), 0)
+
+    def test_edit_that_moves_a_row_out_rescans_its_old_group(self):
+        rows = self.monthly('NETFLIX.COM')
+        scan_user(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/v1/expenses_trans/{rows[1].pk}/', {'raw_description': 'HOTSTAR'},
+                                       format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RecurringGroupChange.objects.filter(user=self.user).count(), 1)
+
+        scan_user(self.user.id, now=timezone.now() + timedelta(hours=1))
+
+        # Two charges sixty days apart no longer make a monthly series.
+        self.assertEqual(self.series(), {'netflix': False})
+        self.assertFalse(RecurringGroupChange.objects.exists())
+
+    def test_bulk_edit_is_recorded_too(self):
+        rows = self.monthly('NETFLIX.COM')
+        scan_user(self.user.id)
+
+        response = self.client.put('/api/v1/expenses_trans/bulk/', {'items': [{'id': rows[0].pk, 'amount': '1.00'}]},
+                                   format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(RecurringGroupChange.objects.values_list('description_key', 'amount_band')),
+            [('netflix', group_key('expense', 'NETFLIX.COM', '', 'INR', Decimal('649'))[3])]
+        )
+
+    def test_unchanged_group_is_not_queued(self):
+        rows = self.monthly('NETFLIX.COM')
+        self.client.put(f'/api/v1/expenses_trans/{rows[0].pk}/', {'amount': '650.00'}, format='json')
+        self.assertFalse(RecurringGroupChange.objects.exists())
+
+
+class MerchantTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        # The merchant table is cached per process; start from this test's rows.
+        invalidate_merchants()
+        self.addCleanup(invalidate_merchants)
+
+    def add_merchant(self, name, aliases=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Merchant.objects.create(name=name, aliases=aliases)
+
+    def test_noise_is_stripped(self):
+        cases = {
+            'POS 1234 AMZN MKTP IN*2X3': 'amzn mktp',
+            'SQ *BLUE TOKAI COFFEE MUMBAI': 'blue tokai coffee',
+            'PAYPAL *NETFLIX.COM 0423': 'netflix',
+            'ZOMATO PVT LTD 12/03/2024': 'zomato',
+            'STARBUCKS #887 BANDRA 12 MAR 2024': 'starbucks bandra',
+            'www.flipkart.com REF AB12CD': 'flipkart',
+            'Marks & Spencer': 'marks & spencer',
+            '': '',
+        }
+        for description, expected in cases.items():
+            with self.subTest(description=description):
+                self.assertEqual(normalize_merchant(description), expected)
+
+    def test_aliases_map_to_one_name(self):
+        self.add_merchant('Amazon', 'AMZN MKTP, AMAZON PAY')
+
+        self.assertEqual(
+            canonical_merchants(['POS 1234 AMZN MKTP IN*2X3', 'AMAZON.IN', 'AMAZON PAY INDIA', 'xyz traders']),
+            ['Amazon', 'Amazon', 'Amazon', 'Xyz Traders']
+        )
+
+    def test_longest_leading_alias_wins(self):
+        self.add_merchant('Amazon')
+        self.add_merchant('Prime Video', 'AMAZON PRIME')
+
+        self.assertEqual(canonical_merchants(['AMAZON PRIME VIDEO', 'AMAZON RETAIL']), ['Prime Video', 'Amazon'])
+
+    def test_merchant_changes_apply_to_cached_descriptions(self):
+        self.assertEqual(canonical_merchants(['AMZN MKTP']), ['Amzn Mktp'])
+        self.add_merchant('Amazon', 'AMZN MKTP')
+        self.assertEqual(canonical_merchants(['AMZN MKTP']), ['Amazon'])
+
+    def test_transactions_store_their_merchant(self):
+        txn = self.make_transaction(description='SQ *BLUE TOKAI COFFEE MUMBAI')
+        self.assertEqual(txn.merchant, 'Blue Tokai Coffee')
+
+        txn.raw_description = 'UPI/ZOMATO PVT LTD'
+        txn.save()
+        self.assertEqual(Transaction.objects.get(pk=txn.pk).merchant, 'Zomato')
+
+    def test_backfill(self):
+        rows = [self.make_transaction(description=description) for description in ('AMZN MKTP 12', 'ZOMATO')]
+        Transaction.objects.filter(pk=rows[0].pk).update(merchant='')
+
+        self.assertEqual(backfill_merchants(chunk_size=1), 1)
+        self.add_merchant('Amazon', 'AMZN MKTP')
+        self.assertEqual(backfill_merchants(recompute=True, chunk_size=1), 1)
+
+        self.assertEqual(
+            list(Transaction.objects.order_by('id').values_list('merchant', flat=True)), ['Amazon', 'Zomato']
+        )
+
+
+class DuplicateTransactionTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/'
+    body = {'amount': '250.00', 'raw_description': 'Starbucks  Coffee', 'transaction_type': 'expense'}
+
+    def post(self, body=None, key=None, **params):
+        url = f"{self.url}?{'&'.join(f'{name}={value}' for name, value in params.items())}" if params else self.url
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(url, body or self.body, format='json', headers=headers)
+
+    def test_same_row_today_is_saved_with_a_warning(self):
+        first = self.post().data['data']
+        # Case and spacing do not make it a different row.
+        response = self.post({**self.body, 'raw_description': 'STARBUCKS COFFEE'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['possible_duplicate_of'], first['id'])
+        self.assertNotIn('possible_duplicate_of', first)
+
+    def test_other_amount_or_day_is_not_a_duplicate(self):
+        self.make_transaction(amount='250.00', description='Starbucks Coffee',
+                              created_at=timezone.now() - timedelta(days=1))
+        self.post({**self.body, 'amount': '251.00'})
+
+        self.assertNotIn('possible_duplicate_of', self.post().data['data'])
+
+    def test_new_key_for_a_duplicate_is_refused(self):
+        first = self.post(key='first').data['data']
+
+        response = self.post(key='second')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['error']['duplicate_of'], first['id'])
+        self.assertEqual(self.post(key='third', allow_duplicate='true').status_code, 201)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_retry_with_the_same_key_is_replayed(self):
+        first = self.post(key='retry')
+
+        again = self.post(key='retry')
+
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+
+class BudgetEngineTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.rent = Category.objects.create(user=self.user, name='Rent')
+        today = timezone.localdate()
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.food, period_start_date=today - timedelta(days=10),
+            period_end_date=today + timedelta(days=10), limit_amount=Decimal('100.00')
+        )
+
+    def state(self):
+        budget = Budget.objects.get(pk=self.budget.pk)
+        return budget.spent_amount, budget.status
+
+    def test_status_thresholds(self):
+        limit = Decimal('100')
+        self.assertEqual(
+            [budget_status(Decimal(spent), limit) for spent in ('79.99', '80', '100', '100.01')],
+            ['ON_TRACK', 'AT_RISK', 'AT_RISK', 'EXCEEDED']
+        )
+
+    def test_writes_move_spend_and_status(self):
+        txn = self.make_transaction(amount='85.00', category=self.food)
+        self.assertEqual(self.state(), (Decimal('85.00'), 'AT_RISK'))
+
+        txn.amount = Decimal('120.00')
+        txn.save()
+        self.assertEqual(self.state(), (Decimal('120.00'), 'EXCEEDED'))
+
+        txn.category = self.rent
+        txn.save()
+        self.assertEqual(self.state(), (Decimal('0.00'), 'ON_TRACK'))
+
+    def test_only_expenses_inside_the_period_count(self):
+        self.make_transaction(amount='30.00', category=self.food)
+        self.make_transaction(amount='30.00', category=self.food, created_at=timezone.now() - timedelta(days=30))
+        self.make_transaction(amount='30.00', category=self.food, transaction_type='income')
+        self.make_transaction(amount='30.00', category=self.food, is_active=False)
+
+        self.assertEqual(self.state(), (Decimal('30.00'), 'ON_TRACK'))
+
+    def test_detail(self):
+        response = self.client.get(f'/api/v1/budgets/{self.budget.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['data']['id'], response.data['data']['remaining_amount']),
+                         (self.budget.pk, '100.00'))
+        other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        self.budget.user = other
+        self.budget.save()
+        self.assertEqual(self.client.get(f'/api/v1/budgets/{self.budget.pk}/').status_code, 404)
+
+    def test_bulk_writes_match_a_full_recalculation(self):
+        items = [{'amount': '20.00', 'raw_description': f'LUNCH {index}', 'category': self.food.pk} for index in range(4)]
+        created = self.client.post('/api/v1/expenses_trans/bulk/', {'items': items}, format='json').data['data']
+        ids = [row['id'] for row in created['results']]
+        self.client.delete('/api/v1/expenses_trans/bulk/', {'ids': ids[:1]}, format='json')
+        incremental = self.state()
+
+        self.assertEqual(incremental, (Decimal('60.00'), 'ON_TRACK'))
+        self.assertEqual((recalculate_budget(self.budget).spent_amount, self.budget.status), incremental)
+
+
+class EnrichmentTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/'
+
+    def setUp(self):
+        super().setUp()
+        self.coffee = Category.objects.create(user=self.user, name='Coffee', keywords='starbucks')
+
+    def post(self, description='STARBUCKS MG ROAD', amount='250.00'):
+        response = self.client.post(
+            self.url, {'amount': amount, 'raw_description': description, 'transaction_type': 'expense'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return Transaction.objects.get(pk=response.data['data']['id'])
+
+    def test_sync_setting_enriches_inside_the_request(self):
+        txn = self.post()
+        self.assertEqual((txn.category_id, txn.enrichment_pending), (self.coffee.pk, False))
+
+    @override_settings(TRANSACTION_ENRICHMENT_SYNC=False)
+    def test_request_only_queues_the_row(self):
+        with mock.patch('expenses.tasks.enrich_pending_transactions_task.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            first = self.post()
+            second = self.post('STARBUCKS AIRPORT')
+
+        self.assertEqual((first.category_id, first.enrichment_pending), (None, True))
+        self.assertTrue(second.enrichment_pending)
+        # Both creates fall in one debounce window: one drain task.
+        apply_async.assert_called_once_with(countdown=ENRICHMENT_DEBOUNCE_SECONDS)
+
+        self.assertEqual(enrich_pending_transactions_task(), 2)
+        self.assertEqual(
+            list(Transaction.objects.values_list('category_id', 'enrichment_pending')), [(self.coffee.pk, False)] * 2
+        )
+
+    def test_debounce_window_expiring_schedules_again(self):
+        with mock.patch('expenses.tasks.enrich_pending_transactions_task.apply_async') as apply_async:
+            TransactionService.schedule_enrichment()
+            TransactionService.schedule_enrichment()
+            cache.delete(ENRICHMENT_SCHEDULED_KEY)
+            TransactionService.schedule_enrichment()
+
+        self.assertEqual(apply_async.call_count, 2)
+
+    def test_batch_is_categorized_scored_and_saved_in_one_bulk_update(self):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, amount=Decimal(amount), raw_description=f'STARBUCKS {i}',
+                        transaction_type='expense', currency='INR', enrichment_pending=True,
+                        created_at=timezone.now() + timedelta(seconds=i))
+            for i, amount in enumerate(['250'] * MIN_HISTORY + ['90000'])
+        ])
+
+        with mock.patch.object(Transaction.objects, 'bulk_update', wraps=Transaction.objects.bulk_update) as update:
+            self.assertEqual(TransactionService.enrich(), MIN_HISTORY + 1)
+
+        update.assert_called_once()
+        self.assertEqual(update.call_args.args[1], ['category', 'is_anomaly', 'enrichment_pending', 'updated_at'])
+        rows = Transaction.objects.order_by('created_at').values_list('category_id', 'is_anomaly', 'enrichment_pending')
+        self.assertEqual(list(rows), [(self.coffee.pk, False, False)] * MIN_HISTORY + [(self.coffee.pk, True, False)])
+        self.assertEqual(TransactionService.enrich(), 0)
+
+
+class BulkTransactionTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(email='other@example.com', username='other@example.com', password='x')
+        self.food = Category.objects.create(user=self.user, name='Food')
+
+    def send(self, method, payload, status_code=200):
+        response = getattr(self.client, method)(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status_code)
+        body = response.data['data'] if status_code == 200 else response.data['error']
+        return [(result['status'], result.get('errors')) for result in body['results']]
+
+    def test_create_keeps_the_valid_items(self):
+        theirs = Category.objects.create(user=self.other, name='Food')
+
+        results = self.send('post', {'items': [
+            {'amount': '10.00', 'raw_description': 'LUNCH', 'category': self.food.pk},
+            {'raw_description': 'NO AMOUNT'},
+            {'amount': '5.00', 'raw_description': 'SNACK', 'category': theirs.pk},
+        ]})
+
+        self.assertEqual([status for status, _ in results], ['created', 'error', 'error'])
+        self.assertEqual(results[2][1], {'category': ['Category not found.']})
+        self.assertEqual(list(Transaction.objects.values_list('raw_description', flat=True)), ['LUNCH'])
+
+    def test_batch_fails_only_when_every_item_does(self):
+        results = self.send('post', {'items': [{'raw_description': 'NO AMOUNT'}]}, status_code=400)
+        self.assertEqual([status for status, _ in results], ['error'])
+
+    def test_update_checks_ownership_and_repeated_ids(self):
+        mine = self.make_transaction('10.00')
+        theirs = self.make_transaction('20.00', user=self.other)
+
+        results = self.send('put', {'items': [
+            {'id': mine.pk, 'amount': '11.00'},
+            {'id': theirs.pk, 'amount': '1.00'},
+            {'id': mine.pk, 'amount': '99.00'},
+        ]})
+
+        self.assertEqual(results, [
+            ('updated', None), ('error', {'id': ['Transaction not found.']}),
+            ('error', {'id': ['Duplicate id in this batch.']}),
+        ])
+        self.assertEqual(Transaction.objects.get(pk=mine.pk).amount, Decimal('11.00'))
+        self.assertEqual(Transaction.objects.get(pk=theirs.pk).amount, Decimal('20.00'))
+
+    def test_delete_reports_each_id_once(self):
+        mine = self.make_transaction()
+        theirs = self.make_transaction(user=self.other)
+
+        results = self.send('delete', {'ids': [mine.pk, theirs.pk, mine.pk, 0]})
+
+        self.assertEqual(results, [
+            ('deleted', None), ('error', {'id': ['Transaction not found.']}),
+            ('error', {'id': ['Duplicate id in this batch.']}), ('error', {'id': ['Transaction not found.']}),
+        ])
+        self.assertEqual(
+            dict(Transaction.objects.values_list('pk', 'is_active')), {mine.pk: False, theirs.pk: True}
+        )
+
+    def test_category_delete_reports_each_id_once(self):
+        response = self.client.delete('/api/v1/categories/bulk/', {'ids': [self.food.pk, self.food.pk]}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['data']['results']], ['deleted', 'error']
+        )
+
+
+class TransactionExportTests(ExpensesTestCase):
+    url = '/api/v1/expenses_trans/export/'
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        food = Category.objects.create(user=self.user, name='Food')
+        self.lunch = self.make_transaction('12.50', 'LUNCH', category=food, currency='USD',
+                                           created_at=datetime(2024, 3, 2, 12, tzinfo=dt_timezone.utc))
+        self.rent = self.make_transaction('900.00', 'RENT', currency='INR',
+                                          created_at=datetime(2024, 3, 1, 9, tzinfo=dt_timezone.utc))
+        self.make_transaction('1.00', 'NOT MINE', user=User.objects.create_user(
+            email='other@example.com', username='other@example.com', password='x'))
+
+    def export(self, file_format, **params):
+        """Queue an export through the API, run the task inline and return the finished BackgroundTask."""
+        def run(args, task_id):
+            export_transactions_task(*args)
+
+        url = f"{self.url}?{'&'.join(f'{name}={value}' for name, value in params.items())}" if params else self.url
+        with mock.patch('expenses.views.export_transactions_task.apply_async', side_effect=run):
+            response = self.client.post(url, {'format': file_format}, format='json')
+        self.assertEqual(response.status_code, 202)
+        task = BackgroundTask.objects.get(task_id=response.data['data']['task_id'])
+        self.assertEqual(task.status, 'SUCCESS')
+        self.assertTrue(task.result_file.name.endswith(f'.{file_format}'))
+        return task
+
+    def test_csv_round_trip(self):
+        task = self.export('csv')
+
+        with task.result_file.open('rb') as handle:
+            rows = list(csv.DictReader(io.TextIOWrapper(handle, encoding='utf-8', newline='')))
+
+        self.assertEqual(list(rows[0]), list(EXPORT_COLUMNS))
+        self.assertEqual(
+            [(row['id'], row['amount'], row['currency'], row['category_name'], row['created_at']) for row in rows],
+            [(str(self.lunch.pk), '12.50', 'USD', 'Food', '2024-03-02T12:00:00+00:00'),
+             (str(self.rent.pk), '900.00', 'INR', '', '2024-03-01T09:00:00+00:00')]
+        )
+
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+
+        task = self.export('parquet', category=self.lunch.category_id)
+
+        with task.result_file.open('rb') as handle:
+            table = pq.read_table(handle)
+
+        self.assertEqual(table.column_names, list(EXPORT_COLUMNS))
+        self.assertEqual(table.to_pylist(), [{
+            'id': self.lunch.pk, 'created_at': self.lunch.created_at, 'amount': Decimal('12.50'), 'currency': 'USD',
+            'transaction_type': 'expense', 'category_name': 'Food', 'raw_description': 'LUNCH',
+            'merchant': self.lunch.merchant, 'is_anomaly': False,
+        }])
+
+    def test_writer_failure_marks_the_task_failed(self):
+        task = BackgroundTask.objects.create(user=self.user, task_id='export-broken', task_type='export')
+
+        with mock.patch('expenses.exporters.write_csv', side_effect=OSError("disk full")), \
+                self.assertLogs('expenses.tasks', 'ERROR'), self.assertRaises(OSError):
+            export_transactions_task(task.pk)
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.result_file.name), ('FAILED', ''))
+
+
+@mock.patch('expenses.async_views.TASK_WAIT_INTERVAL', 0.01)
+class BackgroundTaskWaitTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        access = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {access}'}
+        self.task = BackgroundTask.objects.create(user=self.user, task_id='wait-1', task_type='export')
+
+    async def wait(self, **params):
+        """GET the long-poll; returns (status code, body, seconds taken)."""
+        started = time.monotonic()
+        url = f'/api/v1/async/tasks/{self.task.pk}/wait/'
+        response = await self.async_client.get(url, params, headers=self.headers)
+        return response.status_code, json.loads(response.content), time.monotonic() - started
+
+    async def test_stale_status_returns_at_once(self):
+        await BackgroundTask.objects.filter(pk=self.task.pk).aupdate(status='SUCCESS')
+
+        code, body, took = await self.wait(status='PENDING', timeout=5)
+
+        self.assertEqual((code, body['data']['status']), (200, 'SUCCESS'))
+        self.assertLess(took, 1)
+
+    async def test_unchanged_status_times_out(self):
+        code, body, took = await self.wait(status='PENDING', timeout=0.2)
+
+        self.assertEqual((code, body['data']['status']), (200, 'PENDING'))
+        self.assertGreaterEqual(took, 0.2)
+
+    async def test_change_during_the_wait_ends_it(self):
+        waiting = asyncio.ensure_future(self.wait(status='PENDING', timeout=5))
+        await asyncio.sleep(0.05)
+        # What the BackgroundTask post_save signal does once the worker commits.
+        await BackgroundTask.objects.filter(pk=self.task.pk).aupdate(status='FAILED')
+        bump_generation(TASKS_NAMESPACE, self.user.id)
+
+        code, body, took = await waiting
+
+        self.assertEqual(body['data']['status'], 'FAILED')
+        self.assertLess(took, 1)
+
+    async def test_bad_requests(self):
+        other = await User.objects.acreate(email='other@example.com', username='other@example.com')
+        theirs = await BackgroundTask.objects.acreate(user=other, task_id='wait-2', task_type='export')
+
+        response = await self.async_client.get(f'/api/v1/async/tasks/{theirs.pk}/wait/', {'timeout': 0},
+                                               headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual((await self.wait(timeout='nan'))[0], 400)
+        self.assertEqual((await self.async_client.get(f'/api/v1/async/tasks/{self.task.pk}/wait/')).status_code, 401)
+
+
+class FakeRedis:
+    """Just the publish/pattern-subscribe surface TaskEventHub and publish_task_status use."""
+
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.closed = False
+
+    def publish(self, channel, data):
+        self.messages.put_nowait({'channel': channel.encode(), 'data': data})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self
+
+    async def psubscribe(self, pattern):
+        self.pattern = pattern
+
+    async def listen(self):
+        while (message := await self.messages.get()) is not None:
+            yield message
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TaskEventHubTests(ExpensesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        for target, value in (('expenses.task_status.async_redis', lambda: self.redis),
+                              ('expenses.task_status.uses_django_redis', lambda: True),
+                              ('django_redis.get_redis_connection', lambda alias: self.redis)):
+            self.enterContext(mock.patch(target, value))
+        self.task = BackgroundTask.objects.create(user=self.user, task_id='events-1', task_type='export')
+
+    async def test_published_status_reaches_the_owners_streams_only(self):
+        hub = TaskEventHub()
+        async with hub.subscribe(self.user.id) as mine, hub.subscribe(self.user.id + 1) as theirs:
+            self.assertEqual(self.redis.pattern, 'tasks:user:*')
+            payload = publish_task_status(self.task, 40)
+
+            data = await asyncio.wait_for(mine.get(), 1)
+
+        self.assertEqual(json.loads(data), payload)
+        self.assertEqual((payload['task_id'], payload['progress']), ('events-1', 40))
+        self.assertTrue(theirs.empty())
+        self.assertEqual(await cache.aget(task_status_key(self.user.id, self.task.pk)), payload)
+        self.assertEqual(hub.listeners, {})
+        self.redis.messages.put_nowait(None)
+        await hub.reader
+
+    async def test_lost_connection_ends_every_stream(self):
+        hub = TaskEventHub()
+        async with hub.subscribe(self.user.id) as queue:
+            self.redis.messages.put_nowait(None)
+
+            self.assertIsNone(await asyncio.wait_for(queue.get(), 1))
+
+        self.assertTrue(self.redis.closed)
+        self.assertFalse(hub.ready.is_set())
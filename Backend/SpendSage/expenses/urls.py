@@ -1,12 +1,33 @@
 from django.urls import path
-from .views import CategoryAPIView, TransactionAPIView, BudgetAPIView, BackgroundTaskAPIView
+from .views import (
+    CategoryAPIView,
+    CategoryBulkAPIView,
+    TransactionAPIView,
+    TransactionBulkAPIView,
+    TransactionSearchAPIView,
+    TransactionImportAPIView,
+    TransactionExportAPIView,
+    BudgetAPIView,
+    BackgroundTaskAPIView,
+    SyncAPIView,
+    RecurringSeriesAPIView,
+)
 
 urlpatterns = [
     path('categories/', CategoryAPIView.as_view(), name='categories'),
     path('categories/<int:pk>/', CategoryAPIView.as_view()),
+    path('categories/bulk/', CategoryBulkAPIView.as_view(), name='categories_bulk'),
     path('expenses_trans/', TransactionAPIView.as_view(), name='expenses_trans'),
     path('expenses_trans/<int:pk>/', TransactionAPIView.as_view(), name='expenses_trans'),
+    path('expenses_trans/bulk/', TransactionBulkAPIView.as_view(), name='expenses_trans_bulk'),
+    path('expenses_trans/import/', TransactionImportAPIView.as_view(), name='expenses_trans_import'),
+    path('expenses_trans/search/', TransactionSearchAPIView.as_view(), name='expenses_trans_search'),
+    path('expenses_trans/export/', TransactionExportAPIView.as_view(), name='expenses_trans_export'),
     path('expenses/', TransactionAPIView.as_view(), name='expenses'),
     path('budgets/', BudgetAPIView.as_view(), name='budgets'),
+    path('budgets/<int:pk>/', BudgetAPIView.as_view(), name='budget'),
     path('tasks/', BackgroundTaskAPIView.as_view(), name='tasks'),
+    path('tasks/<int:pk>/', BackgroundTaskAPIView.as_view(), name='task'),
+    path('sync/', SyncAPIView.as_view(), name='sync'),
+    path('recurring/', RecurringSeriesAPIView.as_view(), name='recurring'),
 ]
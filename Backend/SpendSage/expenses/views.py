@@ -1,15 +1,37 @@
+import os
+import uuid
 
-from .models import Transaction, Category, Budget, BackgroundTask
+from django.core.files.storage import default_storage
+from .models import Transaction, Category, Budget, BackgroundTask, RecurringSeries
 from .serializers import (
     CategorySerializer, 
     TransactionSerializer, 
     BudgetSerializer, 
-    BackgroundTaskSerializer
+    BackgroundTaskSerializer,
+    RecurringSeriesSerializer
 )
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from common.utils import api_success_response, api_error_response
+from common.idempotency import idempotent, IDEMPOTENCY_HEADER
+from common.renderers import ORJSONRendererMixin
+from common.cache import (
+    cached_list_response, CATEGORIES_NAMESPACE, BUDGETS_NAMESPACE, TASKS_NAMESPACE
+)
+from .filters import filter_transactions, InvalidFilter
+from .pagination import TransactionCursorPagination, RankedPagination, InvalidCursor
+from .search import search_transactions, InvalidSearch
+from .duplicates import DuplicateTransaction
+from .exporters import EXPORT_FORMATS
+from .tasks import import_transactions_task, export_transactions_task
+from .service import TransactionService, CategoryService, MAX_BULK_ITEMS
+from .sync import changes_since, InvalidSyncToken
+from .readers import TRANSACTION_READER, BUDGET_READER
+from .task_status import get_task_status
+
+IMPORT_FORMATS = ('csv', 'ofx')
+
 class CategoryAPIView(APIView):
     """
     Single endpoint for Category operations (list, create, update, delete).
@@ -20,7 +42,7 @@ class CategoryAPIView(APIView):
     def get(self, request, pk=None):
         """Retrieve all categories or a single category for the logged-in user."""
         if pk:
-            category = Category.objects.filter(user=request.user, pk=pk).first()
+            category = Category.objects.filter(user=request.user, is_active=True, pk=pk).first()
             if category:
                 serializer = CategorySerializer(category)
                 
@@ -34,11 +56,12 @@ class CategoryAPIView(APIView):
                         status_code=status.HTTP_404_NOT_FOUND
                     )
         
-        categories = Category.objects.filter(user=request.user)
-        serializer = CategorySerializer(categories, many=True)
-        return api_success_response(
-            message="Categories retrieved successfully",
-            data=serializer.data
+        def build_data():
+            categories = Category.objects.filter(user=request.user, is_active=True)
+            return CategorySerializer(categories, many=True).data
+
+        return cached_list_response(
+            request, CATEGORIES_NAMESPACE, "Categories retrieved successfully", build_data
         )
 
     def post(self, request):
@@ -59,7 +82,7 @@ class CategoryAPIView(APIView):
 
     def put(self, request, pk):
         """Update a specific category for the logged-in user."""
-        category = Category.objects.filter(user=request.user, id=pk).first() 
+        category = Category.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not category:
             return api_error_response(
                 message="Category not found",
@@ -80,18 +103,19 @@ class CategoryAPIView(APIView):
 
     def delete(self, request, pk):
         """Delete a specific category for the logged-in user."""
-        category = Category.objects.filter(user=request.user, id=pk).first() 
+        category = Category.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not category:
             return api_error_response(
                 message="Category not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
-        category.delete()
+        # Kept as a tombstone (with its transactions and budgets) for delta sync.
+        CategoryService.soft_delete(request.user, [category])
         return api_success_response(
             message="Category deleted successfully"
         )
 
-class TransactionAPIView(APIView):
+class TransactionAPIView(ORJSONRendererMixin, APIView):
     """
     Single endpoint for Transaction operations (list, create, update, delete).
     Token protected and user-specific.
@@ -99,10 +123,10 @@ class TransactionAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk=None):
-        """Retrieve all transactions for the logged-in user."""
+        """Retrieve a page of transactions for the logged-in user."""
         
         if pk:
-            transaction = Transaction.objects.filter(user=request.user, pk=pk).first()
+            transaction = Transaction.objects.select_related('category').filter(user=request.user, is_active=True, pk=pk).first()
             if transaction:
                 serializer = TransactionSerializer(transaction)
                 
@@ -116,21 +140,58 @@ class TransactionAPIView(APIView):
                         status_code=status.HTTP_404_NOT_FOUND
                     )
         
-        transactions = Transaction.objects.filter(user=request.user)    
-        serializer = TransactionSerializer(transactions, many=True)
+        # values() rows (category_name joined in the same query) skip model
+        # instances and ModelSerializer; see readers.py.
+        transactions = Transaction.objects.filter(user=request.user, is_active=True)
+        paginator = TransactionCursorPagination()
+        try:
+            transactions = filter_transactions(transactions, request.query_params)
+            page = paginator.paginate_queryset(TRANSACTION_READER.values(transactions), request)
+        except (InvalidFilter, InvalidCursor) as exc:
+            return api_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
         return api_success_response(
             message="Transactions retrieved successfully",
-            data=serializer.data
+            data=paginator.get_paginated_data(TRANSACTION_READER.format(page))
         )
 
+    @idempotent
     def post(self, request):
-        """Create a new transaction for the logged-in user."""
-        serializer = TransactionSerializer(data=request.data, context={'request': request})
+        """
+        Create a new transaction for the logged-in user.
+
+        A row with the same amount and description as one already created
+        today is saved with "possible_duplicate_of" in the response. With an
+        Idempotency-Key (retries replay the key instead) it is refused with
+        409; ?allow_duplicate=true skips the check.
+        """
+        if request.query_params.get('allow_duplicate', '').lower() in ('true', '1'):
+            duplicates = 'allow'
+        elif request.headers.get(IDEMPOTENCY_HEADER):
+            duplicates = 'reject'
+        else:
+            duplicates = 'warn'
+        serializer = TransactionSerializer(
+            data=request.data, context={'request': request, 'duplicates': duplicates}
+        )
         if serializer.is_valid():
-            serializer.save(user=request.user)  
+            try:
+                instance = serializer.save(user=request.user)
+            except DuplicateTransaction as exc:
+                return api_error_response(
+                    message="Duplicate transaction",
+                    error_details={"duplicate_of": exc.duplicate_of},
+                    status_code=status.HTTP_409_CONFLICT
+                )
+            data = serializer.data
+            if instance.possible_duplicate_of is not None:
+                data = {**data, 'possible_duplicate_of': instance.possible_duplicate_of}
             return api_success_response(
                 message="Transaction created successfully",
-                data=serializer.data,
+                data=data,
                 status_code=status.HTTP_201_CREATED
             )
         return api_error_response(
@@ -141,13 +202,13 @@ class TransactionAPIView(APIView):
 
     def put(self, request, pk):
         """Update a specific transaction for the logged-in user."""
-        transaction = Transaction.objects.filter(user=request.user, id=pk).first() 
+        transaction = Transaction.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not transaction:
             return api_error_response(
                 message="Transaction not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
-        serializer = TransactionSerializer(transaction, data=request.data, partial=True)
+        serializer = TransactionSerializer(transaction, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return api_success_response(
@@ -162,36 +223,223 @@ class TransactionAPIView(APIView):
 
     def delete(self, request, pk):
         """Delete a specific transaction for the logged-in user."""
-        transaction = Transaction.objects.filter(user=request.user, id=pk).first() 
+        transaction = Transaction.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not transaction:
             return api_error_response(
                 message="Transaction not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
-        transaction.delete()
+        transaction.is_active = False
+        transaction.save(update_fields=['is_active', 'updated_at'])
         return api_success_response(
             message="Transaction deleted successfully"
         )
         
-class BudgetAPIView(APIView):
+def _bulk_payload(request, key):
+    """Return the list under `key` in the request body, or an error response."""
+    items = request.data.get(key) if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, api_error_response(
+            message=f"'{key}' must be a non-empty list",
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    if len(items) > MAX_BULK_ITEMS:
+        return None, api_error_response(
+            message=f"At most {MAX_BULK_ITEMS} items per request",
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    if key == 'ids' and not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in items):
+        return None, api_error_response(
+            message="'ids' must be a list of integers",
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    return items, None
+
+def _bulk_response(message, results):
+    """Per-item results; the request only fails when every item failed."""
+    if all(result['status'] == 'error' for result in results):
+        return api_error_response(
+            message=f"{message} failed",
+            error_details={"results": results},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    return api_success_response(message=f"{message} completed", data={"results": results})
+
+class TransactionSearchAPIView(ORJSONRendererMixin, APIView):
     """
-    Single endpoint for Budget operations (list, create, update, delete).
-    Token protected and user-specific.
+    Search the user's transactions by description: GET ?q=star buc.
+
+    Every word matches as a prefix, so it works as type-ahead, and the usual
+    list filters (date range, category, type, min_amount/max_amount) narrow the search.
+    Results come best match first, paged with ?page=.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """Retrieve all budgets for the logged-in user."""
-        budgets = Budget.objects.filter(user=request.user) 
-        serializer = BudgetSerializer(budgets, many=True)
+        transactions = Transaction.objects.filter(user=request.user, is_active=True)
+        paginator = RankedPagination()
+        try:
+            transactions = filter_transactions(transactions, request.query_params)
+            transactions = search_transactions(transactions, request.query_params.get('q'))
+            page = paginator.paginate_queryset(TRANSACTION_READER.values(transactions), request)
+        except (InvalidFilter, InvalidSearch, InvalidCursor) as exc:
+            return api_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        return api_success_response(
+            message="Transactions retrieved successfully",
+            data=paginator.get_paginated_data(TRANSACTION_READER.format(page))
+        )
+
+class BulkAPIView(APIView):
+    """
+    Batch create (POST {"items": [...]}), update (PUT {"items": [{"id": ..}, ..]})
+    and delete (DELETE {"ids": [...]}) in one request and one database transaction.
+    Items that fail validation are reported per item and skipped.
+    """
+    permission_classes = [IsAuthenticated]
+    service = None
+    label = None
+
+    @idempotent
+    def post(self, request):
+        items, error = _bulk_payload(request, 'items')
+        if error:
+            return error
+        return _bulk_response(f"Bulk {self.label} create", self.service.bulk_create(request.user, items))
+
+    def put(self, request):
+        items, error = _bulk_payload(request, 'items')
+        if error:
+            return error
+        return _bulk_response(f"Bulk {self.label} update", self.service.bulk_update(request.user, items))
+
+    def delete(self, request):
+        ids, error = _bulk_payload(request, 'ids')
+        if error:
+            return error
+        return _bulk_response(f"Bulk {self.label} delete", self.service.bulk_delete(request.user, ids))
+
+class CategoryBulkAPIView(BulkAPIView):
+    service = CategoryService
+    label = "category"
+
+class TransactionBulkAPIView(BulkAPIView):
+    service = TransactionService
+    label = "transaction"
+
+class TransactionImportAPIView(APIView):
+    """
+    Upload a CSV/OFX bank statement to be imported in the background.
+    Progress and per-row errors are reported through the BackgroundTask.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+        """Queue an import job for the uploaded statement file."""
+        upload = request.FILES.get('file')
+        if not upload:
+            return api_error_response(
+                message="Failed to import transactions",
+                error_details={"file": ["This field is required."]},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_format = (request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.')).lower()
+        if file_format not in IMPORT_FORMATS:
+            return api_error_response(
+                message="Failed to import transactions",
+                error_details={"format": [f"Supported formats: {', '.join(IMPORT_FORMATS)}"]},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        task_id = str(uuid.uuid4())
+        # Django writes the upload to storage in chunks; the worker reads it back as a stream.
+        file_path = default_storage.save(f"imports/{task_id}.{file_format}", upload)
+        task = BackgroundTask.objects.create(user=request.user, task_id=task_id, task_type='import')
+        import_transactions_task.apply_async(args=[task.id, file_path, file_format], task_id=task_id)
+
+        serializer = BackgroundTaskSerializer(task)
+        return api_success_response(
+            message="Transaction import started",
+            data=serializer.data,
+            status_code=status.HTTP_202_ACCEPTED
+        )
+
+class TransactionExportAPIView(APIView):
+    """
+    Export the logged-in user's transactions to CSV or Parquet in the background.
+    Accepts the same filters as the transaction list.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """Queue an export job; the file is attached to the BackgroundTask."""
+        file_format = (request.data.get('format') or 'csv').lower()
+        if file_format not in EXPORT_FORMATS:
+            return api_error_response(
+                message="Failed to export transactions",
+                error_details={"format": [f"Supported formats: {', '.join(EXPORT_FORMATS)}"]},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        filters = request.query_params.dict()
+        try:
+            # Validate the filters here so a bad request fails fast, not in the worker.
+            filter_transactions(Transaction.objects.none(), filters)
+        except InvalidFilter as exc:
+            return api_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        task_id = str(uuid.uuid4())
+        task = BackgroundTask.objects.create(user=request.user, task_id=task_id, task_type='export')
+        export_transactions_task.apply_async(args=[task.id, file_format, filters], task_id=task_id)
+
+        serializer = BackgroundTaskSerializer(task)
         return api_success_response(
-            message="Budgets retrieved successfully",
-            data=serializer.data
+            message="Transaction export started",
+            data=serializer.data,
+            status_code=status.HTTP_202_ACCEPTED
+        )
+
+class BudgetAPIView(ORJSONRendererMixin, APIView):
+    """
+    Single endpoint for Budget operations (list, create, update, delete).
+    Token protected and user-specific.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk=None):
+        """Retrieve all budgets or a single budget for the logged-in user."""
+        if pk:
+            rows = list(BUDGET_READER.values(Budget.objects.filter(user=request.user, is_active=True, pk=pk)))
+            if rows:
+                return api_success_response(
+                    message="Budget retrieved successfully",
+                    data=BUDGET_READER.format(rows)[0]
+                )
+            return api_error_response(
+                message="Budget not found",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        def build_data():
+            budgets = Budget.objects.filter(user=request.user, is_active=True)
+            return BUDGET_READER.format(BUDGET_READER.values(budgets))
+
+        return cached_list_response(
+            request, BUDGETS_NAMESPACE, "Budgets retrieved successfully", build_data
         )
 
     def post(self, request):
         """Create a new budget for the logged-in user."""
-        serializer = BudgetSerializer(data=request.data)
+        serializer = BudgetSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(user=request.user) 
             return api_success_response(
@@ -207,7 +455,7 @@ class BudgetAPIView(APIView):
 
     def put(self, request, pk):
         """Update a specific budget for the logged-in user."""
-        budget = Budget.objects.filter(user=request.user, id=pk).first() 
+        budget = Budget.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not budget:
             return api_error_response(
                 message="Budget not found",
@@ -228,17 +476,36 @@ class BudgetAPIView(APIView):
 
     def delete(self, request, pk):
         """Delete a specific budget for the logged-in user."""
-        budget = Budget.objects.filter(user=request.user, id=pk).first() 
+        budget = Budget.objects.filter(user=request.user, is_active=True, id=pk).first() 
         if not budget:
             return api_error_response(
                 message="Budget not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
-        budget.delete()
+        budget.is_active = False
+        budget.save(update_fields=['is_active', 'updated_at'])
         return api_success_response(
             message="Budget deleted successfully"
         )
 
+class SyncAPIView(APIView):
+    """
+    Delta sync: categories, transactions and budgets changed since ?since=<token>.
+    Omit `since` for the first (full) sync. Deleted rows come back as tombstones.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            data = changes_since(request.user, request.query_params.get('since'))
+        except InvalidSyncToken as exc:
+            return api_error_response(
+                message="Invalid query parameters",
+                error_details={"detail": str(exc)},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        return api_success_response(message="Changes retrieved successfully", data=data)
+
 class BackgroundTaskAPIView(APIView):
     """
     Read-only endpoint for Background Tasks.
@@ -246,27 +513,49 @@ class BackgroundTaskAPIView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    def get(self, request, pk=None):
         """Retrieve all background tasks for the logged-in user."""
-        tasks = BackgroundTask.objects.filter(user=request.user) 
-        serializer = BackgroundTaskSerializer(tasks, many=True)
-        return api_success_response(
-            message="Background tasks retrieved successfully",
-            data=serializer.data
+        if pk:
+            return self.retrieve(request, pk)
+
+        def build_data():
+            tasks = BackgroundTask.objects.filter(user=request.user)
+            return BackgroundTaskSerializer(tasks, many=True).data
+
+        return cached_list_response(
+            request, TASKS_NAMESPACE, "Background tasks retrieved successfully", build_data
         )
 
     def retrieve(self, request, pk):
-        """Retrieve a specific background task by ID for the logged-in user."""
-        task = BackgroundTask.objects.filter(user=request.user, id=pk).first()
-        if not task:
+        """
+        Retrieve a specific background task by ID for the logged-in user.
+        Served from the status Celery workers push to Redis when present.
+        """
+        task_status = get_task_status(request.user, pk)
+        if not task_status:
             return api_error_response(
                 message="Background task not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
-        serializer = BackgroundTaskSerializer(task)
         return api_success_response(
             message="Background task retrieved successfully",
-            data=serializer.data
+            data=task_status
+        )
+
+
+class RecurringSeriesAPIView(APIView):
+    """
+    Read-only list of the user's recurring transactions (subscriptions,
+    rent, salary) with their next expected dates. Kept up to date by the
+    detect-recurring-transactions Celery job.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        series = RecurringSeries.objects.filter(user=request.user, is_active=True)
+        return api_success_response(
+            message="Recurring transactions retrieved successfully",
+            data=RecurringSeriesSerializer(series, many=True).data
         )
 
 
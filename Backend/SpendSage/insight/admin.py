@@ -1,3 +1,7 @@
 from django.contrib import admin
+from .models import DailySpend, MonthlySpend
 
 # Register your models here.
+
+admin.site.register(DailySpend)
+admin.site.register(MonthlySpend)
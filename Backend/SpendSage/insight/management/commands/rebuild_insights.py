@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from insight.service import rebuild_user_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily/monthly spending rollups from Transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or get_user_model().objects.values_list('id', flat=True).order_by('id')
+        rebuilt = 0
+        for user_id in user_ids:
+            rebuild_user_rollups(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} users"))
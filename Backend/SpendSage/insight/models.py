@@ -1,3 +1,49 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from expenses.models import Category
 
-# Create your models here.
+
+User = get_user_model()
+
+
+class SpendRollup(models.Model):
+    """
+    Pre-aggregated transaction totals per user x category x transaction_type.
+    Kept up to date incrementally so dashboards never aggregate Transaction.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    transaction_type = models.CharField(max_length=10)
+    # Totals stay in the transactions' own currency; views convert them.
+    currency = models.CharField(max_length=3, default='INR')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySpend(SpendRollup):
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date', 'category', 'transaction_type', 'currency'],
+                name='unique_daily_spend',
+                nulls_distinct=False
+            ),
+        ]
+
+
+class MonthlySpend(SpendRollup):
+    month = models.DateField(help_text="First day of the month.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month', 'category', 'transaction_type', 'currency'],
+                name='unique_monthly_spend',
+                nulls_distinct=False
+            ),
+        ]
@@ -0,0 +1,111 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Lower, TruncDate, TruncMonth
+from django.utils import timezone
+
+from expenses.archive import archived_spend_entries
+from expenses.models import Transaction
+from .models import DailySpend, MonthlySpend
+
+REBUILD_BATCH_SIZE = 5000
+
+
+def _bucket_totals(entries, sign):
+    """Collapse entries into {(user, category, type, currency, day): [total, count]}."""
+    buckets = defaultdict(lambda: [Decimal('0'), 0])
+    for entry in entries:
+        key = (
+            entry.user_id, entry.category_id, entry.transaction_type, entry.currency,
+            timezone.localdate(entry.created_at)
+        )
+        buckets[key][0] += entry.amount * sign
+        buckets[key][1] += sign
+    return buckets
+
+
+def _increment(model, key, total, count):
+    rows = model.objects.filter(**key)
+    if rows.update(total=F('total') + total, count=F('count') + count):
+        return
+    if count <= 0:
+        # Nothing to subtract from, e.g. the rollup was already removed by a
+        # category cascade or is about to be rebuilt.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(total=total, count=count, **key)
+    except IntegrityError:
+        # Another writer created the row first; add to theirs.
+        rows.update(total=F('total') + total, count=F('count') + count)
+
+
+@transaction.atomic
+def record_entries(entries, sign=1):
+    """
+    Add (sign=1) or subtract (sign=-1) SpendEntry tuples from the rollups.
+
+    Entries are first collapsed per day and month, so a batch of thousands
+    of imported rows costs one UPDATE per touched bucket, not per row.
+    """
+    if not entries:
+        return
+    monthly = defaultdict(lambda: [Decimal('0'), 0])
+    daily = _bucket_totals(entries, sign)
+    for (user_id, category_id, transaction_type, currency, day), (total, count) in daily.items():
+        key = {
+            'user_id': user_id, 'category_id': category_id,
+            'transaction_type': transaction_type, 'currency': currency,
+        }
+        _increment(DailySpend, {**key, 'date': day}, total, count)
+        month_total = monthly[(user_id, category_id, transaction_type, currency, day.replace(day=1))]
+        month_total[0] += total
+        month_total[1] += count
+    for (user_id, category_id, transaction_type, currency, month), (total, count) in monthly.items():
+        _increment(MonthlySpend, {
+            'user_id': user_id, 'category_id': category_id,
+            'transaction_type': transaction_type, 'currency': currency, 'month': month,
+        }, total, count)
+
+
+def apply_spend_changes(removed, added):
+    record_entries(removed, -1)
+    record_entries(added, 1)
+
+
+def _aggregate(user_id, bucket, field):
+    # Truncation happens in the current time zone, like timezone.localdate().
+    rows = (
+        Transaction.objects.filter(user_id=user_id, is_active=True, enrichment_pending=False)
+        .annotate(bucket=bucket, kind=Lower('transaction_type'))
+        .values('category_id', 'kind', 'currency', 'bucket')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    return (
+        {
+            'user_id': user_id, 'category_id': row['category_id'],
+            'transaction_type': row['kind'], 'currency': row['currency'], field: row['bucket'],
+            'total': row['total'], 'count': row['count'],
+        }
+        for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE)
+    )
+
+
+@transaction.atomic
+def rebuild_user_rollups(user_id):
+    """Recompute a user's daily and monthly rollups from Transaction and its archive."""
+    DailySpend.objects.filter(user_id=user_id).delete()
+    MonthlySpend.objects.filter(user_id=user_id).delete()
+    DailySpend.objects.bulk_create(
+        [DailySpend(**row) for row in _aggregate(user_id, TruncDate('created_at'), 'date')],
+        batch_size=REBUILD_BATCH_SIZE
+    )
+    MonthlySpend.objects.bulk_create(
+        [MonthlySpend(**row) for row in _aggregate(user_id, TruncMonth('created_at', output_field=DateField()), 'month')],
+        batch_size=REBUILD_BATCH_SIZE
+    )
+    # Months moved to Parquet by archive_transactions are no longer in the table.
+    record_entries(archived_spend_entries(user_id))
@@ -0,0 +1,10 @@
+from django.dispatch import receiver
+
+from expenses.signals import spend_changed
+from .service import apply_spend_changes
+
+
+@receiver(spend_changed)
+def update_rollups(sender, removed, added, **kwargs):
+    """Keep daily/monthly rollups in step with every transaction write."""
+    apply_spend_changes(removed, added)
@@ -1,3 +1,156 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from expenses.currency import clear_rate_table
+from expenses.models import Category, ExchangeRate, Transaction
+from users.models import User
+from .models import DailySpend, MonthlySpend
+from .service import rebuild_user_rollups
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS, TRANSACTION_ENRICHMENT_SYNC=True)
+class InsightTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='insight@example.com', username='insight@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.rent = Category.objects.create(user=self.user, name='Rent')
+
+    def spend(self, amount, day, category=None, transaction_type='expense', currency='INR'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), raw_description='SHOP', category=category,
+            transaction_type=transaction_type, currency=currency,
+            created_at=datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=12)
+        )
+
+    def rollups(self, model=MonthlySpend):
+        day = 'month' if model is MonthlySpend else 'date'
+        rows = model.objects.filter(user=self.user).values_list(day, 'category_id', 'transaction_type', 'total', 'count')
+        return sorted(rows, key=lambda row: (row[0], row[1] or 0, row[2]))
+
+
+class RollupTests(InsightTestCase):
+    def test_writes_are_added_per_day_and_month(self):
+        self.spend('10.00', date(2024, 3, 1), self.food)
+        self.spend('5.50', date(2024, 3, 1), self.food)
+        self.spend('7.00', date(2024, 3, 20), self.food)
+
+        self.assertEqual(self.rollups(DailySpend), [
+            (date(2024, 3, 1), self.food.pk, 'expense', Decimal('15.50'), 2),
+            (date(2024, 3, 20), self.food.pk, 'expense', Decimal('7.00'), 1),
+        ])
+        self.assertEqual(self.rollups(), [(date(2024, 3, 1), self.food.pk, 'expense', Decimal('22.50'), 3)])
+
+    def test_edits_move_totals_between_buckets(self):
+        txn = self.spend('10.00', date(2024, 3, 1), self.food)
+
+        txn.category = self.rent
+        txn.amount = Decimal('12.00')
+        txn.created_at += timedelta(days=31)
+        txn.save()
+
+        self.assertEqual(self.rollups(), [
+            (date(2024, 3, 1), self.food.pk, 'expense', Decimal('0.00'), 0),
+            (date(2024, 4, 1), self.rent.pk, 'expense', Decimal('12.00'), 1),
+        ])
+
+    def test_deleted_rows_stop_counting(self):
+        txn = self.spend('10.00', date(2024, 3, 1), self.food)
+        self.spend('4.00', date(2024, 3, 2), self.food)
+
+        txn.is_active = False
+        txn.save(update_fields=['is_active', 'updated_at'])
+
+        self.assertEqual(self.rollups(), [(date(2024, 3, 1), self.food.pk, 'expense', Decimal('4.00'), 1)])
+
+    def test_rebuild_matches_the_incremental_totals(self):
+        self.spend('10.00', date(2024, 3, 1), self.food)
+        self.spend('99.00', date(2024, 3, 2), transaction_type='income')
+        txn = self.spend('3.00', date(2024, 4, 2), self.rent)
+        txn.amount = Decimal('4.00')
+        txn.save()
+        incremental = [row for row in self.rollups() if row[4]], [row for row in self.rollups(DailySpend) if row[4]]
+
+        rebuild_user_rollups(self.user.id)
+
+        self.assertEqual((self.rollups(), self.rollups(DailySpend)), incremental)
+
+
+@override_settings(EXCHANGE_RATE_BASE='EUR')
+class InsightViewTests(InsightTestCase):
+    def setUp(self):
+        super().setUp()
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='INR', date=date(2020, 1, 1), rate=Decimal('90')),
+            ExchangeRate(currency='USD', date=date(2020, 1, 1), rate=Decimal('1.125')),
+        ])
+        clear_rate_table()
+        self.addCleanup(clear_rate_table)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_monthly_trend(self):
+        this_month = timezone.localdate().replace(day=1)
+        self.spend('100.00', this_month, self.food)
+        self.spend('1000.00', this_month, transaction_type='income')
+        # 1 USD = 80 INR.
+        self.spend('1.00', this_month, self.food, currency='USD')
+
+        trend = self.get('/api/v1/insights/monthly-trend/', months=2)
+
+        self.assertEqual(len(trend), 2)
+        self.assertEqual(trend[0]['expense'], '0.00')
+        self.assertEqual(
+            {key: trend[1][key] for key in ('month', 'income', 'expense', 'net', 'currency')},
+            {'month': this_month.strftime('%Y-%m'), 'income': '1000.00', 'expense': '180.00', 'net': '820.00',
+             'currency': 'INR'}
+        )
+
+    def test_category_breakdown(self):
+        self.spend('100.00', date(2024, 3, 5), self.food)
+        self.spend('300.00', date(2024, 3, 6), self.rent)
+        self.spend('50.00', date(2024, 4, 6), self.rent)
+
+        breakdown = self.get('/api/v1/insights/category-breakdown/', month='2024-03')
+
+        self.assertEqual(
+            [(row['category_name'], row['total'], row['count']) for row in breakdown],
+            [('Rent', '300.00', 1), ('Food', '100.00', 1)]
+        )
+
+    def test_income_expense_over_days_and_whole_months(self):
+        self.spend('100.00', date(2024, 3, 5), self.food)
+        self.spend('40.00', date(2024, 3, 25), self.food)
+        self.spend('500.00', date(2024, 3, 1), transaction_type='income')
+
+        partial = self.get('/api/v1/insights/income-expense/', start_date='2024-03-02', end_date='2024-03-10')
+        whole = self.get('/api/v1/insights/income-expense/', start_date='2024-03-01', end_date='2024-03-31')
+
+        self.assertEqual((partial['income'], partial['expense']), ('0.00', '100.00'))
+        self.assertEqual((whole['income'], whole['expense'], whole['net']), ('500.00', '140.00', '360.00'))
+
+    def test_bad_parameters(self):
+        for url, params in (
+            ('/api/v1/insights/monthly-trend/', {'months': 'all'}),
+            ('/api/v1/insights/category-breakdown/', {'month': '2024-13'}),
+            ('/api/v1/insights/income-expense/', {'start_date': '2024-03-10', 'end_date': '2024-03-01'}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_missing_rates_are_a_503(self):
+        self.spend('1.00', timezone.localdate(), self.food, currency='JPY')
+        self.assertEqual(self.client.get('/api/v1/insights/monthly-trend/').status_code, 503)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import MonthlyTrendAPIView, CategoryBreakdownAPIView, IncomeExpenseAPIView
+
+urlpatterns = [
+    path('monthly-trend/', MonthlyTrendAPIView.as_view(), name='insight_monthly_trend'),
+    path('category-breakdown/', CategoryBreakdownAPIView.as_view(), name='insight_category_breakdown'),
+    path('income-expense/', IncomeExpenseAPIView.as_view(), name='insight_income_expense'),
+]
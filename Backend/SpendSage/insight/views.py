@@ -1,3 +1,200 @@
-from django.shortcuts import render
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your views here.
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from common.utils import api_success_response, api_error_response
+from expenses.currency import convert_rows, user_currency, MissingRate
+from .models import DailySpend, MonthlySpend
+
+MAX_TREND_MONTHS = 60
+
+
+def _shift_month(month, delta):
+    index = month.year * 12 + month.month - 1 + delta
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _parse_month(value):
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise ValueError("month must be in YYYY-MM format")
+
+
+def _money(value):
+    # Match the two-decimal strings DRF's DecimalField returns elsewhere.
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def _missing_rate(exc):
+    return api_error_response(
+        message="Exchange rates unavailable",
+        error_details={"detail": str(exc)},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
+def _invalid(message):
+    return api_error_response(
+        message="Invalid query parameters",
+        error_details={"detail": message},
+        status_code=status.HTTP_400_BAD_REQUEST
+    )
+
+
+class MonthlyTrendAPIView(APIView):
+    """
+    Income and expense totals per month, read from the monthly rollups and
+    converted to the user's currency at each month's first-day rate.
+    Token protected and user-specific.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Return the last `months` months (default 12), oldest first."""
+        try:
+            months = int(request.query_params.get('months', 12))
+        except ValueError:
+            return _invalid("months must be an integer")
+        months = max(1, min(months, MAX_TREND_MONTHS))
+
+        current = timezone.localdate().replace(day=1)
+        start = _shift_month(current, -(months - 1))
+        totals = defaultdict(Decimal)
+        rows = (
+            MonthlySpend.objects.filter(user=request.user, month__gte=start)
+            .values('month', 'transaction_type', 'currency')
+            .annotate(total=Sum('total'))
+            .order_by()
+        )
+        currency = user_currency(request.user.id)
+        try:
+            rows = convert_rows(list(rows), currency, 'month')
+        except MissingRate as exc:
+            return _missing_rate(exc)
+        for row in rows:
+            totals[(row['month'], row['transaction_type'])] += row['total']
+
+        trend = []
+        for offset in range(months):
+            month = _shift_month(start, offset)
+            income = totals.get((month, 'income'), Decimal('0'))
+            expense = totals.get((month, 'expense'), Decimal('0'))
+            trend.append({
+                'month': month.strftime('%Y-%m'),
+                'income': _money(income),
+                'expense': _money(expense),
+                'net': _money(income - expense),
+                'currency': currency,
+            })
+        return api_success_response(
+            message="Monthly trend retrieved successfully",
+            data=trend
+        )
+
+
+class CategoryBreakdownAPIView(APIView):
+    """
+    Spending per category for one month, read from the monthly rollups.
+    Token protected and user-specific.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Return category totals for `month` (YYYY-MM, default current month)."""
+        month = request.query_params.get('month')
+        try:
+            month = _parse_month(month) if month else timezone.localdate().replace(day=1)
+        except ValueError as exc:
+            return _invalid(str(exc))
+        transaction_type = request.query_params.get('transaction_type', 'expense').lower()
+
+        rows = (
+            MonthlySpend.objects.filter(user=request.user, month=month, transaction_type=transaction_type)
+            .values('category_id', 'category__name', 'currency', 'month')
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by()
+        )
+        currency = user_currency(request.user.id)
+        try:
+            rows = convert_rows(list(rows), currency, 'month')
+        except MissingRate as exc:
+            return _missing_rate(exc)
+        categories = {}
+        for row in rows:
+            category = categories.setdefault(row['category_id'], {
+                'category': row['category_id'],
+                'category_name': row['category__name'],
+                'total': Decimal('0'),
+                'count': 0,
+            })
+            category['total'] += row['total']
+            category['count'] += row['count']
+        breakdown = [
+            {**category, 'total': _money(category['total']), 'currency': currency}
+            for category in sorted(categories.values(), key=lambda category: -category['total'])
+            if category['count']
+        ]
+        return api_success_response(
+            message="Category breakdown retrieved successfully",
+            data=breakdown
+        )
+
+
+class IncomeExpenseAPIView(APIView):
+    """
+    Income vs expense totals over a date range, read from the daily rollups.
+    Token protected and user-specific.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Return totals between start_date and end_date (default: this month)."""
+        today = timezone.localdate()
+        try:
+            start_date = date.fromisoformat(request.query_params.get('start_date') or today.replace(day=1).isoformat())
+            end_date = date.fromisoformat(request.query_params.get('end_date') or today.isoformat())
+        except ValueError:
+            return _invalid("start_date and end_date must be dates in YYYY-MM-DD format")
+        if end_date < start_date:
+            return _invalid("end_date must not be before start_date")
+
+        # Whole months are served from the smaller monthly table.
+        if start_date.day == 1 and (end_date + timedelta(days=1)).day == 1:
+            rows = MonthlySpend.objects.filter(
+                user=request.user, month__gte=start_date, month__lte=end_date
+            )
+            day_key = 'month'
+        else:
+            rows = DailySpend.objects.filter(
+                user=request.user, date__gte=start_date, date__lte=end_date
+            )
+            day_key = 'date'
+        rows = rows.values('transaction_type', 'currency', day_key).annotate(total=Sum('total')).order_by()
+        currency = user_currency(request.user.id)
+        try:
+            rows = convert_rows(list(rows), currency, day_key)
+        except MissingRate as exc:
+            return _missing_rate(exc)
+        totals = defaultdict(Decimal)
+        for row in rows:
+            totals[row['transaction_type']] += row['total']
+        income = totals['income']
+        expense = totals['expense']
+        return api_success_response(
+            message="Income and expense retrieved successfully",
+            data={
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+                'income': _money(income),
+                'expense': _money(expense),
+                'net': _money(income - expense),
+                'currency': currency,
+            }
+        )
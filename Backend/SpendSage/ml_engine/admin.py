@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import SpendingStats
 
 # Register your models here.
+
+admin.site.register(SpendingStats)
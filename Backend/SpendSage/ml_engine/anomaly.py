@@ -0,0 +1,245 @@
+"""
+Anomaly detection for transactions (FR-08).
+
+Every (user, category) pair keeps a few running statistics in one
+SpendingStats row: a Welford mean/variance of log(amount), an EWMA of the
+amount and a P-squared estimate of the 95th percentile. Scoring a new
+expense reads and updates that row only, never the transaction history.
+
+Updates and deletes do not rewind the statistics (the quantile sketch
+cannot forget a value); rebuild_user_stats() recomputes them from scratch
+and is what the batch job runs after imports.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SpendingStats
+
+# Need this many earlier expenses in a category before flagging anything.
+MIN_HISTORY = 5
+Z_THRESHOLD = 3.0
+# An amount this many times the estimated p95 is flagged regardless of z.
+P95_MULTIPLIER = 2.0
+EWMA_ALPHA = 0.1
+QUANTILE = 0.95
+REBUILD_CHUNK_SIZE = 5000
+STATS_FIELDS = ['count', 'mean', 'm2', 'ewma', 'quantile_state']
+
+
+class P2Quantile:
+    """
+    Jain & Chlamtac's P-squared streaming quantile estimator.
+
+    Tracks a single quantile with five markers, i.e. constant memory, and
+    round-trips through a plain dict so it can live in a JSONField.
+    """
+
+    def __init__(self, p=QUANTILE, state=None):
+        self.p = p
+        if state:
+            self.heights = state['heights']
+            self.positions = state['positions']
+            self.desired = state['desired']
+        else:
+            self.heights = []
+            self.positions = [1, 2, 3, 4, 5]
+            self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def to_dict(self):
+        return {'heights': self.heights, 'positions': self.positions, 'desired': self.desired}
+
+    @property
+    def value(self):
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(self.p * len(ordered)))]
+        return self.heights[2]
+
+    def add(self, x):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(x)
+            if len(heights) == 5:
+                heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            cell = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= x < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            delta = self.desired[i] - self.positions[i]
+            if (delta >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+                    (delta <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = self._linear(i, step)
+                heights[i] = candidate
+                self.positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+
+class RunningStats:
+    """The in-memory view of one SpendingStats row."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, ewma=None, quantile_state=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+        self.quantile = P2Quantile(state=quantile_state)
+
+    @classmethod
+    def from_model(cls, stats):
+        return cls(stats.count, stats.mean, stats.m2, stats.ewma, stats.quantile_state)
+
+    def apply_to(self, stats):
+        stats.count = self.count
+        stats.mean = self.mean
+        stats.m2 = self.m2
+        stats.ewma = self.ewma
+        stats.quantile_state = self.quantile.to_dict()
+        return stats
+
+    def is_anomaly(self, amount):
+        """Judge an amount against the history seen so far (before adding it)."""
+        if self.count < MIN_HISTORY:
+            return False
+        amount = float(amount)
+        variance = self.m2 / (self.count - 1)
+        if variance > 0:
+            z_score = (math.log1p(amount) - self.mean) / math.sqrt(variance)
+            if z_score >= Z_THRESHOLD:
+                return True
+        p95 = self.quantile.value
+        return p95 is not None and amount > p95 * P95_MULTIPLIER
+
+    def add(self, amount):
+        amount = float(amount)
+        # Welford on log-amounts: spending is heavy-tailed, logs are closer to normal.
+        value = math.log1p(amount)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.ewma = amount if self.ewma is None else EWMA_ALPHA * amount + (1 - EWMA_ALPHA) * self.ewma
+        self.quantile.add(amount)
+
+
+def is_scored(transaction_type):
+    # Only spending is scored; income spikes are not anomalies for us.
+    return (transaction_type or '').lower() == 'expense'
+
+
+@transaction.atomic
+def score_many(items):
+    """
+    Score (key, user_id, category_id, amount) items, oldest first, and fold
+    them into the running statistics. Returns {key: is_anomaly}.
+
+    Each (user, category) row is locked, read and written once per call, so
+    a batch of new expenses costs two or three queries however many rows
+    it holds.
+    """
+    if not items:
+        return {}
+    owners = Q()
+    for user_id, category_id in {(user_id, category_id) for _, user_id, category_id, _ in items}:
+        owners |= Q(user_id=user_id, category_id=category_id)
+    existing = {
+        (stats.user_id, stats.category_id): stats
+        for stats in SpendingStats.objects.select_for_update().filter(owners)
+    }
+
+    running = {}
+    flags = {}
+    for key, user_id, category_id, amount in items:
+        owner = (user_id, category_id)
+        if owner not in running:
+            running[owner] = RunningStats.from_model(existing[owner]) if owner in existing else RunningStats()
+        flags[key] = running[owner].is_anomaly(amount)
+        running[owner].add(amount)
+
+    to_update = [stats.apply_to(existing[owner]) for owner, stats in running.items() if owner in existing]
+    to_create = [
+        stats.apply_to(SpendingStats(user_id=owner[0], category_id=owner[1]))
+        for owner, stats in running.items() if owner not in existing
+    ]
+    SpendingStats.objects.bulk_update(to_update, STATS_FIELDS)
+    # A concurrent batch may have created the same row first; its numbers
+    # win and the next rebuild reconciles the difference.
+    SpendingStats.objects.bulk_create(to_create, ignore_conflicts=True)
+    return flags
+
+
+def rebuild_user_stats(user_id):
+    """
+    Recompute a user's statistics and is_anomaly flags from their history.
+
+    Replays expenses in chronological order with the same rules as the
+    create path, so a back-scored import matches what live scoring would
+    have produced. Users are independent, so this is safe to fan out.
+    """
+    from expenses.models import Transaction
+
+    running = {}
+    flagged_ids = []
+    rows = (
+        Transaction.objects.filter(user_id=user_id, is_active=True, enrichment_pending=False)
+        .order_by('created_at', 'id')
+        .values_list('id', 'category_id', 'amount', 'transaction_type')
+        .iterator(chunk_size=REBUILD_CHUNK_SIZE)
+    )
+    for pk, category_id, amount, transaction_type in rows:
+        if not is_scored(transaction_type):
+            continue
+        stats = running.setdefault(category_id, RunningStats())
+        if stats.is_anomaly(amount):
+            flagged_ids.append(pk)
+        stats.add(amount)
+
+    with transaction.atomic():
+        SpendingStats.objects.filter(user_id=user_id).delete()
+        SpendingStats.objects.bulk_create([
+            stats.apply_to(SpendingStats(user_id=user_id, category_id=category_id))
+            for category_id, stats in running.items()
+        ])
+        # Only rows whose flag actually flips are written, so updated_at
+        # (and with it delta sync) moves for those rows alone.
+        previous = set(
+            Transaction.objects.filter(user_id=user_id, is_anomaly=True).values_list('id', flat=True)
+        )
+        flagged = set(flagged_ids)
+        for ids, value in ((sorted(previous - flagged), False), (sorted(flagged - previous), True)):
+            for start in range(0, len(ids), REBUILD_CHUNK_SIZE):
+                Transaction.objects.filter(id__in=ids[start:start + REBUILD_CHUNK_SIZE]).update(
+                    is_anomaly=value, updated_at=timezone.now()
+                )
+    return len(flagged_ids)
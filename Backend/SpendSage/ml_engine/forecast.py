@@ -0,0 +1,165 @@
+"""
+Budget spend forecasting (Budget.ml_prediction_amount).
+
+Daily expense series are read from the insight DailySpend rollups for a
+whole chunk of budgets at once, converted to the owner's currency (as
+Budget.spent_amount is), and laid out as one (n_series, n_days) NumPy
+matrix. The forecaster - simple exponential smoothing for the level
+times a weekly seasonal profile - then runs as column-wise array updates
+over every series together, so the cost per budget is a few vector ops.
+
+prediction = spent so far (Budget.spent_amount) + forecast for the days
+left in the period, starting today.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+
+HISTORY_DAYS = 84  # twelve full weeks, so every weekday has 12 samples
+SMOOTHING_ALPHA = 0.3
+FORECAST_CHUNK_SIZE = 2000
+MAX_PREDICTION = Decimal('99999999.99')  # Budget.ml_prediction_amount is max_digits=10
+
+
+def load_daily_series(keys, start_date, days):
+    """
+    Return a (len(keys), days) float matrix of daily expense per
+    (user_id, category_id) key, built from the rollups in one query and
+    converted to each user's currency_preference like their budgets.
+    """
+    import numpy as np
+    from expenses.currency import convert_rows, user_currency
+    from insight.models import DailySpend
+
+    series = np.zeros((len(keys), days), dtype=np.float64)
+    if not keys:
+        return series
+    row_of = {key: index for index, key in enumerate(keys)}
+    owners = Q()
+    grouped = _group_by_user(keys)
+    for user_id, category_ids in grouped.items():
+        owners |= Q(user_id=user_id, category_id__in=category_ids)
+    targets = {user_id: user_currency(user_id) for user_id in grouped}
+    rows = DailySpend.objects.filter(
+        owners,
+        transaction_type='expense',
+        date__gte=start_date,
+        date__lt=start_date + timedelta(days=days),
+    ).values('user_id', 'category_id', 'date', 'currency', 'total')
+
+    def add(batch):
+        convert_rows(batch, [targets[row['user_id']] for row in batch], 'date')
+        for row in batch:
+            column = (row['date'] - start_date).days
+            series[row_of[(row['user_id'], row['category_id'])], column] += float(row['total'])
+
+    batch = []
+    for row in rows.iterator(chunk_size=FORECAST_CHUNK_SIZE):
+        batch.append(row)
+        if len(batch) == FORECAST_CHUNK_SIZE:
+            add(batch)
+            batch = []
+    add(batch)
+    return series
+
+
+def _group_by_user(keys):
+    grouped = {}
+    for user_id, category_id in keys:
+        grouped.setdefault(user_id, []).append(category_id)
+    return grouped
+
+
+def fit_level_and_seasonality(series, start_weekday, alpha=SMOOTHING_ALPHA):
+    """
+    Fit every series at once.
+
+    Returns (level, factors): the smoothed daily level, shape (n,), and a
+    multiplicative weekday profile, shape (n, 7), indexed by date.weekday().
+    """
+    import numpy as np
+
+    days = series.shape[1]
+    weekday_of_column = (start_weekday + np.arange(days)) % 7
+    weekday_means = np.stack(
+        [series[:, weekday_of_column == weekday].mean(axis=1) for weekday in range(7)], axis=1
+    )
+    overall = series.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factors = np.where(overall > 0, weekday_means / overall, 1.0)
+
+    # Smooth the deseasonalized series so the level does not depend on
+    # which weekday the history happens to end on.
+    column_factors = factors[:, weekday_of_column]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adjusted = np.where(column_factors > 0, series / column_factors, 0.0)
+    # Weekdays without any spending (factor 0) say nothing about the level,
+    # so they leave it as it is; it starts from the mean daily spend.
+    level = overall[:, 0].copy()
+    for column in range(days):
+        observed = column_factors[:, column] > 0
+        level = np.where(observed, alpha * adjusted[:, column] + (1 - alpha) * level, level)
+    return level, factors
+
+
+def weekday_counts(first_days, lengths):
+    """
+    Count the Mondays..Sundays in each range [first_day, first_day + length).
+    first_days holds weekday numbers; both arrays have shape (n,).
+    """
+    import numpy as np
+
+    offsets = (np.arange(7)[None, :] - first_days[:, None]) % 7
+    return np.clip((lengths[:, None] - offsets + 6) // 7, 0, None)
+
+
+def forecast_budgets(budgets, today=None):
+    """
+    Set ml_prediction_amount on a list of Budget instances (not saved).
+
+    Budgets that share a (user, category) share one series row.
+    """
+    import numpy as np
+
+    today = today or timezone.localdate()
+    budgets = [budget for budget in budgets if budget.period_end_date >= today]
+    if not budgets:
+        return []
+
+    keys = sorted({(budget.user_id, budget.category_id) for budget in budgets})
+    history_start = today - timedelta(days=HISTORY_DAYS)
+    series = load_daily_series(keys, history_start, HISTORY_DAYS)
+    level, factors = fit_level_and_seasonality(series, history_start.weekday())
+
+    row_of = {key: index for index, key in enumerate(keys)}
+    rows = np.array([row_of[(budget.user_id, budget.category_id)] for budget in budgets])
+    first_days = [max(today, budget.period_start_date) for budget in budgets]
+    lengths = np.array([(budget.period_end_date - first).days + 1 for budget, first in zip(budgets, first_days)])
+    first_weekdays = np.array([first.weekday() for first in first_days])
+
+    remaining = level[rows] * (weekday_counts(first_weekdays, lengths) * factors[rows]).sum(axis=1)
+    for budget, forecast in zip(budgets, remaining):
+        prediction = budget.spent_amount + Decimal(str(round(float(forecast), 2)))
+        budget.ml_prediction_amount = min(prediction, MAX_PREDICTION)
+    return budgets
+
+
+def forecast_budget_ids(budget_ids, today=None):
+    """Forecast and bulk_update one chunk of budgets; returns the update count."""
+    from common.cache import bump_generation_on_commit, BUDGETS_NAMESPACE
+    from expenses.models import Budget
+
+    budgets = list(
+        Budget.objects.filter(id__in=budget_ids)
+        .only('id', 'user', 'category', 'period_start_date', 'period_end_date', 'spent_amount')
+    )
+    updated = forecast_budgets(budgets, today)
+    now = timezone.now()
+    for budget in updated:
+        budget.updated_at = now
+    Budget.objects.bulk_update(updated, ['ml_prediction_amount', 'updated_at'], batch_size=FORECAST_CHUNK_SIZE)
+    for user_id in {budget.user_id for budget in updated}:
+        bump_generation_on_commit(BUDGETS_NAMESPACE, user_id)
+    return len(updated)
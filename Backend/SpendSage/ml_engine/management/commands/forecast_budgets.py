@@ -0,0 +1,36 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from expenses.models import Budget
+from ml_engine.forecast import forecast_budget_ids, FORECAST_CHUNK_SIZE
+
+
+def _forecast_chunk(budget_ids):
+    # Each worker process opens its own database connection.
+    connections.close_all()
+    return forecast_budget_ids(budget_ids)
+
+
+class Command(BaseCommand):
+    help = "Forecast ml_prediction_amount for every open budget on this machine."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes (default: one per CPU).")
+        parser.add_argument('--chunk-size', type=int, default=FORECAST_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        budget_ids = list(
+            Budget.objects.filter(is_active=True, period_end_date__gte=timezone.localdate())
+            .values_list('id', flat=True)
+            .order_by('user_id', 'category_id')
+        )
+        size = options['chunk_size']
+        chunks = [budget_ids[start:start + size] for start in range(0, len(budget_ids), size)]
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            updated = sum(pool.map(_forecast_chunk, chunks))
+        self.stdout.write(self.style.SUCCESS(f"Forecast {updated} budgets in {len(chunks)} chunks"))
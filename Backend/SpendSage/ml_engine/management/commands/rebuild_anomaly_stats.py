@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from ml_engine.anomaly import rebuild_user_stats
+from ml_engine.tasks import rebuild_all_anomaly_stats_task
+
+
+class Command(BaseCommand):
+    help = "Recompute anomaly statistics and is_anomaly flags from transaction history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild this user id (repeatable).")
+        parser.add_argument('--async', action='store_true', dest='run_async',
+                            help="Fan the rebuild out over Celery workers instead of running inline.")
+
+    def handle(self, *args, **options):
+        if options['run_async'] and not options['users']:
+            chunks = rebuild_all_anomaly_stats_task.delay().get()
+            self.stdout.write(self.style.SUCCESS(f"Queued {chunks} rebuild tasks"))
+            return
+
+        user_ids = options['users'] or get_user_model().objects.values_list('id', flat=True).order_by('id')
+        flagged = 0
+        for user_id in user_ids:
+            flagged += rebuild_user_stats(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt anomaly statistics, {flagged} transactions flagged"))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_engine.train import (
+    iter_csv_samples, iter_db_samples, train, save_artifact, TRAIN_BATCH_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = "Train the transaction text classifier and publish a new model version."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['csv', 'db'], default='db',
+                            help="Train from a CSV file or from user-categorized transactions.")
+        parser.add_argument('--csv', default=settings.BASE_DIR / 'ml_engine' / 'data' / 'training_data.csv',
+                            help="CSV with 'description' and 'category' columns.")
+        parser.add_argument('--epochs', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=TRAIN_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['source'] == 'csv':
+            sample_factory = lambda: iter_csv_samples(options['csv'])
+        else:
+            sample_factory = lambda: iter_db_samples(options['batch_size'])
+
+        try:
+            model, classes = train(sample_factory, epochs=options['epochs'], batch_size=options['batch_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        path = save_artifact(model, classes)
+        self.stdout.write(self.style.SUCCESS(f"Saved categorizer with {len(classes)} classes to {path}"))
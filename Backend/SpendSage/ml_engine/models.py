@@ -1,3 +1,29 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from expenses.models import Category
 
-# Create your models here.
+
+User = get_user_model()
+
+
+class SpendingStats(models.Model):
+    """Running spend statistics for one (user, category), used by the Anomaly Detector (FR-08)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # NULL groups the user's uncategorized expenses together
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    # Welford accumulators over log(1 + amount)
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)
+    ewma = models.FloatField(null=True, blank=True)
+    quantile_state = models.JSONField(default=dict, blank=True, help_text="P-squared p95 sketch state.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category'],
+                name='unique_spending_stats_user_category',
+                nulls_distinct=False
+            ),
+        ]
@@ -0,0 +1,252 @@
+"""
+Auto-categorization for transactions (FR-07, Personal Spending Memory).
+
+Each user's Category.keywords are compiled into one trie-shaped regex, so a
+description is matched against thousands of keywords in a single scan
+instead of testing every keyword in turn. Compiled matchers are cached per
+process and invalidated through a per-user generation token whenever one of
+the user's categories changes.
+
+Descriptions no keyword matches fall back to the trained text classifier
+(see train.py). Its artifact is loaded on first use, never at import time,
+so Django startup and manage.py commands do not pay for numpy/sklearn.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from common.cache import get_generation, bump_generation_on_commit
+
+CATEGORIZER_NAMESPACE = 'categorizer'
+# Matchers kept per process; least recently used users are dropped first.
+MAX_CACHED_MATCHERS = 1024
+# Model predictions below this probability are left uncategorized.
+MIN_MODEL_CONFIDENCE = 0.5
+# How often a worker checks whether a newer model version was published.
+MODEL_RELOAD_INTERVAL = 60
+
+
+def normalize_text(text):
+    return ' '.join(text.lower().split())
+
+
+def _build_trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+def _trie_to_pattern(node):
+    """Turn a character trie into a regex that shares every common prefix."""
+    is_end = '' in node
+    branches = [re.escape(char) + _trie_to_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if is_end:
+        # Greedy optional: prefer the longer keyword, fall back to this one.
+        return f'(?:{body})?'
+    return body
+
+
+class KeywordMatcher:
+    """Matches descriptions against a fixed {keyword: category_id} mapping."""
+
+    def __init__(self, keyword_map, category_ids_by_name=None):
+        self.keyword_map = keyword_map
+        # Maps model labels (normalized category names) to this user's ids.
+        self.category_ids_by_name = category_ids_by_name or {}
+        if keyword_map:
+            trie = _trie_to_pattern(_build_trie(keyword_map))
+            # Keywords must start and end on word boundaries ("uber" must not hit "suberb").
+            self.pattern = re.compile(rf'(?<!\w)(?:{trie})(?!\w)')
+        else:
+            self.pattern = None
+
+    @classmethod
+    def from_categories(cls, categories):
+        """Build from (category_id, name, keywords) rows; earlier categories win ties."""
+        keyword_map = {}
+        category_ids_by_name = {}
+        for category_id, name, keywords in categories:
+            category_ids_by_name.setdefault(normalize_text(name), category_id)
+            for keyword in (keywords or '').split(','):
+                keyword = normalize_text(keyword)
+                if keyword:
+                    keyword_map.setdefault(keyword, category_id)
+        return cls(keyword_map, category_ids_by_name)
+
+    def match(self, description):
+        """Return the category id of the first keyword found, or None."""
+        if self.pattern is None or not description:
+            return None
+        found = self.pattern.search(normalize_text(description))
+        if found is None:
+            return None
+        return self.keyword_map[found.group(0)]
+
+    def match_many(self, descriptions):
+        return [self.match(description) for description in descriptions]
+
+
+_matchers = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def _load_matcher(user_id):
+    # Imported lazily so the module can be used before the app registry is ready.
+    from expenses.models import Category
+
+    categories = (
+        Category.objects.filter(user_id=user_id, is_active=True)
+        .order_by('id')
+        .values_list('id', 'name', 'keywords')
+    )
+    return KeywordMatcher.from_categories(categories)
+
+
+def get_keyword_matcher(user_id):
+    """Return the user's compiled matcher, recompiling only after a change."""
+    generation = get_generation(CATEGORIZER_NAMESPACE, user_id)
+    with _matchers_lock:
+        cached = _matchers.get(user_id)
+        if cached and cached[0] == generation:
+            _matchers.move_to_end(user_id)
+            return cached[1]
+
+    matcher = _load_matcher(user_id)
+    with _matchers_lock:
+        _matchers[user_id] = (generation, matcher)
+        _matchers.move_to_end(user_id)
+        while len(_matchers) > MAX_CACHED_MATCHERS:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def invalidate_keyword_matcher(user_id):
+    """
+    Called whenever one of the user's categories is saved or deleted. The
+    bump waits for the commit, so no process recompiles the matcher from
+    keywords that are not committed yet (or never will be).
+    """
+    bump_generation_on_commit(CATEGORIZER_NAMESPACE, user_id)
+
+
+class TextClassifier:
+    """Serves a trained artifact whose weights are memory-mapped, not unpickled."""
+
+    def __init__(self, path):
+        import numpy as np
+
+        with open(path / 'meta.json') as handle:
+            meta = json.load(handle)
+        self.version = meta['version']
+        self.classes = meta['classes']
+        self.weights = np.load(path / 'weights.npy', mmap_mode='r')
+        self.intercept = np.load(path / 'intercept.npy')
+        from .train import build_vectorizer
+        self.vectorizer = build_vectorizer(meta['n_features'], meta['ngram_range'])
+
+    def predict_many(self, descriptions, min_confidence=MIN_MODEL_CONFIDENCE):
+        """Return the predicted label (or None) for each description."""
+        import numpy as np
+
+        if not descriptions:
+            return []
+        features = self.vectorizer.transform(descriptions)
+        # Only the weight rows of the hashed features present in the batch
+        # are paged in; the batch is scored against them in one product.
+        present = np.unique(features.indices)
+        features = features[:, present]
+        scores = features @ self.weights[present] + self.intercept
+        probabilities = 1.0 / (1.0 + np.exp(-scores))
+        if len(self.classes) == 2:
+            # Binary SGD models keep a single column for the positive class.
+            probabilities = np.hstack([1.0 - probabilities, probabilities])
+        else:
+            probabilities = probabilities / probabilities.sum(axis=1, keepdims=True)
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(best)), best]
+        return [
+            self.classes[index] if score >= min_confidence else None
+            for index, score in zip(best.tolist(), confidence.tolist())
+        ]
+
+
+_model = None
+_model_checked_at = None
+_model_lock = threading.Lock()
+
+
+def _latest_model_path():
+    from django.conf import settings
+
+    root = Path(settings.ML_MODEL_DIR) / 'categorizer'
+    try:
+        version = (root / 'LATEST').read_text().strip()
+    except FileNotFoundError:
+        return None
+    return root / version
+
+
+def get_text_classifier():
+    """Load the newest model on first use; return None if none is trained yet."""
+    global _model, _model_checked_at
+    now = time.monotonic()
+    if _model_checked_at is not None and now - _model_checked_at < MODEL_RELOAD_INTERVAL:
+        return _model
+    with _model_lock:
+        if _model_checked_at is None or now - _model_checked_at >= MODEL_RELOAD_INTERVAL:
+            path = _latest_model_path()
+            if path is None:
+                _model = None
+            elif _model is None or _model.version != path.name:
+                _model = TextClassifier(path)
+            _model_checked_at = now
+    return _model
+
+
+def _predict_with_model(matcher, descriptions):
+    model = get_text_classifier()
+    if model is None:
+        return [None] * len(descriptions)
+    return [
+        matcher.category_ids_by_name.get(label) if label else None
+        for label in model.predict_many(descriptions)
+    ]
+
+
+def categorize(user_id, description):
+    """Predict the category id for a single transaction description."""
+    return categorize_many(user_id, [description])[0]
+
+
+def categorize_many(user_id, descriptions, matcher=None, merchants=None):
+    """
+    Predict category ids for a batch of descriptions of the same user.
+
+    The user's own keywords win, tried on the canonical merchants first
+    when given and then on the raw descriptions; the shared model only
+    fills the gaps and only with categories the user actually has.
+    """
+    matcher = matcher or get_keyword_matcher(user_id)
+    if merchants is None:
+        results = matcher.match_many(descriptions)
+    else:
+        results = matcher.match_many(merchants)
+        unmatched = [index for index, category_id in enumerate(results) if category_id is None]
+        for index, category_id in zip(unmatched, matcher.match_many([descriptions[index] for index in unmatched])):
+            results[index] = category_id
+    missing = [index for index, category_id in enumerate(results) if category_id is None]
+    if missing:
+        predicted = _predict_with_model(matcher, [descriptions[index] for index in missing])
+        for index, category_id in zip(missing, predicted):
+            results[index] = category_id
+    return results
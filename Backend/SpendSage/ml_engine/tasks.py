@@ -0,0 +1,53 @@
+from celery import shared_task, group
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .anomaly import rebuild_user_stats
+from .forecast import forecast_budget_ids, FORECAST_CHUNK_SIZE
+
+# Users per Celery subtask when rescoring everyone.
+REBUILD_USERS_PER_TASK = 100
+
+
+@shared_task
+def rebuild_anomaly_stats_task(user_ids):
+    """Back-score the given users' transactions and reset their statistics."""
+    return sum(rebuild_user_stats(user_id) for user_id in user_ids)
+
+
+@shared_task
+def rebuild_all_anomaly_stats_task():
+    """Fan the rebuild out over workers in chunks of users."""
+    user_ids = list(get_user_model().objects.values_list('id', flat=True).order_by('id'))
+    chunks = [
+        user_ids[start:start + REBUILD_USERS_PER_TASK]
+        for start in range(0, len(user_ids), REBUILD_USERS_PER_TASK)
+    ]
+    group(rebuild_anomaly_stats_task.s(chunk) for chunk in chunks).apply_async()
+    return len(chunks)
+
+
+@shared_task
+def forecast_budgets_task(budget_ids):
+    """Forecast one chunk of budgets in a single vectorized pass."""
+    return forecast_budget_ids(budget_ids)
+
+
+@shared_task
+def nightly_budget_forecast_task():
+    """Refresh ml_prediction_amount for every open budget, chunked over workers."""
+    from expenses.models import Budget
+
+    budget_ids = list(
+        Budget.objects.filter(is_active=True, period_end_date__gte=timezone.localdate())
+        .values_list('id', flat=True)
+        .order_by('user_id', 'category_id')
+    )
+    # Ordering by owner keeps a user's budgets in the same chunk, so their
+    # series are loaded once.
+    chunks = [
+        budget_ids[start:start + FORECAST_CHUNK_SIZE]
+        for start in range(0, len(budget_ids), FORECAST_CHUNK_SIZE)
+    ]
+    group(forecast_budgets_task.s(chunk) for chunk in chunks).apply_async()
+    return len(chunks)
@@ -1,3 +1,348 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from expenses.currency import clear_rate_table
+from expenses.models import Budget, Category, ExchangeRate, Transaction
+from insight.models import DailySpend
+from users.models import User
+from .anomaly import MIN_HISTORY, P2Quantile, score_many
+from .forecast import MAX_PREDICTION, HISTORY_DAYS, forecast_budget_ids, forecast_budgets, weekday_counts
+from .models import SpendingStats
+from .predictor import KeywordMatcher, TextClassifier, categorize_many, get_keyword_matcher
+from .tasks import nightly_budget_forecast_task
+from .train import iter_csv_samples, iter_db_samples, save_artifact, train
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class KeywordMatcherTests(TestCase):
+    def matcher(self, *categories):
+        return KeywordMatcher.from_categories(categories)
+
+    def test_keywords_match_whole_words_only(self):
+        matcher = self.matcher((1, 'Transport', 'uber'))
+        self.assertEqual(matcher.match_many(['UBER TRIP 12', 'suberb cafe', 'ubereats']), [1, None, None])
+
+    def test_longest_keyword_wins(self):
+        matcher = self.matcher((1, 'Shopping', 'amazon'), (2, 'Entertainment', 'amazon prime'))
+        self.assertEqual(matcher.match_many(['AMAZON PRIME VIDEO', 'AMAZON MKTP']), [2, 1])
+
+    def test_earlier_category_wins_a_shared_keyword(self):
+        matcher = self.matcher((1, 'Coffee', 'cafe'), (2, 'Dining', 'cafe, restaurant'))
+        self.assertEqual(matcher.match_many(['Cafe Mocha', 'RESTAURANT']), [1, 2])
+
+    def test_case_spacing_and_regex_characters(self):
+        matcher = self.matcher((1, 'Dev', ' C++ ,  blue   tokai'))
+        self.assertEqual(matcher.match_many(['paid c++ course', 'BLUE  TOKAI ROASTERS', 'c+ only']), [1, 1, None])
+
+    def test_no_keywords(self):
+        matcher = self.matcher((1, 'Misc', ''))
+        self.assertEqual(matcher.match_many(['anything', '']), [None, None])
+        self.assertEqual(matcher.category_ids_by_name, {'misc': 1})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS)
+class KeywordMatcherCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ml@example.com', username='ml@example.com', password='x')
+
+    def test_matcher_is_reused_until_a_category_change_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(user=self.user, name='Coffee', keywords='starbucks')
+        matcher = get_keyword_matcher(self.user.id)
+        self.assertIs(get_keyword_matcher(self.user.id), matcher)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Category.objects.create(user=self.user, name='Transport', keywords='uber')
+        # Not committed yet: nobody may rebuild from it.
+        self.assertIs(get_keyword_matcher(self.user.id), matcher)
+
+        for callback in callbacks:
+            callback()
+        rebuilt = get_keyword_matcher(self.user.id)
+        self.assertIsNot(rebuilt, matcher)
+        self.assertIsNotNone(rebuilt.match('UBER TRIP'))
+
+    def test_deleted_categories_are_not_matched(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(user=self.user, name='Old', keywords='netflix', is_active=False)
+        self.assertIsNone(get_keyword_matcher(self.user.id).match('NETFLIX.COM'))
+
+    @mock.patch('ml_engine.predictor.get_text_classifier', return_value=None)
+    def test_merchants_are_tried_before_descriptions(self, _):
+        with self.captureOnCommitCallbacks(execute=True):
+            coffee = Category.objects.create(user=self.user, name='Coffee', keywords='starbucks')
+            cards = Category.objects.create(user=self.user, name='Cards', keywords='visa')
+
+        result = categorize_many(
+            self.user.id, ['VISA POS STARBUCKS 123', 'VISA 4411', 'UNKNOWN'],
+            merchants=['Starbucks', '', '']
+        )
+
+        self.assertEqual(result, [coffee.pk, cards.pk, None])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TrainingSampleTests(TestCase):
+    def test_only_user_chosen_categories_are_training_labels(self):
+        user = User.objects.create_user(email='train@example.com', username='train@example.com', password='x')
+        coffee = Category.objects.create(user=user, name='  Coffee  Shops')
+        Transaction.objects.create(user=user, amount=5, raw_description='STARBUCKS', category=coffee,
+                                   category_confirmed=True)
+        # Assigned by the categorizer, not by the user.
+        Transaction.objects.create(user=user, amount=5, raw_description='BLUE TOKAI', category=coffee)
+        Transaction.objects.create(user=user, amount=5, raw_description='DELETED', category=coffee,
+                                   category_confirmed=True, is_active=False)
+
+        self.assertEqual(list(iter_db_samples()), [('STARBUCKS', 'coffee shops')])
+
+    def test_csv_rows_without_description_or_label_are_skipped(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write("description,category\nUBER TRIP,Transport\n,Transport\nZOMATO,\n OLA , TRANSPORT \n")
+        self.addCleanup(os.unlink, handle.name)
+
+        self.assertEqual(list(iter_csv_samples(handle.name)), [('UBER TRIP', 'transport'), ('OLA', 'transport')])
+
+
+class SaveArtifactTests(TestCase):
+    def test_versions_saved_within_a_second_do_not_collide(self):
+        import numpy as np
+
+        model = SimpleNamespace(coef_=np.zeros((2, 4)), intercept_=np.zeros(2))
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+
+        with mock.patch('ml_engine.train.time.strftime', return_value='20240101000000'):
+            first = save_artifact(model, ['a', 'b'], root=root.name)
+            second = save_artifact(model, ['a', 'b'], root=root.name)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual((Path(root.name) / 'LATEST').read_text(), second.name)
+        self.assertEqual(json.loads((first / 'meta.json').read_text())['version'], first.name)
+
+
+@skipUnless(find_spec('sklearn'), "scikit-learn is not installed")
+class TextClassifierTests(TestCase):
+    SAMPLES = [
+        ('STARBUCKS COFFEE', 'coffee'), ('BLUE TOKAI COFFEE', 'coffee'), ('CAFE COFFEE DAY', 'coffee'),
+        ('UBER TRIP', 'transport'), ('OLA CAB RIDE', 'transport'), ('METRO CARD RECHARGE', 'transport'),
+        ('BIGBASKET ORDER', 'groceries'), ('DMART GROCERIES', 'groceries'), ('BLINKIT GROCERY', 'groceries'),
+    ]
+
+    def classifier(self, samples):
+        model, classes = train(lambda: iter(samples), epochs=20)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        return TextClassifier(save_artifact(model, classes, root=root.name))
+
+    def test_batch_prediction_matches_one_at_a_time(self):
+        classifier = self.classifier(self.SAMPLES * 5)
+        descriptions = ['STARBUCKS', 'UBER', 'DMART', 'NOTHING KNOWN', '', 'coffee uber']
+
+        batch = classifier.predict_many(descriptions, min_confidence=0)
+        single = [classifier.predict_many([description], min_confidence=0)[0] for description in descriptions]
+
+        self.assertEqual(batch, single)
+        self.assertEqual(batch[:3], ['coffee', 'transport', 'groceries'])
+
+    def test_low_confidence_is_left_unlabelled(self):
+        classifier = self.classifier(self.SAMPLES * 5)
+        self.assertEqual(classifier.predict_many(['STARBUCKS COFFEE'], min_confidence=1.01), [None])
+        self.assertEqual(classifier.predict_many([]), [])
+
+    def test_binary_model(self):
+        classifier = self.classifier([sample for sample in self.SAMPLES if sample[1] != 'groceries'] * 5)
+        self.assertEqual(classifier.predict_many(['STARBUCKS', 'UBER'], min_confidence=0), ['coffee', 'transport'])
+
+
+class P2QuantileTests(TestCase):
+    def test_converges_on_the_quantile(self):
+        values = list(range(1, 2001))
+        random.Random(0).shuffle(values)
+        sketch = P2Quantile()
+        for value in values:
+            sketch.add(value)
+
+        self.assertAlmostEqual(sketch.value, 1900, delta=40)
+
+    def test_few_values_use_the_exact_rank(self):
+        sketch = P2Quantile()
+        self.assertIsNone(sketch.value)
+        for value in (30, 10, 20):
+            sketch.add(value)
+        self.assertEqual(sketch.value, 30)
+
+    def test_state_round_trips_through_json(self):
+        sketch = P2Quantile()
+        for value in range(50):
+            sketch.add(value)
+        restored = P2Quantile(state=json.loads(json.dumps(sketch.to_dict())))
+
+        for value in range(50, 100):
+            sketch.add(value)
+            restored.add(value)
+        self.assertEqual(restored.value, sketch.value)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS)
+class ScoreManyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='anomaly@example.com', username='anomaly@example.com', password='x')
+        self.food = Category.objects.create(user=self.user, name='Food')
+
+    def score(self, *amounts, category=None, start=0):
+        category_id = category.pk if category else None
+        return score_many([(start + i, self.user.id, category_id, amount) for i, amount in enumerate(amounts)])
+
+    def test_nothing_is_flagged_before_enough_history(self):
+        flags = self.score(*(['100'] * MIN_HISTORY), '100000', category=self.food)
+        self.assertEqual(flags, {i: False for i in range(MIN_HISTORY)} | {MIN_HISTORY: True})
+
+        cold = self.score('1', '100000', category=Category.objects.create(user=self.user, name='Rent'))
+        self.assertEqual(cold, {0: False, 1: False})
+
+    def test_statistics_carry_over_between_batches(self):
+        self.score(*(['100', '110', '90'] * 2), category=self.food)
+
+        with self.assertNumQueries(4):
+            # Lock and read the row, update it; SAVEPOINT/RELEASE around both.
+            flags = self.score('105', '5000', category=self.food, start=10)
+
+        self.assertEqual(flags, {10: False, 11: True})
+        stats = SpendingStats.objects.get(user=self.user, category=self.food)
+        self.assertEqual(stats.count, 8)
+        self.assertEqual(len(stats.quantile_state['heights']), 5)
+
+    @skipUnless(connection.features.supports_nulls_distinct_unique_constraints,
+                "the database drops the NULLS NOT DISTINCT (user, category) constraint")
+    def test_rows_created_concurrently_keep_their_numbers(self):
+        for category in (self.food, None):
+            with self.subTest(category=category):
+                SpendingStats.objects.create(user=self.user, category=category, count=42)
+                # The other batch committed after our SELECT ... FOR UPDATE found nothing.
+                with mock.patch.object(SpendingStats.objects, 'select_for_update',
+                                       return_value=SpendingStats.objects.none()):
+                    self.assertEqual(self.score('100', category=category), {0: False})
+
+                self.assertEqual(SpendingStats.objects.get(user=self.user, category=category).count, 42)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS, EXCHANGE_RATE_BASE='EUR')
+class ForecastTests(TestCase):
+    TODAY = date(2024, 6, 3)  # a Monday
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='fc@example.com', username='fc@example.com', password='x')
+        self.category = Category.objects.create(user=self.user, name='Food')
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='INR', date=date(2020, 1, 1), rate=Decimal('90')),
+            ExchangeRate(currency='USD', date=date(2020, 1, 1), rate=Decimal('1.125')),
+        ])
+        clear_rate_table()
+        self.addCleanup(clear_rate_table)
+
+    def history(self, amount_of_day, currency='INR'):
+        """Daily expense rollups for the HISTORY_DAYS before TODAY."""
+        days = [self.TODAY - timedelta(days=offset) for offset in range(1, HISTORY_DAYS + 1)]
+        DailySpend.objects.bulk_create(
+            DailySpend(user=self.user, category=self.category, transaction_type='expense', currency=currency,
+                       date=day, total=Decimal(amount_of_day(day)), count=1)
+            for day in days if Decimal(amount_of_day(day))
+        )
+
+    def budget(self, days=7, spent='0.00', start=None):
+        start = start or self.TODAY
+        return Budget.objects.create(
+            user=self.user, category=self.category, period_start_date=start,
+            period_end_date=start + timedelta(days=days - 1), limit_amount=Decimal('100000'),
+            spent_amount=Decimal(spent)
+        )
+
+    def predict(self, *budgets):
+        return [budget.ml_prediction_amount for budget in forecast_budgets(list(budgets), today=self.TODAY)]
+
+    def test_foreign_spend_is_converted_to_the_users_currency(self):
+        # 1 USD = 80 INR at these rates.
+        self.history(lambda day: '1.00', currency='USD')
+        self.assertEqual(self.predict(self.budget(days=10)), [Decimal('800.00')])
+
+    def test_weekly_pattern_gives_a_known_forecast(self):
+        # 10 a weekday, 45 a weekend day: 140 a week.
+        self.history(lambda day: '45.00' if day.weekday() >= 5 else '10.00')
+
+        week, workdays, weekend = self.budget(days=7), self.budget(days=5), self.budget(days=2, start=date(2024, 6, 8))
+
+        self.assertEqual(self.predict(week, workdays, weekend),
+                         [Decimal('140.00'), Decimal('50.00'), Decimal('90.00')])
+
+    def test_days_without_spending_do_not_drag_the_level_down(self):
+        self.history(lambda day: '70.00' if day.weekday() >= 5 else '0')
+        self.assertEqual(self.predict(self.budget(days=14)), [Decimal('280.00')])
+
+    def test_spent_so_far_plus_the_days_left(self):
+        self.history(lambda day: '10.00')
+        # Started a week ago: only today onwards is forecast.
+        started = self.budget(days=10, spent='123.45', start=self.TODAY - timedelta(days=7))
+        quiet = Budget.objects.create(
+            user=self.user, category=Category.objects.create(user=self.user, name='Rent'),
+            period_start_date=self.TODAY, period_end_date=self.TODAY, limit_amount=Decimal('1')
+        )
+
+        self.assertEqual(self.predict(started, quiet), [Decimal('153.45'), Decimal('0.00')])
+
+    def test_ended_budgets_are_skipped_and_predictions_clamped(self):
+        self.history(lambda day: '1000.00')
+        ended = self.budget(days=3, start=self.TODAY - timedelta(days=10))
+        huge = self.budget(days=30, spent='99999000.00')
+
+        self.assertEqual(forecast_budgets([ended, huge], today=self.TODAY), [huge])
+        self.assertEqual(huge.ml_prediction_amount, MAX_PREDICTION)
+        self.assertIsNone(ended.ml_prediction_amount)
+
+    def test_weekday_counts(self):
+        import numpy as np
+
+        # Monday + 7 days, Saturday + 2 days, Sunday + 0 days.
+        counts = weekday_counts(np.array([0, 5, 6]), np.array([7, 2, 0]))
+        self.assertEqual(counts.tolist(), [[1] * 7, [0, 0, 0, 0, 0, 1, 1], [0] * 7])
+
+    def test_chunk_is_saved_in_one_bulk_update(self):
+        self.history(lambda day: '10.00')
+        budgets = [self.budget(days=7) for _ in range(3)]
+
+        with mock.patch('ml_engine.forecast.timezone.localdate', return_value=self.TODAY), \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(4):
+                # Budgets, the owner's currency, rollups, one UPDATE.
+                self.assertEqual(forecast_budget_ids([budget.pk for budget in budgets]), 3)
+
+        self.assertEqual(set(Budget.objects.values_list('ml_prediction_amount', flat=True)), {Decimal('70.00')})
+
+    @mock.patch('ml_engine.tasks.FORECAST_CHUNK_SIZE', 2)
+    @mock.patch('ml_engine.tasks.group')
+    def test_nightly_task_fans_out_open_budgets_in_chunks(self, group):
+        today = timezone.localdate()
+        budgets = [self.budget(days=7, start=today) for _ in range(3)]
+        self.budget(days=1, start=today - timedelta(days=5))
+
+        self.assertEqual(nightly_budget_forecast_task(), 2)
+
+        chunks = [signature.args[0] for signature in group.call_args.args[0]]
+        self.assertEqual(chunks, [[budgets[0].pk, budgets[1].pk], [budgets[2].pk]])
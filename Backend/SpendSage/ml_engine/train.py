@@ -0,0 +1,142 @@
+"""
+Training pipeline for the description -> category text classifier.
+
+Descriptions are hashed into a fixed-size sparse space (no vocabulary to
+store) and fed to a linear model with partial_fit, so neither the CSV nor
+the labelled transactions ever have to fit in memory.
+
+The artifact is a versioned directory holding plain .npy weight arrays plus
+a small meta.json. Workers open the weights with np.load(mmap_mode='r'),
+so every gunicorn/Celery process shares one copy through the page cache.
+"""
+import csv
+import json
+import os
+import tempfile
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+
+TRAIN_BATCH_SIZE = 5000
+N_FEATURES = 2 ** 18
+NGRAM_RANGE = (1, 2)
+LATEST_FILE = 'LATEST'
+
+
+def get_model_root():
+    return Path(settings.ML_MODEL_DIR) / 'categorizer'
+
+
+def build_vectorizer(n_features=N_FEATURES, ngram_range=NGRAM_RANGE):
+    """The same stateless vectorizer is rebuilt at prediction time from meta.json."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=tuple(ngram_range),
+        alternate_sign=False,
+        norm='l2',
+        lowercase=True,
+    )
+
+
+def normalize_label(label):
+    return ' '.join(label.lower().split())
+
+
+# --- Sources: both yield (description, label) pairs lazily ---
+
+def iter_csv_samples(path):
+    """Stream (description, category) rows from a CSV with those two headers."""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        for row in csv.DictReader(handle):
+            description = (row.get('description') or '').strip()
+            label = normalize_label(row.get('category') or '')
+            if description and label:
+                yield description, label
+
+
+def iter_db_samples(chunk_size=TRAIN_BATCH_SIZE):
+    """
+    Stream transactions whose category the user chose, from every user's
+    history. Categories the model assigned itself are left out, or it would
+    learn from (and reinforce) its own mistakes.
+    """
+    from expenses.models import Transaction
+
+    rows = (
+        Transaction.objects.filter(category_confirmed=True, category__isnull=False, is_active=True)
+        .values_list('raw_description', 'category__name')
+        .iterator(chunk_size=chunk_size)
+    )
+    for description, label in rows:
+        if description:
+            yield description, normalize_label(label)
+
+
+def _batches(samples, size):
+    samples = iter(samples)
+    while True:
+        batch = list(islice(samples, size))
+        if not batch:
+            return
+        yield batch
+
+
+def train(sample_factory, epochs=3, batch_size=TRAIN_BATCH_SIZE):
+    """
+    Fit a linear classifier on the samples produced by sample_factory().
+
+    sample_factory is called once for the label scan and once per epoch, so
+    the source is re-streamed rather than held in memory.
+    """
+    import numpy as np
+    from sklearn.linear_model import SGDClassifier
+
+    classes = sorted({label for _, label in sample_factory()})
+    if len(classes) < 2:
+        raise ValueError("Need at least two distinct categories to train a classifier")
+
+    vectorizer = build_vectorizer()
+    model = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+    class_array = np.array(classes)
+    for _ in range(epochs):
+        for batch in _batches(sample_factory(), batch_size):
+            descriptions, labels = zip(*batch)
+            model.partial_fit(vectorizer.transform(descriptions), labels, classes=class_array)
+    return model, classes
+
+
+def save_artifact(model, classes, root=None):
+    """
+    Write a new model version and atomically point LATEST at it.
+
+    Weights are stored transposed, (n_features, n_classes), so the rows for
+    the few hashed features of a description sit together on disk.
+    """
+    import numpy as np
+
+    root = Path(root or get_model_root())
+    # The suffix keeps two trainings that finish in the same second apart.
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    target = root / version
+    target.mkdir(parents=True)
+
+    np.save(target / 'weights.npy', np.ascontiguousarray(model.coef_.T, dtype=np.float32))
+    np.save(target / 'intercept.npy', model.intercept_.astype(np.float32))
+    with open(target / 'meta.json', 'w') as handle:
+        json.dump({
+            'version': version,
+            'classes': list(classes),
+            'n_features': N_FEATURES,
+            'ngram_range': list(NGRAM_RANGE),
+        }, handle)
+
+    fd, tmp_path = tempfile.mkstemp(dir=root)
+    with os.fdopen(fd, 'w') as handle:
+        handle.write(version)
+    os.replace(tmp_path, root / LATEST_FILE)
+    return target
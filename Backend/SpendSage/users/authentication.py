@@ -0,0 +1,26 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request user SELECT.
+
+    request.user is a ClaimsUser built from the token's id and email claims,
+    so views that only filter by request.user never touch the users table;
+    other fields load from the cached user row on first access. Since the row
+    is not read, deactivating a user takes effect when their access token
+    expires (ACCESS_TOKEN_LIFETIME). Claims are re-read from the database on
+    every refresh (CustomTokenRefreshSerializer).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        return ClaimsUser.from_claims(user_id, validated_token)
@@ -1,6 +1,7 @@
 # users/models.py
 
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.db import models
 
 class User(AbstractUser):
@@ -14,4 +15,62 @@ class User(AbstractUser):
     REQUIRED_FIELDS = ['username']
     
     def __str__(self):
-        return self.username 
\ No newline at end of file
+        return self.username
+
+
+# Claims copied into access tokens (users.serializers.add_user_claims) so most
+# requests never load the user row (users.authentication). Only fields that
+# rarely change belong here; currency_preference is read from cached_user_row
+# so a change applies within USER_ROW_CACHE_SECONDS, not at the next login.
+TOKEN_CLAIM_FIELDS = ('email',)
+USER_ROW_CACHE_SECONDS = 60
+
+
+def user_row_cache_key(user_id):
+    return f"user:row:{user_id}"
+
+
+def cached_user_row(user_id):
+    """The user's row as a dict (password excluded), cached briefly."""
+    key = user_row_cache_key(user_id)
+    row = cache.get(key)
+    if row is None:
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+        row = User.objects.filter(pk=user_id).values(*fields).first()
+        if row is not None:
+            cache.set(key, row, USER_ROW_CACHE_SECONDS)
+    return row
+
+
+class ClaimsUser(User):
+    """
+    A User built from access token claims without a query.
+
+    Fields not in the token are deferred. The first access to any of them
+    loads the rest of the row in one go through cached_user_row, instead of
+    Django's one query per deferred field. Being a User, it can be assigned
+    to foreign keys and saved like the real thing.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        # simplejwt stores the id claim as a string.
+        known = {'id': cls._meta.pk.to_python(user_id)}
+        known.update((name, claims[name]) for name in TOKEN_CLAIM_FIELDS if name in claims)
+        field_names = [field.attname for field in cls._meta.concrete_fields if field.attname in known]
+        return cls.from_db(None, field_names, [known[name] for name in field_names])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        # Only lazy loads of deferred fields take the cached path; the
+        # password hash is never cached.
+        if fields is None or not set(fields) <= deferred or 'password' in fields:
+            return super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        row = cached_user_row(self.pk)
+        if row is None:
+            raise User.DoesNotExist(f"User {self.pk} no longer exists")
+        for attname in deferred - {'password'}:
+            self.__dict__[attname] = row[attname]
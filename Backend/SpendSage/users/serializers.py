@@ -2,11 +2,24 @@ from rest_framework import serializers
 from .models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import validate_email
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .models import TOKEN_CLAIM_FIELDS
+
+
+def add_user_claims(token, user):
+    """Copy TOKEN_CLAIM_FIELDS into the token; read back by ClaimsJWTAuthentication."""
+    for name in TOKEN_CLAIM_FIELDS:
+        token[name] = getattr(user, name)
+    return token
 
 
 # Modified default rest framework to return id and email into login
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)  # this gives 'access' and 'refresh'
         
@@ -14,6 +27,24 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         data['email'] = self.user.email
         return data
     
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    simplejwt copies every claim of the refresh token into the new access
+    token (and into the rotated refresh token); re-issue the user claims
+    from the database instead, so a changed email is picked up.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        refresh = self.token_class(data.get('refresh', attrs['refresh']))
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+        add_user_claims(refresh, user)
+        data['access'] = str(refresh.access_token)
+        if 'refresh' in data:
+            data['refresh'] = str(refresh)
+        return data
+
+
 class UserSerializer(serializers.ModelSerializer):
     
     password = serializers.CharField(style={'input_type' : 'password'}, write_only = True, required = True)
@@ -0,0 +1,12 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, ClaimsUser, user_row_cache_key
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=ClaimsUser)
+def invalidate_user_row(sender, instance, **kwargs):
+    """Drop the cached row read by lazily loaded ClaimsUser fields."""
+    cache.delete(user_row_cache_key(instance.pk))
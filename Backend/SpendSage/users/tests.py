@@ -1,3 +1,91 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-# Create your tests here.
+from .models import ClaimsUser, User
+from .serializers import CustomTokenObtainPairSerializer
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS)
+class TokenClaimsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='claims@example.com', username='claims@example.com', password='secret-pass', currency_preference='USD'
+        )
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(
+            '/api/v1/auth/login/', {'email': 'claims@example.com', 'password': 'secret-pass'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_login_puts_the_email_in_the_access_token(self):
+        tokens = self.login()
+        self.assertEqual(AccessToken(tokens['access'])['email'], 'claims@example.com')
+
+    def test_refresh_reissues_claims_from_the_database(self):
+        tokens = self.login()
+        User.objects.filter(pk=self.user.pk).update(email='renamed@example.com')
+
+        response = self.client.post('/api/v1/auth/refresh/', {'refresh': tokens['refresh']}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['email'], 'renamed@example.com')
+        # Rotation hands out a refresh token carrying the new claims too.
+        self.assertEqual(RefreshToken(response.data['refresh'])['email'], 'renamed@example.com')
+
+    def test_requests_are_authenticated_without_loading_the_user(self):
+        access = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with self.assertNumQueries(1):
+            # The categories list itself; no users SELECT.
+            self.assertEqual(self.client.get('/api/v1/categories/').status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PASSWORD_HASHERS=FAST_HASHERS)
+class ClaimsUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='claims@example.com', username='claims', password='x', currency_preference='USD'
+        )
+
+    def test_claims_need_no_query(self):
+        with self.assertNumQueries(0):
+            user = ClaimsUser.from_claims(str(self.user.pk), {'email': 'claims@example.com'})
+            self.assertEqual((user.pk, user.email), (self.user.pk, 'claims@example.com'))
+
+    def test_other_fields_load_once_from_the_cached_row(self):
+        user = ClaimsUser.from_claims(str(self.user.pk), {'email': 'claims@example.com'})
+
+        with self.assertNumQueries(1):
+            self.assertEqual((user.currency_preference, user.username), ('USD', 'claims'))
+        with self.assertNumQueries(0):
+            again = ClaimsUser.from_claims(str(self.user.pk), {'email': 'claims@example.com'})
+            self.assertEqual(again.currency_preference, 'USD')
+
+    def test_saving_the_user_drops_the_cached_row(self):
+        ClaimsUser.from_claims(self.user.pk, {}).currency_preference
+        self.user.currency_preference = 'EUR'
+        self.user.save()
+
+        self.assertEqual(ClaimsUser.from_claims(self.user.pk, {}).currency_preference, 'EUR')
+
+    def test_password_is_never_cached(self):
+        user = ClaimsUser.from_claims(self.user.pk, {})
+        user.currency_preference
+        self.assertTrue(user.check_password('x'))
+        self.assertNotIn('password', cache.get(f'user:row:{self.user.pk}'))
+
+    def test_deleted_user(self):
+        user = ClaimsUser.from_claims(self.user.pk + 1000, {})
+        with self.assertRaises(User.DoesNotExist):
+            user.currency_preference
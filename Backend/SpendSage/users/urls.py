@@ -1,15 +1,11 @@
 # users/urls.py
 
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from .views import UserRegistrationView, UserProfileView, CustomTokenObtainPairView
+from .views import UserRegistrationView, UserProfileView, CustomTokenObtainPairView, CustomTokenRefreshView
 
 urlpatterns = [
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     
     #Protected routes
@@ -5,8 +5,8 @@ from rest_framework import permissions, status
 from .models import User
 from rest_framework.permissions import AllowAny
 from .serializers import UserSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import CustomTokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 from common.utils import api_success_response, api_error_response
 from rest_framework.permissions import IsAuthenticated
 
@@ -15,6 +15,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+# refresh re-issues the user claims from the database
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserRegistrationView(generics.CreateAPIView):
     """
     Public endpoint for new user registration.